@@ -1,4 +1,8 @@
+import ast
+import json
 import subprocess
+import numpy as np
+import pandas as pd
 
 
 def exec_sh(s, logger):
@@ -7,4 +11,81 @@ def exec_sh(s, logger):
     stdout, stderr = process.communicate()
     if process.returncode != 0 or stderr != b'':
         logger.error('exec_sh: %s . return code: %s . stderr: %s', s, process.returncode, stderr)
-    return stdout, stderr
\ No newline at end of file
+    return stdout, stderr
+
+
+def unquote_literal(literal):
+    r"""
+    Python string of a KGTK string literal, e.g. "{\"fileType\":\"en\"}" -> {"fileType":"en"}.
+    Plain JSON string escapes are decoded directly, anything else (e.g. \|) by literal_eval, never by eval.
+    """
+    try:
+        return json.loads(literal)
+    except ValueError:
+        return ast.literal_eval(literal)
+
+
+def decode_json_literal(literal):
+    try:
+        value = json.loads(unquote_literal(literal))
+        return value if isinstance(value, dict) else None
+    except (ValueError, SyntaxError, TypeError):
+        return None
+
+
+def decode_json_literals(values, keys=None):
+    """
+    Decode a column of KGTK quoted JSON literals (e.g. aida:jsonContent read with csv.QUOTE_NONE).
+    Identical payloads are decoded once. Values which are missing or not a JSON object decode to None.
+
+    Without `keys`, returns the list of decoded dicts. With `keys`, returns {key: list of values},
+    only the requested keys are extracted from every payload.
+    """
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+    codes = codes.tolist()
+    decoded = [decode_json_literal(v) for v in uniques]
+
+    def take(column):
+        return [column[c] if c >= 0 else None for c in codes]
+
+    if keys is None:
+        return take(decoded)
+    return {k: take([d.get(k) if d is not None else None for d in decoded]) for k in keys}
+
+
+def group_starts(df, keys):
+    """
+    Stable sort `df` by `keys` and return it with the start position of every group.
+    Rows with a missing key are dropped (same as groupby).
+    """
+    df = df.dropna(subset=keys).sort_values(keys, kind='mergesort').reset_index(drop=True)
+    if df.empty:
+        return df, np.array([], dtype=np.int64)
+    changed = np.zeros(len(df), dtype=bool)
+    changed[0] = True
+    for k in keys:
+        values = df[k].to_numpy()
+        changed[1:] |= values[1:] != values[:-1]
+    return df, np.flatnonzero(changed)
+
+
+def split_tuples(values, starts):
+    """
+    Cut the list `values` at `starts` and turn every piece into a tuple.
+    """
+    ends = list(starts[1:]) + [len(values)]
+    return [tuple(values[s:e]) for s, e in zip(starts, ends)]
+
+
+def collect_tuples(df, key, columns):
+    """
+    Collect `columns` per `key` into tuples, one row per key.
+
+    Vectorized equivalent of `df.groupby(key)[columns].apply(merge_values).reset_index()`:
+    keys come out sorted, values keep their original order within a key.
+    """
+    df, starts = group_starts(df, [key])
+    result = {key: df[key].to_numpy()[starts]}
+    for col in columns:
+        result[col] = split_tuples(df[col].tolist(), starts)
+    return pd.DataFrame(result, columns=[key] + list(columns))
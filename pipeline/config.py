@@ -29,8 +29,10 @@ def get_config():
     return \
         {  # development
             'ldc_kg_dir': '../pipeline_test/ldc2019/data', # ldc2019, LDC2020E27
+            'ldc_kg_index': '../pipeline_test/temp/refkb.idx',
             # 'wd_kg_dir': '../pipeline_test/wd',
             'wd_to_fb_file': '../pipeline_test/res/df_wd_fb_20200803.csv',
+            'wd_to_fb_index': None,  # '../pipeline_test/res/df_wd_fb_20200803.idx',
             'input_dir': '../pipeline_test/input',
             'output_dir': '../pipeline_test/output',
             'run_name': 'uiuc-test',
@@ -40,10 +42,15 @@ def get_config():
             'num_of_processor': 4,
             'kb_to_fbid_mapping': None, #'../pipeline_test/res/kb_to_wd_mapping.json',
             'enable_cmu_gid_patch': False,
+            'stream_unreify': True,
+            'unreify_buffer_size': 512 * 1024 * 1024,
         } if not prod_mode else \
         {  # production
             'ldc_kg_dir': os.path.join(get_env_var('REPO_KB'), 'data'),
+            'ldc_kg_index': get_env_var('REPO_KB_INDEX', optional=True,
+                                        default=os.path.join(get_env_var('TEMP', optional=True, default='/tmp'), 'refkb.idx')),
             'wd_to_fb_file': os.path.join(get_env_var('WD_FB_MAPPING')),
+            'wd_to_fb_index': get_env_var('WD_FB_INDEX', optional=True),
             'input_dir': get_env_var('INPUT'),
             'output_dir': get_env_var('OUTPUT'),
             'run_name': get_env_var('RUN_NAME'),
@@ -53,6 +60,8 @@ def get_config():
             'num_of_processor': int(get_env_var('NUM_PROC', optional=True, default='2')),
             'kb_to_fbid_mapping': get_env_var('KB_FBID_MAPPING', optional=True),
             'enable_cmu_gid_patch': get_env_var('ENABLE_CMU_GID_PATCH', optional=True),
+            'stream_unreify': get_env_var('STREAM_UNREIFY', optional=True, default='True').lower() == 'true',
+            'unreify_buffer_size': int(get_env_var('UNREIFY_BUFFER_SIZE', optional=True, default=str(512 * 1024 * 1024))),
         }
 
 
@@ -6,19 +6,39 @@ import sys
 from collections import defaultdict
 import glob
 import warnings
+import numpy as np
 import pandas as pd
 import pyrallel
 from config import config, get_logger
-from common import exec_sh
+from common import exec_sh, decode_json_literals, collect_tuples
+from wd_fb_index import load_wikidata_index, WIKIDATA_COLUMNS
+from partition import PredicatePartitions
+from refkb_index import open_index
+from unreify import Unreifier
 import re
 
 
 ldc_kg = None
-df_wd_fb = None
+wd_index = None
 kb_to_fb_mapping = None
 
 re_cluster = re.compile(r'<.*InterchangeOntology#(clusterMember|ClusterMembership|SameAsCluster|cluster|prototype)>')
 re_entity = re.compile(r'<.*InterchangeOntology#(Event|Entity|Relation)>')
+# UIUC: REFKB:3634031, BBN: REFKB3643031
+re_refkb = re.compile(r'^REFKB:?([^:]*)')
+
+
+class ImportContext(object):
+    """
+    What the create_*_df stages of one source hand over to the next ones in memory instead of reading back
+    their output files: the entity, event and relation ids, and the justification of every statement.
+    """
+
+    def __init__(self):
+        self.entity_ids = set()
+        self.event_ids = set()
+        self.relation_ids = set()
+        self.just_dict = None  # statement -> justification, built by the first stage which needs it
 
 
 class Importer(object):
@@ -29,10 +49,13 @@ class Importer(object):
         self.infile = os.path.join(config['input_dir'], config['run_name'], '{}.ttl'.format(source))
         self.temp_dir = os.path.join(config['temp_dir'], config['run_name'], source)
         self.stat_info = {}
+        self.partitions = {}
+        self.context = ImportContext()
 
     def run(self):
-        global ldc_kg, df_wd_fb, kb_to_fb_mapping
+        global ldc_kg, wd_index, kb_to_fb_mapping
         os.makedirs(self.temp_dir, exist_ok=True)
+        self.context = ImportContext()
 
         try:
 
@@ -51,13 +74,11 @@ class Importer(object):
             self.convert_nt_to_kgtk(cleaned_nt_file, kgtk_file)
             self.unreify_kgtk(kgtk_file, unreified_kgtk_file)
             self.create_entity_df(kgtk_file, unreified_kgtk_file, entity_outfile, self.source,
-                                  ldc_kg, df_wd_fb, kb_to_fb_mapping)
+                                  ldc_kg, wd_index, kb_to_fb_mapping)
             self.create_event_df(kgtk_file, unreified_kgtk_file, event_outfile, self.source)
-            self.create_event_role_df(kgtk_file, unreified_kgtk_file, event_role_outfile, self.source,
-                                      entity_outfile, event_outfile)
+            self.create_event_role_df(kgtk_file, unreified_kgtk_file, event_role_outfile, self.source)
             self.create_relation_df(kgtk_file, unreified_kgtk_file, relation_outfile, self.source)
-            self.create_relation_role_df(kgtk_file, unreified_kgtk_file, relation_role_outfile, self.source,
-                                         entity_outfile, event_outfile, relation_outfile)
+            self.create_relation_role_df(kgtk_file, unreified_kgtk_file, relation_role_outfile, self.source)
 
         except:
             self.logger.exception('Exception caught in Importer.run()')
@@ -80,28 +101,58 @@ class Importer(object):
         return os.path.join(self.temp_dir, 'tmp{}'.format(suffix))
 
     def clean_temp_files(self):
+        self.partitions = {}
         for f in glob.glob(os.path.join(self.temp_dir, 'tmp*')):
             os.remove(f)
 
+    def edges(self, infile):
+        """
+        Predicate partitions of `infile` (the kgtk or the unreified kgtk file), made in one pass on first use.
+        All the filters of a source read them instead of running `kgtk filter` over the whole file.
+        """
+        if infile not in self.partitions:
+            self.logger.info('partitioning ' + os.path.basename(infile))
+            prefix = self.tmp_file_path('p{}'.format(len(self.partitions)))
+            self.partitions[infile] = PredicatePartitions(infile, prefix).partition()
+        return self.partitions[infile]
+
+    def read_private_data(self, kgtk_file, infile, system):
+        """
+        (e, json) of the jsonContent of the entity private data made by `system` (e.g. uiuc:EDL_Freebase),
+        the private data nodes are looked up in `infile`.
+        """
+        edges = self.edges(infile)
+        df_system = edges.read(['aida:system'])
+        nodes = set(df_system.loc[df_system['node2'] == system, 'node1'])
+        df_json = edges.read(['aida:jsonContent'], quoting=csv.QUOTE_NONE, doublequote=False)
+        df_json = df_json.loc[df_json['node1'].isin(nodes)]
+        df_private_data = self.edges(kgtk_file).read(['aida:privateData'], contains='entity:')
+        return pd.merge(df_private_data, df_json, left_on='node2', right_on='node1')[['node1_x', 'node2_y']].rename(
+            columns={'node1_x': 'e', 'node2_y': 'json'})
+
+    def justifications(self, unreified_kgtk_file):
+        """
+        Statement -> justification of the source, read once and kept in the context.
+        """
+        if self.context.just_dict is None:
+            df_just = self.edges(unreified_kgtk_file).read(['aida:justifiedBy'])
+            self.context.just_dict = dict(zip(df_just['node1'].tolist(), df_just['node2'].tolist()))
+        return self.context.just_dict
+
     def predicate_path(self, infile, path, retain_intermediate=False, quoting=0, doublequote=True):
         all_p = path.split('/')
         if len(all_p) == 0:
             return
 
         # first predicate
-        tmp_str = ';{};'.format(all_p[0])
-        exec_sh('kgtk filter -p "{tmp_str}" -i {infile} > {tmp_file}'
-                .format(tmp_str=tmp_str, infile=infile, tmp_file=self.tmp_file_path()), self.logger)
-        pd_tmp1 = pd.read_csv(self.tmp_file_path(), delimiter='\t', quoting=quoting, doublequote=doublequote)
+        edges = self.edges(infile)
+        pd_tmp1 = edges.read([all_p[0]], quoting=quoting, doublequote=doublequote)
 
         # rest of the predicate
         inter_columns = []
         for idx in range(1, len(all_p)):
             p = all_p[idx]
-            tmp_str = ';{};'.format(p)
-            exec_sh('kgtk filter -p "{tmp_str}" -i {infile} > {tmp_file}'
-                    .format(tmp_str=tmp_str, infile=infile, tmp_file=self.tmp_file_path()), self.logger)
-            pd_tmp2 = pd.read_csv(self.tmp_file_path(), delimiter='\t', quoting=quoting, doublequote=doublequote)
+            pd_tmp2 = edges.read([p], quoting=quoting, doublequote=doublequote)
 
             # merge
             if retain_intermediate:
@@ -189,27 +240,27 @@ class Importer(object):
 
     def unreify_kgtk(self, infile, outfile):
         self.logger.info('unreify kgtk')
+        if config['stream_unreify']:
+            Unreifier(infile, outfile, self.tmp_file_path('u'), config['unreify_buffer_size']).run()
+            return
         exec_sh('kgtk unreify-rdf-statements -i {infile} / sort --columns 1,2 >  {outfile}'
                 .format(infile=infile, outfile=outfile), self.logger)
 
-    def create_entity_df(self, kgtk_file, unreified_kgtk_file, output_file, source, ldc_kg, df_wd_fb, kb_to_fb_mapping):
+    def create_entity_df(self, kgtk_file, unreified_kgtk_file, output_file, source, ldc_kg, wd_index, kb_to_fb_mapping):
         self.logger.info('create entity df for ' + source)
 
         ### id
         self.logger.info('creating id')
-        exec_sh('kgtk filter -p ";rdf:type;aida:Entity" -i {kgtk_file} > {tmp_file}'
-                .format(kgtk_file=kgtk_file, tmp_file=self.tmp_file_path()), self.logger)
-        df_entity = pd.read_csv(self.tmp_file_path(), delimiter='\t')
-        df_entity = pd.DataFrame({'e': df_entity['node1']})
+        df_entity = self.edges(kgtk_file).read(['rdf:type'])
+        df_entity = pd.DataFrame({'e': df_entity.loc[df_entity['node2'] == 'aida:Entity', 'node1']})
         if self.stat_info['entity'] != len(df_entity):
             self.logger.error('TA1 has {} entities, TA2 has {} entities'.format(self.stat_info['entity'], len(df_entity)))
         df_entity = df_entity.drop_duplicates().reset_index(drop=True)
 
         ### name
         self.logger.info('creating name')
-        exec_sh('kgtk filter -p ";aida:hasName,aida:textValue;" -i {kgtk_file} > {tmp_file}'
-                .format(kgtk_file=unreified_kgtk_file, tmp_file=self.tmp_file_path(1)), self.logger)
-        df_name = pd.read_csv(self.tmp_file_path(1), delimiter='\t', error_bad_lines=False, quoting=csv.QUOTE_NONE, doublequote=False).drop(columns=['label']).rename(
+        df_name = self.edges(unreified_kgtk_file).read(['aida:hasName', 'aida:textValue'],
+                error_bad_lines=False, quoting=csv.QUOTE_NONE, doublequote=False).drop(columns=['label']).rename(
             columns={'node1': 'e', 'node2': 'name'})
 
         def merge_names(names):
@@ -232,154 +283,36 @@ class Importer(object):
         df_tmp3 = pd.merge(df_target, df_tmp2, left_on='e', right_on='e')
         df_tmp3 = df_tmp3.groupby('target')['cv'].max().reset_index().rename(columns={'cv': 'score'})
         df_tmp4 = pd.merge(df_target, df_tmp3, left_on='target', right_on='target')
-        # merge
-        def merge_targets(table):
-            if len(table.index) > 0:
-                targets = tuple(table['target'].tolist())
-                scores = tuple(table['score'].tolist())
-                return pd.Series({'target': targets, 'target_score': scores})
-            else:
-                return pd.Series({'target': tuple([]), 'target_score': tuple([])})
-
-        df_target = df_tmp4.groupby('e')[['target', 'score']].apply(merge_targets).reset_index()
-        # expand with labels from ldc kg
-        def extract_target_id(t):
-            target_id = None
-            if t.startswith('REFKB:'):
-                target_id = t.split(':')[1]
-            elif t.startswith('REFKB'):
-                target_id = t[len('REFKB'):]
-            return target_id
-
-        def filter_target(df):
-            d = df[['e', 'target', 'target_score']].to_dict()
-            new_d = {'e': {}, 'target': {}, 'target_score': {}}
-            for k, v in d['target'].items():
-                if v is None:
-                    continue
-                new_target = []
-                new_target_score = []
-                for idx_, tt in enumerate(v):
-                    if extract_target_id(tt) is None:  # not valid ID
-                        continue
-                    new_target.append(tt)
-                    new_target_score.append(d['target_score'][k][idx_])
-                if len(new_target) > 0:
-                    new_d['e'][k] = d['e'][k]
-                    new_d['target'][k] = tuple(new_target)
-                    new_d['target_score'][k] = tuple(new_target_score)
-            return pd.DataFrame(new_d)
-
-        if 'target' not in df_target:
-            df_target['target'] = None
-        if 'target_score' not in df_target:
-            df_target['target_score'] = None
-        df_target = filter_target(df_target)
-
-        df_target['target_type'] = None
-        df_target['target_name'] = None
-        for idx, targets in df_target['target'].iteritems():
-            if targets:
-                target_type = []
-                target_name = []
-                for t in targets:
-                    # UIUC: REFKB:3634031
-                    # BBN: REFKB3643031
-                    target_id = extract_target_id(t)
-                    if not target_id:
-                        target_type.append(None)
-                        target_name.append(None)
-                        continue
-
-                    data = ldc_kg.get(target_id)
-                    if data:
-                        target_type.append(data['type'])
-                        target_name.append(tuple(data['names']))
-                    else:
-                        self.logger.warning('Target ID is not in REFKB: {}'.format(target_id))
-                        target_type.append(None)
-                        target_name.append(None)
-
-                df_target.loc[idx].at['target_type'] = tuple(target_type)
-                df_target.loc[idx].at['target_name'] = tuple(target_name)
-
-        # check target again and make sure all target names have value
-        # if target name is None, then corresponding target id should be removed
-        # if target name is a list of Nones, remove Nones. If if then be an empty list, make it None
-        for idx_g, targets in df_target.iterrows():
-            target = targets['target']
-            target_name = targets['target_name']
-            target_score = targets['target_score']
-
-            remove_idx = []
-            if target_name:
-                for idx, tn in enumerate(target_name):
-                    if not tn:
-                        remove_idx.append(idx)
-
-                if len(remove_idx) > 0:
-                    remove_idx.sort(reverse=True)
-                    target = list(target)
-                    target_name = list(target_name)
-                    target_score = list(target_score)
-                    for idx in remove_idx:
-                        del target_name[idx]
-                        del target[idx]
-                        del target_score[idx]
-
-                    if len(target_name) == 0:
-                        target_name = None
-                        target = None
-                        target_score = None
-                    else:
-                        target = tuple(target)
-                        target_name = tuple(target_name)
-                        target_score = tuple(target_score)
-
-                    df_target.loc[idx_g]['target'] = target
-                    df_target.loc[idx_g]['target_name'] = target_name
-                    df_target.loc[idx_g]['target_score'] = target_score
+        # resolve the REFKB ids against the ldc kg, targets which aren't REFKB ids or aren't in it are dropped
+        df_tmp4['target_id'] = df_tmp4['target'].str.extract(re_refkb.pattern, expand=False)
+        df_tmp4 = df_tmp4.loc[df_tmp4['target_id'].fillna('') != '']
+        df_tmp4 = pd.merge(df_tmp4, ldc_kg.lookup(df_tmp4['target_id']), left_on='target_id', right_index=True, how='left')
+        unknown = df_tmp4['target_name'].isna()
+        for target_id in df_tmp4.loc[unknown, 'target_id'].unique():
+            self.logger.warning('Target ID is not in REFKB: {}'.format(target_id))
+        df_target = collect_tuples(df_tmp4.loc[~unknown].rename(columns={'score': 'target_score'}),
+                                   'e', ['target', 'target_score', 'target_type', 'target_name'])
         df_target = df_target.astype('object')
 
         ### freebase id
         self.logger.info('creating freebase')
-        exec_sh('kgtk filter -p ";aida:privateData,aida:jsonContent,aida:system;" -i {kgtk_file} > {tmp_file}'
-                .format(kgtk_file=unreified_kgtk_file, tmp_file=self.tmp_file_path()), self.logger)
-        exec_sh('kgtk filter -p ";;uiuc:EDL_Freebase" -i {tmp_file} > {tmp_file1}'
-                .format(tmp_file=self.tmp_file_path(), tmp_file1=self.tmp_file_path(1)), self.logger)
-        exec_sh('kgtk ifexists --filter-on {tmp_file1} --input-keys node1 --filter-keys node1 -i {tmp_file} | kgtk filter -p ";aida:jsonContent;" > {tmp_file2}'
-                .format(tmp_file1=self.tmp_file_path(1), tmp_file=self.tmp_file_path(), tmp_file2=self.tmp_file_path(2)), self.logger)
-        exec_sh('head -n 1 {kgtk_file} > {tmp_file3}'
-                .format(kgtk_file=unreified_kgtk_file, tmp_file3=self.tmp_file_path(3)), self.logger)
-        exec_sh('kgtk filter -p ";aida:privateData;" -i {kgtk_file} | grep "entity:" >> {tmp_file3}'
-                .format(kgtk_file=kgtk_file, tmp_file3=self.tmp_file_path(3)), self.logger)
-        df_tmp1 = pd.read_csv(self.tmp_file_path(3), delimiter='\t')
-        df_tmp2 = pd.read_csv(self.tmp_file_path(2), delimiter='\t', quoting=csv.QUOTE_NONE, doublequote=False)
-        df_fb = pd.merge(df_tmp1, df_tmp2, left_on='node2', right_on='node1')[['node1_x', 'node2_y']].rename(
-            columns={'node1_x': 'e', 'node2_y': 'json'})
+        df_fb = self.read_private_data(kgtk_file, unreified_kgtk_file, 'uiuc:EDL_Freebase')
 
-        def getFBIDs(s):
-            if s:
-                s = eval(s)
-                fbids = []
-                avg_scores = []
-                max_scores = []
-                fbids_json = json.loads(s).get('freebase_link')
-                fbids_keys = fbids_json.keys()
-                for fbid in fbids_keys:
-                    fbids.append(fbid)
-                    avg_scores.append(fbids_json.get(fbid).get('average_score'))
-                    max_scores.append(fbids_json.get(fbid).get('max_score'))
-                return pd.Series(
-                    {'fbid': tuple(fbids), 'fbid_score_avg': tuple(avg_scores), 'fbid_score_max': tuple(max_scores)})
-            else:
-                return pd.Series({'fbid': tuple([]), 'fbid_score_avg': tuple([]), 'fbid_score_max': tuple([])})
+        def getFBIDs(fbids_json):
+            fbids_json = fbids_json or {}
+            fbids = tuple(fbids_json.keys())
+            return {'fbid': fbids,
+                    'fbid_score_avg': tuple(fbids_json.get(fbid).get('average_score') for fbid in fbids),
+                    'fbid_score_max': tuple(fbids_json.get(fbid).get('max_score') for fbid in fbids)}
 
         df_fb['fbid'] = None
         df_fb['fbid_score_avg'] = None
         df_fb['fbid_score_max'] = None
         if len(df_fb) > 0:
-            df_fb[['fbid', 'fbid_score_avg', 'fbid_score_max']] = df_fb['json'].apply(getFBIDs)
+            links = [getFBIDs(fbids_json) for fbids_json in
+                     decode_json_literals(df_fb['json'], keys=['freebase_link'])['freebase_link']]
+            for col in ('fbid', 'fbid_score_avg', 'fbid_score_max'):
+                df_fb[col] = [link[col] for link in links]
             df_fb = df_fb.drop(columns=['json'])
 
         def merge_fb(fb):
@@ -424,28 +357,14 @@ class Importer(object):
 
         ### embedding vector
         self.logger.info('creating embedding vector')
-        exec_sh('kgtk filter -p ";aida:privateData,aida:jsonContent,aida:system;" -i {kgtk_file} > {tmp_file}'
-                .format(kgtk_file=kgtk_file, tmp_file=self.tmp_file_path()), self.logger)
-        exec_sh('kgtk filter -p ";;uiuc:entity_representations" -i {tmp_file} > {tmp_file1}'
-                .format(tmp_file=self.tmp_file_path(), tmp_file1=self.tmp_file_path(1)), self.logger)
-        exec_sh('''kgtk ifexists --filter-on {tmp_file1} --input-keys node1 --filter-keys node1 \
-    -i {tmp_file} | kgtk filter -p ';aida:jsonContent;' > {tmp_file2}'''
-                .format(tmp_file1=self.tmp_file_path(1), tmp_file=self.tmp_file_path(), tmp_file2=self.tmp_file_path(2)), self.logger)
-        exec_sh('head -n 1 {kgtk_file} > {tmp_file3}'
-                .format(kgtk_file=unreified_kgtk_file, tmp_file3=self.tmp_file_path(3)), self.logger)
-        exec_sh('kgtk filter -p ";aida:privateData;" -i {kgtk_file} | grep "entity:" >> {tmp_file3}'
-                .format(kgtk_file=kgtk_file, tmp_file3=self.tmp_file_path(3)), self.logger)
-        df_tmp1 = pd.read_csv(self.tmp_file_path(3), delimiter='\t')
-        df_tmp2 = pd.read_csv(self.tmp_file_path(2), delimiter='\t', quoting=csv.QUOTE_NONE, doublequote=False)
-        df_vector = pd.merge(df_tmp1, df_tmp2, left_on='node2', right_on='node1')[['node1_x', 'node2_y']].rename(
-            columns={'node1_x': 'e', 'node2_y': 'vector'})
+        df_vector = self.read_private_data(kgtk_file, kgtk_file, 'uiuc:entity_representations')\
+            .rename(columns={'json': 'vector'})
         df_vector['vector'] = df_vector['vector'].apply(lambda x: json.loads(x))
 
         ### type
         self.logger.info('creating type')
-        exec_sh('kgtk filter -p ";rdf:type;" -i {kgtk_file} | kgtk filter --invert -p ";;aida:Entity" > {tmp_file}'
-                .format(kgtk_file=unreified_kgtk_file, tmp_file=self.tmp_file_path()), self.logger)
-        df_tmp1 = pd.read_csv(self.tmp_file_path(), delimiter='\t').rename(columns={'node1': 'e', 'node2': 'type'})
+        df_tmp1 = self.edges(unreified_kgtk_file).read(['rdf:type'])
+        df_tmp1 = df_tmp1.loc[df_tmp1['node2'] != 'aida:Entity'].rename(columns={'node1': 'e', 'node2': 'type'})
         df_type = pd.merge(df_entity, df_tmp1, left_on='e', right_on='e').drop(columns=['label', 'id'])
 
         def merge_types(types):
@@ -459,70 +378,12 @@ class Importer(object):
         ### wikidata
         self.logger.info('creating wikidata')
 
-        def expand(s, multiple=False):
-            if s is None:
-                return {}
-            # expand labels
-            result = defaultdict(list) if multiple else {}
-            labels = s.split('|')
-            for l in labels:
-                lang, content = l[-2:], l[1:-4]
-                if multiple:
-                    result[lang].append(content)
-                else:
-                    result[lang] = content
-            return {k: tuple(result[k]) for k in result.keys()} if multiple else result
-
-        def format_fbid(fbid):
-            if not fbid or 'NIL' in fbid: return None
-            # .startswith('LDC2015E42:NIL'): return None
-            fbid = '/' + fbid.replace('.', '/')
-            return fbid
-
         df_wd = df_fb.copy()
-        df_wd['wikidata'] = None
-        df_wd['wikidata_label_en'] = None
-        df_wd['wikidata_label_ru'] = None
-        df_wd['wikidata_label_uk'] = None
-        df_wd['wikidata_description_en'] = None
-        df_wd['wikidata_description_ru'] = None
-        df_wd['wikidata_description_uk'] = None
-        df_wd['wikidata_alias_en'] = None
-        df_wd['wikidata_alias_ru'] = None
-        df_wd['wikidata_alias_uk'] = None
-
-        for idx, line in df_fb.iterrows():
-            qnodes = []
-            for fbid in line['fbid']:
-                fbid = format_fbid(fbid)
-                if fbid:
-                    qnodes_found = df_wd_fb.loc[df_wd_fb['fbid'] == fbid]['qnode'].values
-                    qnodes.append(qnodes_found[0] if len(qnodes_found) > 0 else None)
-                else:
-                    qnodes.append(None)
-            qnodes = tuple(qnodes)
-            df_wd.loc[idx].at['wikidata'] = qnodes
-
-            labels = []
-            descriptions = []
-            aliases = []
-            for q in qnodes:
-                qnode_value = df_wd_fb.loc[df_wd_fb['qnode'] == q]
-                labels.append(expand(qnode_value['label'].values[0]) if qnode_value['label'].size > 0 else {})
-                descriptions.append(
-                    expand(qnode_value['description'].values[0]) if qnode_value['description'].size > 0 else {})
-                aliases.append(
-                    expand(qnode_value['alias'].values[0], multiple=True) if qnode_value['alias'].size > 0 else {})
-
-            df_wd.loc[idx].at['wikidata_label_en'] = tuple([l.get('en') for l in labels])
-            df_wd.loc[idx].at['wikidata_label_ru'] = tuple([l.get('ru') for l in labels])
-            df_wd.loc[idx].at['wikidata_label_uk'] = tuple([l.get('uk') for l in labels])
-            df_wd.loc[idx].at['wikidata_description_en'] = tuple([l.get('en') for l in descriptions])
-            df_wd.loc[idx].at['wikidata_description_ru'] = tuple([l.get('ru') for l in descriptions])
-            df_wd.loc[idx].at['wikidata_description_uk'] = tuple([l.get('uk') for l in descriptions])
-            df_wd.loc[idx].at['wikidata_alias_en'] = tuple([l.get('en') for l in aliases])
-            df_wd.loc[idx].at['wikidata_alias_ru'] = tuple([l.get('ru') for l in aliases])
-            df_wd.loc[idx].at['wikidata_alias_uk'] = tuple([l.get('uk') for l in aliases])
+        if len(df_fb) > 0:
+            df_wd = pd.concat([df_wd, wd_index.lookup(df_fb['fbid'])], axis=1)
+        else:
+            for col in ['wikidata'] + WIKIDATA_COLUMNS:
+                df_wd[col] = None
 
         ### informative justification
         # self.logger.info('creating informative justification')
@@ -571,9 +432,10 @@ class Importer(object):
             .drop(columns=['inter_2'])
         entity_ids = set([v for v in df_entity['e'].to_dict().values()])
         df_just = df_just.loc[df_just['e'].isin(entity_ids)]
-        df_just['just_type'] = df_just['json'].apply(lambda x: json.loads(eval(x)).get('justificationType'))
-        df_just['just_mention_string'] = df_just['json'].apply(lambda x: json.loads(eval(x)).get('mention_string'))
-        df_just['just_sentence'] = df_just['json'].apply(lambda x: json.loads(eval(x)).get('sentence'))
+        just = decode_json_literals(df_just['json'], keys=['justificationType', 'mention_string', 'sentence'])
+        df_just['just_type'] = just['justificationType']
+        df_just['just_mention_string'] = just['mention_string']
+        df_just['just_sentence'] = just['sentence']
         df_just = df_just.drop(columns=['json', 'justified_by'])
 
         def merge_just(table):
@@ -607,6 +469,7 @@ class Importer(object):
         df_entity_complete = pd.merge(df_entity_complete, df_source_ltf, how='left')
         df_entity_complete['source'] = source
         df_entity_complete.drop_duplicates(subset=['e']).reset_index(drop=True)
+        self.context.entity_ids = set(df_entity_complete['e'].tolist())
 
         ### export
         self.logger.info('exporting df')
@@ -620,9 +483,8 @@ class Importer(object):
 
         ### id
         self.logger.info('creating id')
-        exec_sh('kgtk filter -p ";rdf:type;aida:Event" -i {kgtk_file} > {tmp_file}'
-                     .format(kgtk_file=kgtk_file, tmp_file=self.tmp_file_path()), self.logger)
-        df_event = pd.read_csv(self.tmp_file_path(), delimiter='\t').drop(columns=['node2', 'label'])\
+        df_event = self.edges(kgtk_file).read(['rdf:type'])
+        df_event = df_event.loc[df_event['node2'] == 'aida:Event'].drop(columns=['node2', 'label'])\
             .rename(columns={'node1': 'e'})
         if self.stat_info['event'] != len(df_event):
             self.logger.error('TA1 has {} events, TA2 has {} events'.format(self.stat_info['event'], len(df_event)))
@@ -630,22 +492,20 @@ class Importer(object):
 
         ### type
         self.logger.info('creating type')
-        exec_sh('kgtk filter -p ";rdf:type;" -i {kgtk_file} | kgtk filter --invert -p ";;aida:Event" > {tmp_file}'
-                     .format(kgtk_file=unreified_kgtk_file, tmp_file=self.tmp_file_path()), self.logger)
-        df_tmp1 = pd.read_csv(self.tmp_file_path(), delimiter='\t').rename(columns={'node1': 'e', 'node2': 'type'})
+        df_tmp1 = self.edges(unreified_kgtk_file).read(['rdf:type'])
+        df_tmp1 = df_tmp1.loc[df_tmp1['node2'] != 'aida:Event'].rename(columns={'node1': 'e', 'node2': 'type'})
         df_event_type = pd.merge(df_event, df_tmp1, left_on='e', right_on='e').drop(columns=['label', 'id'])
 
         ### name
         self.logger.info('creating name')
-        exec_sh('kgtk filter -p ";skos:prefLabel;" -i {kgtk_file} > {tmp_file}'
-                     .format(kgtk_file=unreified_kgtk_file, tmp_file=self.tmp_file_path()), self.logger)
-        df_event_name = pd.read_csv(self.tmp_file_path(), delimiter='\t', quoting=csv.QUOTE_NONE, doublequote=False)\
+        df_event_name = self.edges(unreified_kgtk_file).read(['skos:prefLabel'], quoting=csv.QUOTE_NONE, doublequote=False)\
             .drop(columns=['label']).rename(columns={'node1': 'e', 'node2': 'name'})
 
         ### merge
         df_event_complete = pd.merge(df_event, df_event_type, how='left')
         df_event_complete['source'] = source
         df_event_complete.drop_duplicates(subset=['e']).reset_index(drop=True)
+        self.context.event_ids = set(df_event_complete['e'].tolist())
 
         ### export
         self.logger.info('exporting df')
@@ -654,23 +514,19 @@ class Importer(object):
             df_event_complete.to_hdf(output_file, 'event', mode='w', format='fixed')
             df_event_complete.to_csv(output_file + '.csv')
 
-    def create_event_role_df(self, kgtk_file, unreified_kgtk_file, output_file, source, entity_file, event_file):
+    def create_event_role_df(self, kgtk_file, unreified_kgtk_file, output_file, source):
         self.logger.info('creating event role df for ' + source)
-        exec_sh('kgtk filter --invert -p ";rdf:type;" -i {kgtk_file} > {tmp_file}'
-                     .format(kgtk_file=unreified_kgtk_file, tmp_file=self.tmp_file_path()), self.logger)
-        exec_sh("awk -F'\t' '$2 ~ /^ldcOnt:/' {tmp_file} > {tmp_file1}"
-                     .format(tmp_file=self.tmp_file_path(), tmp_file1=self.tmp_file_path(1)), self.logger)
+        edges = self.edges(unreified_kgtk_file)
         df_event_role = pd.DataFrame(columns=['event', 'role', 'entity'])
 
         try:
-            # entity ids and relation ids
-            df_entity = pd.read_hdf(entity_file)['e']
-            entity_ids = set([v for v in df_entity.to_dict().values()])
-            df_event = pd.read_hdf(event_file)['e']
-            event_ids = set([v for v in df_event.to_dict().values()])
-
-            df_event_role = pd.read_csv(self.tmp_file_path(1),
-                delimiter='\t', index_col=False, header=None, names=['event', 'role', 'entity', 'statement'])
+            # entity ids and event ids
+            entity_ids = self.context.entity_ids
+            event_ids = self.context.event_ids
+
+            # role edges
+            df_event_role = edges.read(edges.predicates('ldcOnt:'), header=False,
+                index_col=False, names=['event', 'role', 'entity', 'statement'])
             df_event_role['source'] = source
 
             df_event_role = df_event_role.loc[df_event_role['entity'].isin(entity_ids)]
@@ -678,10 +534,7 @@ class Importer(object):
             df_event_role = df_event_role.drop_duplicates().reset_index(drop=True)
 
             # justified by
-            exec_sh('kgtk filter -p ";aida:justifiedBy;" -i {kgtk_file} > {tmp_file}'
-                    .format(kgtk_file=unreified_kgtk_file, tmp_file=self.tmp_file_path()), self.logger)
-            df_just = pd.read_csv(self.tmp_file_path(), delimiter='\t')
-            just_dict = {v['node1']: v['node2'] for _, v in df_just.iterrows()}
+            just_dict = self.justifications(unreified_kgtk_file)
             df_event_role['just'] = None
             df_event_role['just'] = df_event_role['statement'].apply(
                 lambda x: '_:{}'.format(just_dict[x].split(':')[1]))
@@ -700,25 +553,24 @@ class Importer(object):
 
         ### id
         self.logger.info('creating id')
-        exec_sh('kgtk filter -p ";rdf:type;aida:Relation" -i {kgtk_file} > {tmp_file}'
-                     .format(kgtk_file=kgtk_file, tmp_file=self.tmp_file_path()), self.logger)
-        df_relation = pd.read_csv(self.tmp_file_path(), delimiter='\t').drop(columns=['node2', 'label']).rename(
-            columns={'node1': 'e'})
+        df_relation = self.edges(kgtk_file).read(['rdf:type'])
+        df_relation = df_relation.loc[df_relation['node2'] == 'aida:Relation'].drop(columns=['node2', 'label'])\
+            .rename(columns={'node1': 'e'})
         if self.stat_info['relation'] != len(df_relation):
             self.logger.error('TA1 has {} relations, TA2 has {} relations'.format(self.stat_info['relation'], len(df_relation)))
         df_relation = df_relation.drop_duplicates().reset_index(drop=True)
 
         ### type
         self.logger.info('creating type')
-        exec_sh('kgtk filter -p ";rdf:type;" -i {kgtk_file} | kgtk filter --invert -p ";;aida:Relation" > {tmp_file}'
-                     .format(kgtk_file=unreified_kgtk_file, tmp_file=self.tmp_file_path()), self.logger)
-        df_tmp1 = pd.read_csv(self.tmp_file_path(), delimiter='\t').rename(columns={'node1': 'e', 'node2': 'type'})
+        df_tmp1 = self.edges(unreified_kgtk_file).read(['rdf:type'])
+        df_tmp1 = df_tmp1.loc[df_tmp1['node2'] != 'aida:Relation'].rename(columns={'node1': 'e', 'node2': 'type'})
         df_relation_type = pd.merge(df_relation, df_tmp1, left_on='e', right_on='e').drop(columns=['label', 'id'])
 
         ### merge
         df_relation_complete = pd.merge(df_relation, df_relation_type, how='left')
         df_relation_complete['source'] = source
         df_relation_complete = df_relation_complete.drop_duplicates(subset=['e']).reset_index(drop=True)
+        self.context.relation_ids = set(df_relation_complete['e'].tolist())
 
         ### export
         self.logger.info('exporting df')
@@ -727,29 +579,22 @@ class Importer(object):
             df_relation_complete.to_hdf(output_file, 'relation', mode='w', format='fixed')
             df_relation_complete.to_csv(output_file + '.csv')
 
-    def create_relation_role_df(self, kgtk_file, unreified_kgtk_file, output_file, source,
-                                entity_file, event_file, relation_file):
+    def create_relation_role_df(self, kgtk_file, unreified_kgtk_file, output_file, source):
         self.logger.info('creating relation role df for ' + source)
 
         # role
-        exec_sh('kgtk filter --invert -p ";rdf:type;" -i {kgtk_file} > {tmp_file}'
-                     .format(kgtk_file=unreified_kgtk_file, tmp_file=self.tmp_file_path()), self.logger)
-        exec_sh("awk -F'\t' '$2 ~ /^ldcOnt:/' {tmp_file} > {tmp_file1}"
-                     .format(tmp_file=self.tmp_file_path(), tmp_file1=self.tmp_file_path(1)), self.logger)
+        edges = self.edges(unreified_kgtk_file)
         df_relation_role = pd.DataFrame(columns=['relation', 'role', 'entity'])
 
         try:
             # entity, event and relation ids
-            df_entity = pd.read_hdf(entity_file)['e']
-            entity_ids = set([v for v in df_entity.to_dict().values()])
-            df_event = pd.read_hdf(event_file)['e']
-            event_ids = set([v for v in df_event.to_dict().values()])
-            df_relation = pd.read_hdf(relation_file)['e']
-            relation_ids = set([v for v in df_relation.to_dict().values()])
+            entity_ids = self.context.entity_ids
+            event_ids = self.context.event_ids
+            relation_ids = self.context.relation_ids
 
             # read relations
-            df_relation_role = pd.read_csv(self.tmp_file_path(1),
-                delimiter='\t', index_col=False, header=None, names=['relation', 'role', 'e', 'statement'])
+            df_relation_role = edges.read(edges.predicates('ldcOnt:'), header=False,
+                index_col=False, names=['relation', 'role', 'e', 'statement'])
             df_relation_role['source'] = source
 
             df_relation_role = df_relation_role.loc[df_relation_role['relation'].isin(relation_ids)]
@@ -761,10 +606,7 @@ class Importer(object):
             df_relation_role = df_relation_role.drop_duplicates().reset_index(drop=True)
 
             # justified by
-            exec_sh('kgtk filter -p ";aida:justifiedBy;" -i {kgtk_file} > {tmp_file}'
-                    .format(kgtk_file=unreified_kgtk_file, tmp_file=self.tmp_file_path()), self.logger)
-            df_just = pd.read_csv(self.tmp_file_path(), delimiter='\t')
-            just_dict = {v['node1']: v['node2'] for _, v in df_just.iterrows()}
+            just_dict = self.justifications(unreified_kgtk_file)
             df_relation_role['just'] = None
             df_relation_role['just'] = df_relation_role['statement'].apply(
                 lambda x: '_:{}'.format(just_dict[x].split(':')[1]))
@@ -810,32 +652,9 @@ def create_wd_to_fb_mapping():
     pass
 
 
-def load_ldc_kb():
-    kb_names = defaultdict(lambda: {'type': None, 'names': []})
-
-    # entities
-    with open(os.path.join(config['ldc_kg_dir'], 'entities.tab')) as f:
-        for idx, line in enumerate(f):
-            if idx == 0:
-                continue
-            line = line.strip().split('\t')
-            type_, id_, name1 = line[1], line[2], line[3]
-            kb_names[id_]['type'] = type_
-            kb_names[id_]['names'].append(name1)
-            if len(line) >= 5:
-                name2 = line[4]
-                kb_names[id_]['names'].append(name2)
-
-    # alternative names
-    with open(os.path.join(config['ldc_kg_dir'], 'alternate_names.tab')) as f:
-        for idx, line in enumerate(f):
-            if idx == 0:
-                continue
-            line = line.strip().split('\t')
-            id_, name_ = line[0], line[1]
-            kb_names[id_]['names'].append(name_)
-
-    return kb_names
+def extract_target_id(t):
+    m = re_refkb.match(t)
+    return m.group(1) if m else None
 
 
 def load_kb_to_fb_mapping():
@@ -846,21 +665,17 @@ def load_kb_to_fb_mapping():
     return mapping
 
 
-def load_wd_to_fb_df():
-    return convert_nan_to_none(pd.read_csv(config['wd_to_fb_file']))
-
-
 def worker(source):
     importer = Importer(source=source)
     importer.run()
 
 
 def process():
-    global ldc_kg, df_wd_fb, kb_to_fb_mapping
+    global ldc_kg, wd_index, kb_to_fb_mapping
     logger = get_logger('importer-main')
     logger.info('loading resource')
-    ldc_kg = load_ldc_kb()
-    df_wd_fb = load_wd_to_fb_df()
+    ldc_kg = open_index(config['ldc_kg_dir'], config['ldc_kg_index'])
+    wd_index = load_wikidata_index(config['wd_to_fb_file'], config['wd_to_fb_index'])
     kb_to_fb_mapping = load_kb_to_fb_mapping()
 
     logger.info('starting multiprocessing mode')
@@ -910,29 +725,62 @@ def process():
     logger.info('integrity check completed')
 
 
+def explode_tuples(df, key, columns):
+    """
+    One row per element of the tuple columns `columns` (tuples of the same row have the same length).
+    """
+    lengths = df[columns[0]].map(len).to_numpy()
+    result = {key: np.repeat(df[key].to_numpy(), lengths)}
+    for col in columns:
+        result[col] = [v for t in df[col] for v in t]
+    return pd.DataFrame(result, columns=[key] + list(columns))
+
+
+def kb_to_wd_partial(infile):
+    """
+    Map step of generate_kb_to_wd_mapping: (target, fbid) -> max score of one entity df,
+    the score of a pair is target score * fbid average score.
+    """
+    df_entity = pd.read_hdf(infile)[['e', 'target', 'target_score', 'fbid', 'fbid_score_avg']]
+    linked = df_entity['target'].map(lambda v: isinstance(v, tuple) and len(v) > 0) \
+        & df_entity['fbid'].map(lambda v: isinstance(v, tuple) and len(v) > 0)
+    df_entity = df_entity.loc[linked].copy()
+    # pairs of the same row, an entity may have more than one row
+    df_entity['row'] = np.arange(len(df_entity))
+    df_target = explode_tuples(df_entity, 'row', ['target', 'target_score'])
+    df_fb = explode_tuples(df_entity, 'row', ['fbid', 'fbid_score_avg'])
+    df_pair = pd.merge(df_target, df_fb, on='row')
+    df_pair['score'] = pd.to_numeric(df_pair['target_score'], errors='coerce') \
+        * pd.to_numeric(df_pair['fbid_score_avg'], errors='coerce')
+    return df_pair.groupby(['target', 'fbid'])['score'].max().reset_index()
+
+
 def generate_kb_to_wd_mapping(run_name, outfile):
-    df_entity = pd.DataFrame()
-    for infile in glob.glob(os.path.join(config['temp_dir'], run_name, '*/*.entity.h5')):
-        df_entity = df_entity.append(pd.read_hdf(infile))
-    df_entity = df_entity.reset_index(drop=True)
-
-    mapping = defaultdict(lambda: defaultdict(float))
-    for idx, e in df_entity.iterrows():
-        targets = e['target']
-        target_scores = e['target_score']
-        fbs = e['fbid']
-        fb_scores = e['fbid_score_avg']
-        if pd.notna(targets) and pd.notna(fbs):
-            for i, t in enumerate(targets):
-                t_score = target_scores[i]
-                for j, fb in enumerate(fbs):
-                    fb_score = fb_scores[j]
-                    curr_score = 1.0 * t_score * fb_score
-                    prev_score = mapping[t].get(fb)
-                    if prev_score:
-                        mapping[t][fb] = max(curr_score, prev_score)
-                    else:
-                        mapping[t][fb] = curr_score
+    """
+    Map-reduce over the entity dfs of `run_name`: every file is reduced to its partial (target, fbid) max score
+    table in a worker, the partials are merged with one groupby-max.
+    """
+    logger = get_logger('importer-kb-to-wd')
+    partials = []
+    pp = pyrallel.ParallelProcessor(
+        num_of_processor=config['num_of_processor'],
+        mapper=kb_to_wd_partial,
+        collector=partials.append,
+        max_size_per_mapper_queue=config['num_of_processor'] * 2
+    )
+    pp.start()
+    infiles = glob.glob(os.path.join(config['temp_dir'], run_name, '*/*.entity.h5'))
+    for infile in infiles:
+        pp.add_task(infile)
+    pp.task_done()
+    pp.join()
+    logger.info('{} entity dfs mapped'.format(len(partials)))
+
+    mapping = defaultdict(dict)
+    if partials:
+        df_mapping = pd.concat(partials, ignore_index=True).groupby(['target', 'fbid'])['score'].max()
+        for (target, fbid), score in df_mapping.items():
+            mapping[target][fbid] = score
     with open(outfile, 'w') as f:
         json.dump(mapping, f)
 
@@ -944,7 +792,7 @@ if __name__ == '__main__':
     elif argv[1] == 'kb_to_wd':
         run_name = argv[2]
         outfile = argv[3]
-        generate_kb_to_wd_mapping(outfile)
+        generate_kb_to_wd_mapping(run_name, outfile)
     elif argv[1] == 'create_namespace':
         outfile = argv[2]
 
@@ -0,0 +1,88 @@
+import io
+import os
+import pandas as pd
+
+
+BUFFER_SIZE = 64 * 1024 * 1024
+
+
+class PredicatePartitions(object):
+    """
+    Edges of a KGTK file bucketed by predicate (`label`) in a single pass, so that a filter on some predicates
+    only reads their buckets instead of scanning the whole file again.
+
+    Every bucket is a headerless file `{prefix}.{n}`. Lines are buffered (at most BUFFER_SIZE bytes in total)
+    and appended to the buckets when the buffer is full, so neither the memory nor the number of open files
+    depends on the number of predicates.
+    Rows of one predicate keep their order in the file, rows of several predicates are grouped by predicate
+    (in sorted order, which is the order of the rows of a node in a file sorted by node1 and label).
+    """
+
+    def __init__(self, infile, prefix):
+        self.infile = infile
+        self.prefix = prefix
+        self.header = None
+        self.buckets = {}
+
+    def bucket_file(self, predicate):
+        if predicate not in self.buckets:
+            self.buckets[predicate] = '{}.{}'.format(self.prefix, len(self.buckets))
+        return self.buckets[predicate]
+
+    def partition(self):
+        buffers = {}
+        size = 0
+
+        def flush():
+            for predicate, lines in buffers.items():
+                # a bucket left over from an earlier run is overwritten
+                mode = 'ab' if predicate in self.buckets else 'wb'
+                with open(self.bucket_file(predicate), mode) as f:
+                    f.writelines(lines)
+            buffers.clear()
+
+        with open(self.infile, 'rb') as f:
+            self.header = f.readline()
+            label = self.header.rstrip(b'\r\n').split(b'\t').index(b'label')
+            for line in f:
+                if not line.strip():
+                    continue
+                if not line.endswith(b'\n'):
+                    line += b'\n'
+                predicate = line.split(b'\t', label + 2)[label].decode('utf-8')
+                buffers.setdefault(predicate, []).append(line)
+                size += len(line)
+                if size >= BUFFER_SIZE:
+                    flush()
+                    size = 0
+        flush()
+        return self
+
+    def predicates(self, prefix=''):
+        return sorted(p for p in self.buckets if p.startswith(prefix))
+
+    def read(self, predicates, header=True, contains=None, **kwargs):
+        """
+        pd.read_csv of the rows of `predicates`, as `kgtk filter -p ";p1,p2;"` would output them.
+        `header=False` leaves the header out (pass `names`), `contains` keeps the lines containing it, like grep.
+        """
+        content = io.BytesIO()
+        if header:
+            content.write(self.header)
+        for predicate in sorted(set(predicates)):
+            if predicate not in self.buckets:
+                continue
+            with open(self.buckets[predicate], 'rb') as f:
+                if contains is None:
+                    content.write(f.read())
+                else:
+                    needle = contains.encode('utf-8')
+                    content.writelines(line for line in f if needle in line)
+        content.seek(0)
+        return pd.read_csv(content, delimiter='\t', **kwargs)
+
+    def remove(self):
+        for bucket in self.buckets.values():
+            if os.path.exists(bucket):
+                os.remove(bucket)
+        self.buckets = {}
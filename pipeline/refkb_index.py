@@ -0,0 +1,259 @@
+import os
+import sys
+import json
+import mmap
+import struct
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+
+
+MAGIC = b'REFKB002'
+HEADER = struct.Struct('<8sQQQQ')  # magic, number of ids, number of types, number of names, source length
+TABS = ('entities.tab', 'alternate_names.tab')
+
+
+class RefKBIndex(object):
+    """
+    Read-only LDC reference KB index: id -> type and names, memory mapped so that all the workers share the same
+    pages. Built once from `entities.tab` and `alternate_names.tab` (see build_index).
+
+    File layout (little endian):
+        header          magic, n ids, t types, m names, s source length
+        source          utf-8 json of tabs_stamp, zero padded to a multiple of 8 bytes
+        prefixes        uint64[n], first 8 bytes of every id (big endian, zero padded) to narrow down the search
+        id_offsets      uint64[n + 1]
+        name_starts     uint64[n + 1], names of id i are names[name_starts[i]:name_starts[i + 1]]
+        name_offsets    uint64[m + 1]
+        type_offsets    uint64[t + 1]
+        type_codes      int32[n], -1 if the id has no type (only alternate names)
+        ids             utf-8 blob, ids sorted bytewise
+        names           utf-8 blob
+        types           utf-8 blob
+    Opening it only maps the file, there's nothing to load.
+    """
+
+    def __init__(self, index_file):
+        self.index_file = index_file
+        self.fp = open(index_file, 'rb')
+        try:
+            self.mm = mmap.mmap(self.fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            self.fp.close()
+            raise ValueError('{} is not a REFKB index'.format(index_file))
+        magic = self.mm[:len(MAGIC)]
+        if magic != MAGIC:
+            self.close()
+            raise ValueError('{} is not a REFKB index'.format(index_file))
+        _, self.n, t, m, s = HEADER.unpack_from(self.mm, 0)
+        self.source = json.loads(self.mm[HEADER.size:HEADER.size + s].decode('utf-8'))
+        offset = HEADER.size + padded(s)
+
+        def array(dtype, count):
+            nonlocal offset
+            a = np.frombuffer(self.mm, dtype=dtype, count=count, offset=offset)
+            offset += a.nbytes
+            return a
+
+        self.prefixes = array('>u8', self.n)
+        self.id_offsets = array('<u8', self.n + 1)
+        self.name_starts = array('<u8', self.n + 1)
+        self.name_offsets = array('<u8', m + 1)
+        type_offsets = array('<u8', t + 1)
+        self.type_codes = array('<i4', self.n)
+        self.ids_start = offset
+        self.names_start = self.ids_start + int(self.id_offsets[-1])
+        types_start = self.names_start + int(self.name_offsets[-1])
+        self.types = [self.mm[types_start + int(type_offsets[i]):types_start + int(type_offsets[i + 1])]
+                      .decode('utf-8') for i in range(t)]
+
+    def close(self):
+        self.prefixes = self.id_offsets = self.name_starts = self.name_offsets = self.type_codes = None
+        self.types = None
+        self.mm.close()
+        self.fp.close()
+
+    def __len__(self):
+        return self.n
+
+    def key(self, i):
+        return self.mm[self.ids_start + int(self.id_offsets[i]):self.ids_start + int(self.id_offsets[i + 1])]
+
+    def names(self, i):
+        start, end = int(self.name_starts[i]), int(self.name_starts[i + 1])
+        offsets = self.name_offsets[start:end + 1].tolist()
+        return tuple(self.mm[self.names_start + offsets[j]:self.names_start + offsets[j + 1]].decode('utf-8')
+                     for j in range(end - start))
+
+    def type(self, i):
+        code = int(self.type_codes[i])
+        return self.types[code] if code >= 0 else None
+
+    def positions(self, ids):
+        """
+        {id: position} of the ids which are in the index. The prefix array narrows every id down to the keys
+        sharing its first 8 bytes (one vectorized search), then a binary search on the full keys finishes it.
+        """
+        ids = [i for i in set(ids) if isinstance(i, str)]
+        if not ids or not self.n:
+            return {}
+        encoded = [i.encode('utf-8') for i in ids]
+        query_prefixes = np.array([prefix(k) for k in encoded], dtype='>u8')
+        lo = np.searchsorted(self.prefixes, query_prefixes, side='left')
+        hi = np.searchsorted(self.prefixes, query_prefixes, side='right')
+
+        result = {}
+        for id_, k, l, h in zip(ids, encoded, lo.tolist(), hi.tolist()):
+            while l < h:
+                mid = (l + h) // 2
+                if self.key(mid) < k:
+                    l = mid + 1
+                else:
+                    h = mid
+            if l < self.n and self.key(l) == k:
+                result[id_] = l
+        return result
+
+    def lookup(self, ids):
+        """
+        Batched lookup, returns the columnar table of the ids which are in the index:
+        indexed by `target_id`, `target_type` and `target_name` (tuple of names).
+        """
+        positions = self.positions(ids)
+        return pd.DataFrame({
+            'target_type': [self.type(i) for i in positions.values()],
+            'target_name': [self.names(i) for i in positions.values()],
+        }, index=pd.Index(list(positions.keys()), name='target_id'), columns=['target_type', 'target_name'])
+
+    def get(self, id_, default=None):
+        """
+        {'type': ..., 'names': [...]} of an id, like the dict of read_tabs.
+        """
+        i = self.positions([id_]).get(id_)
+        if i is None:
+            return default
+        return {'type': self.type(i), 'names': list(self.names(i))}
+
+    def __contains__(self, id_):
+        return id_ in self.positions([id_])
+
+    def items(self):
+        # in id order
+        for i in range(self.n):
+            yield self.key(i).decode('utf-8'), {'type': self.type(i), 'names': list(self.names(i))}
+
+
+def prefix(key):
+    return int.from_bytes(key[:8].ljust(8, b'\0'), 'big')
+
+
+def padded(size):
+    return -(-size // 8) * 8
+
+
+def tabs_stamp(ldc_kg_dir):
+    """
+    Source of an index: the REFKB directory and the size and mtime of its tab files.
+    """
+    tabs = []
+    for name in TABS:
+        f = os.path.join(ldc_kg_dir, name)
+        if os.path.exists(f):
+            st = os.stat(f)
+            tabs.append([name, st.st_size, st.st_mtime_ns])
+    return {'dir': os.path.abspath(ldc_kg_dir), 'tabs': tabs}
+
+
+def read_tabs(ldc_kg_dir):
+    """
+    {id: {'type', 'names'}} of the REFKB tab files, names of an id in file order.
+    """
+    kb_names = defaultdict(lambda: {'type': None, 'names': []})
+
+    # entities
+    with open(os.path.join(ldc_kg_dir, 'entities.tab')) as f:
+        for idx, line in enumerate(f):
+            if idx == 0:
+                continue
+            line = line.strip().split('\t')
+            type_, id_, name1 = line[1], line[2], line[3]
+            kb_names[id_]['type'] = type_
+            kb_names[id_]['names'].append(name1)
+            if len(line) >= 5:
+                name2 = line[4]
+                kb_names[id_]['names'].append(name2)
+
+    # alternative names
+    with open(os.path.join(ldc_kg_dir, 'alternate_names.tab')) as f:
+        for idx, line in enumerate(f):
+            if idx == 0:
+                continue
+            line = line.strip().split('\t')
+            id_, name_ = line[0], line[1]
+            kb_names[id_]['names'].append(name_)
+
+    return kb_names
+
+
+def build_index(ldc_kg_dir, index_file):
+    """
+    Build the index from the REFKB `data` directory, returns the number of ids.
+    """
+    # stamped before reading, a tab file changed in the meantime makes the next open rebuild it
+    source = json.dumps(tabs_stamp(ldc_kg_dir)).encode('utf-8')
+    kb_names = read_tabs(ldc_kg_dir)
+    keys = sorted(kb_names.keys(), key=lambda k: k.encode('utf-8'))
+    types = sorted(set(v['type'] for v in kb_names.values() if v['type'] is not None))
+    type_code = {t: c for c, t in enumerate(types)}
+
+    encoded_keys = [k.encode('utf-8') for k in keys]
+    encoded_names = [name.encode('utf-8') for k in keys for name in kb_names[k]['names']]
+    encoded_types = [t.encode('utf-8') for t in types]
+
+    def offsets(lengths):
+        result = np.zeros(len(lengths) + 1, dtype='<u8')
+        result[1:] = np.cumsum(lengths)
+        return result
+
+    os.makedirs(os.path.dirname(index_file) or '.', exist_ok=True)
+    tmp_file = index_file + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(keys), len(types), len(encoded_names), len(source)))
+        f.write(source.ljust(padded(len(source)), b'\0'))
+        f.write(np.array([prefix(k) for k in encoded_keys], dtype='>u8').tobytes())
+        f.write(offsets([len(k) for k in encoded_keys]).tobytes())
+        f.write(offsets([len(kb_names[k]['names']) for k in keys]).tobytes())
+        f.write(offsets([len(name) for name in encoded_names]).tobytes())
+        f.write(offsets([len(t) for t in encoded_types]).tobytes())
+        f.write(np.array([type_code.get(kb_names[k]['type'], -1) for k in keys], dtype='<i4').tobytes())
+        f.writelines(encoded_keys)
+        f.writelines(encoded_names)
+        f.writelines(encoded_types)
+    os.replace(tmp_file, index_file)
+    return len(keys)
+
+
+def open_index(ldc_kg_dir, index_file):
+    """
+    Open the index, it's (re)built first if it doesn't exist, has an older layout or was built from another
+    directory or another version of the tab files.
+    """
+    if os.path.exists(index_file):
+        try:
+            index = RefKBIndex(index_file)
+        except ValueError:
+            pass
+        else:
+            if index.source == tabs_stamp(ldc_kg_dir):
+                return index
+            index.close()
+    build_index(ldc_kg_dir, index_file)
+    return RefKBIndex(index_file)
+
+
+if __name__ == '__main__':
+    argv = sys.argv
+    if argv[1] == 'build':
+        # python refkb_index.py build <REFKB>/data refkb.idx
+        n = build_index(argv[2], argv[3])
+        print('{} REFKB ids indexed'.format(n))
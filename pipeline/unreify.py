@@ -0,0 +1,180 @@
+import os
+import zlib
+import hashlib
+
+
+BUFFER_SIZE = 512 * 1024 * 1024
+# memory of the grouped rows (lists of str in a dict, then the output rows) per byte of input, measured ~7x
+MEMORY_FACTOR = 8
+MAX_DEPTH = 3  # times a partition still over the budget is spilled again
+
+RDF_TYPE = 'rdf:type'
+RDF_STATEMENT = 'rdf:Statement'
+RDF_SUBJECT = 'rdf:subject'
+RDF_PREDICATE = 'rdf:predicate'
+RDF_OBJECT = 'rdf:object'
+
+
+def partition_of(node, num_partitions, depth=0):
+    # crc32 is stable across processes, hash() is not. A partition spilled again needs a hash independent of
+    # the first one, crc32 with another start value would keep the colliding nodes together
+    if depth == 0:
+        return zlib.crc32(node.encode('utf-8')) % num_partitions
+    digest = hashlib.blake2b(node.encode('utf-8'), digest_size=8, salt=str(depth).encode('utf-8')).digest()
+    return int.from_bytes(digest, 'little') % num_partitions
+
+
+def make_new_id(edge_id, count, width):
+    # same ids as kgtk unreify-rdf-statements
+    if edge_id.startswith('"') and edge_id.endswith('"'):
+        return edge_id[:-1] + '-' + str(count).zfill(width) + '"'
+    return edge_id + '-' + str(count).zfill(width)
+
+
+class Unreifier(object):
+    """
+    `kgtk unreify-rdf-statements -i infile / sort --columns 1,2` without the sort.
+
+    The edges of a statement node (rdf:type rdf:Statement, rdf:subject, rdf:predicate, rdf:object) are grouped
+    with a hash keyed on the node and turned into the (subject, predicate, object) edge with the statement as id,
+    its other edges become edges of that id, like kgtk does. The output edges are grouped by node1 with a second
+    hash and every group is sorted by label, so the edges of a node come out together and in the same order as
+    the sorted file, only the order of the nodes differs.
+
+    `buffer_size` is the memory budget of the grouping. Grouped rows take about MEMORY_FACTOR times their bytes,
+    a file bigger than the budget allows is spilled into partitions by node1 hash (`{prefix}.in.{n}`,
+    `{prefix}.out.{n}`) which are grouped one at a time. A partition still over the budget (skewed node1s) is
+    spilled again with another hash, up to MAX_DEPTH times. The edges of one node1 are always grouped together,
+    so a single node1 bigger than the budget still goes over it.
+    """
+
+    def __init__(self, infile, outfile, prefix, buffer_size=BUFFER_SIZE):
+        self.infile = infile
+        self.outfile = outfile
+        self.prefix = prefix
+        self.buffer_size = buffer_size
+
+    def num_partitions(self, size):
+        return max(1, -(-size * MEMORY_FACTOR // self.buffer_size))
+
+    def run(self):
+        num_partitions = self.num_partitions(os.path.getsize(self.infile))
+        with open(self.infile, 'r', encoding='utf-8') as fin:
+            header = fin.readline().rstrip('\r\n').split('\t')
+            self.node1, self.label, self.node2 = (header.index(c) for c in ('node1', 'label', 'node2'))
+            self.new_id_column = 'id' not in header
+            self.width = len(header) + (1 if self.new_id_column else 0)
+            out_header = header + ['id'] if self.new_id_column else header
+            self.id = out_header.index('id')
+
+            with open(self.outfile, 'w', encoding='utf-8') as fout:
+                fout.write('\t'.join(out_header) + '\n')
+                if num_partitions == 1:
+                    self.write_groups(fout, self.unreify(self.rows(fin)))
+                else:
+                    unreified = (row for rows in self.partitions(self.rows(fin), 'in', num_partitions)
+                                 for row in self.unreify(rows))
+                    for rows in self.partitions(unreified, 'out', num_partitions):
+                        self.write_groups(fout, rows)
+
+    def rows(self, lines):
+        for line in lines:
+            line = line.rstrip('\r\n')
+            if line:
+                yield line.split('\t')
+
+    def groups(self, rows):
+        # node1 -> rows, in order of first appearance
+        groups = {}
+        for row in rows:
+            groups.setdefault(row[self.node1], []).append(row)
+        return groups
+
+    def spill(self, rows, name, num_partitions, depth=0):
+        files = ['{}.{}.{}'.format(self.prefix, name, i) for i in range(num_partitions)]
+        fouts = [open(f, 'w', encoding='utf-8') for f in files]
+        try:
+            for row in rows:
+                fouts[partition_of(row[self.node1], num_partitions, depth)].write('\t'.join(row) + '\n')
+        finally:
+            for fout in fouts:
+                fout.close()
+        return files
+
+    def partitions(self, rows, name, num_partitions, depth=0):
+        """
+        Spill `rows` into `num_partitions` partitions and yield the rows of one partition at a time,
+        a partition over the budget is spilled again.
+        """
+        for i, partition_file in enumerate(self.spill(rows, name, num_partitions, depth)):
+            n = self.num_partitions(os.path.getsize(partition_file))
+            if n > 1 and depth < MAX_DEPTH:
+                yield from self.partitions(
+                    self.stream_partition(partition_file), '{}.{}'.format(name, i), n, depth + 1)
+            else:
+                yield self.read_partition(partition_file)
+
+    def stream_partition(self, partition_file):
+        with open(partition_file, 'r', encoding='utf-8') as f:
+            yield from self.rows(f)
+        os.remove(partition_file)
+
+    def read_partition(self, partition_file):
+        with open(partition_file, 'r', encoding='utf-8') as f:
+            rows = list(self.rows(f))
+        os.remove(partition_file)
+        return rows
+
+    def write_groups(self, fout, rows):
+        for group in self.groups(rows).values():
+            group.sort(key=lambda row: row[self.label])
+            for row in group:
+                fout.write('\t'.join(row) + '\n')
+
+    def edge(self, node1, label, node2, id_):
+        row = [''] * self.width
+        row[self.node1], row[self.label], row[self.node2], row[self.id] = node1, label, node2, id_
+        return row
+
+    def unreify(self, rows):
+        """
+        Output rows of the groups of `rows`, in no particular order.
+        """
+        for node1, group in self.groups(rows).items():
+            triggered = False
+            subjects, predicates, objects = set(), set(), set()
+            attributes = []
+            for row in group:
+                label, node2 = row[self.label], row[self.node2]
+                if label == RDF_TYPE and node2 == RDF_STATEMENT:
+                    triggered = True
+                elif label == RDF_OBJECT:
+                    objects.add(node2)
+                elif label == RDF_PREDICATE:
+                    predicates.add(node2)
+                elif label == RDF_SUBJECT:
+                    subjects.add(node2)
+                else:
+                    attributes.append(row)
+
+            product = len(subjects) * len(predicates) * len(objects)
+            if not triggered or product == 0:
+                for row in group:
+                    yield row + [''] if self.new_id_column else row
+                continue
+
+            if product == 1:
+                edges = [(node1, subjects.pop(), predicates.pop(), objects.pop())]
+            else:
+                width = len(str(product))
+                edges = []
+                for s in sorted(subjects):
+                    for p in sorted(predicates):
+                        for o in sorted(objects):
+                            edges.append((make_new_id(node1, len(edges) + 1, width), s, p, o))
+
+            attribute_width = len(str(len(attributes)))
+            for edge_id, s, p, o in edges:
+                yield self.edge(s, p, o, edge_id)
+                for i, row in enumerate(attributes):
+                    yield self.edge(edge_id, row[self.label], row[self.node2], make_new_id(edge_id, i + 1, attribute_width))
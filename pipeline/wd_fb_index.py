@@ -0,0 +1,112 @@
+import sys
+import pickle
+from collections import defaultdict
+import pandas as pd
+
+
+LANGUAGES = ('en', 'ru', 'uk')
+FIELDS = ('label', 'description', 'alias')
+# columns of the entity df, in the order of the expanded values of a qnode
+WIKIDATA_COLUMNS = ['wikidata_{}_{}'.format(field, lang) for field in FIELDS for lang in LANGUAGES]
+
+
+def expand(s, multiple=False):
+    if s is None:
+        return {}
+    # expand labels, e.g. 'Kyiv'@en|'Київ'@uk
+    result = defaultdict(list) if multiple else {}
+    labels = s.split('|')
+    for l in labels:
+        lang, content = l[-2:], l[1:-4]
+        if multiple:
+            result[lang].append(content)
+        else:
+            result[lang] = content
+    return {k: tuple(result[k]) for k in result.keys()} if multiple else result
+
+
+def format_fbid(fbid):
+    if not fbid or 'NIL' in fbid: return None
+    # .startswith('LDC2015E42:NIL'): return None
+    fbid = '/' + fbid.replace('.', '/')
+    return fbid
+
+
+class WikidataIndex(object):
+    """
+    Freebase id -> qnode and qnode -> expanded labels, descriptions and aliases (WIKIDATA_COLUMNS),
+    built once from the Wikidata to Freebase mapping (`df_wd_fb.csv`) instead of scanning it for every id.
+    Like the scans it replaces, the first row of an fbid or a qnode wins.
+    """
+
+    def __init__(self, fbid_to_qnode, qnode_values):
+        self.fbid_to_qnode = fbid_to_qnode
+        self.qnode_values = qnode_values
+
+    @classmethod
+    def from_csv(cls, wd_to_fb_file):
+        df = pd.read_csv(wd_to_fb_file, usecols=['qnode', 'fbid', 'label', 'description', 'alias'])
+        df = df.astype(object).where(pd.notnull(df), None)
+
+        fbid_to_qnode = {}
+        for fbid, qnode in zip(df['fbid'].tolist(), df['qnode'].tolist()):
+            if fbid is not None and fbid not in fbid_to_qnode:
+                fbid_to_qnode[fbid] = qnode
+
+        qnode_values = {}
+        for qnode, label, description, alias in zip(
+                df['qnode'].tolist(), df['label'].tolist(), df['description'].tolist(), df['alias'].tolist()):
+            if qnode is None or qnode in qnode_values:
+                continue
+            expanded = (expand(label), expand(description), expand(alias, multiple=True))
+            qnode_values[qnode] = tuple(field.get(lang) for field in expanded for lang in LANGUAGES)
+        return cls(fbid_to_qnode, qnode_values)
+
+    @classmethod
+    def load(cls, index_file):
+        with open(index_file, 'rb') as f:
+            fbid_to_qnode, qnode_values = pickle.load(f)
+        return cls(fbid_to_qnode, qnode_values)
+
+    def save(self, index_file):
+        with open(index_file, 'wb') as f:
+            pickle.dump((self.fbid_to_qnode, self.qnode_values), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def lookup(self, fbids):
+        """
+        Batched lookup of a column of fbid tuples (as extracted from the TA1 json).
+        Returns a frame with the same index: `wikidata` (qnode of every fbid, None if not found)
+        and WIKIDATA_COLUMNS (value of every qnode, None if it has none), all tuples.
+        Every distinct fbid and qnode is looked up once.
+        """
+        fbids = pd.Series(fbids, dtype=object)
+        qnodes = {}
+        for fbid in set(fb for t in fbids if t for fb in t):
+            qnodes[fbid] = self.fbid_to_qnode.get(format_fbid(fbid))
+        empty = (None,) * len(WIKIDATA_COLUMNS)
+
+        rows = []
+        for t in fbids:
+            t = t or ()
+            row_qnodes = tuple(qnodes[fb] for fb in t)
+            values = [self.qnode_values.get(q, empty) for q in row_qnodes]
+            rows.append((row_qnodes,) + tuple(tuple(v[i] for v in values) for i in range(len(WIKIDATA_COLUMNS))))
+        return pd.DataFrame(rows, index=fbids.index, columns=['wikidata'] + WIKIDATA_COLUMNS, dtype=object)
+
+
+def load_wikidata_index(wd_to_fb_file, index_file=None):
+    """
+    The prebuilt index if there is one, otherwise it's built from the mapping file.
+    """
+    if index_file:
+        return WikidataIndex.load(index_file)
+    return WikidataIndex.from_csv(wd_to_fb_file)
+
+
+if __name__ == '__main__':
+    argv = sys.argv
+    if argv[1] == 'build':
+        # python wd_fb_index.py build df_wd_fb.csv df_wd_fb.idx
+        index = WikidataIndex.from_csv(argv[2])
+        index.save(argv[3])
+        print('{} fbids, {} qnodes indexed'.format(len(index.fbid_to_qnode), len(index.qnode_values)))
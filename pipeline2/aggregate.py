@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+
+def group_starts(df, keys):
+    """
+    Stable sort `df` by `keys` and return it with the start position of every group.
+    Rows with a missing key are dropped (same as groupby).
+    """
+    df = df.dropna(subset=keys).sort_values(keys, kind='mergesort').reset_index(drop=True)
+    if df.empty:
+        return df, np.array([], dtype=np.int64)
+    changed = np.zeros(len(df), dtype=bool)
+    changed[0] = True
+    for k in keys:
+        values = df[k].to_numpy()
+        changed[1:] |= values[1:] != values[:-1]
+    return df, np.flatnonzero(changed)
+
+
+def split_tuples(values, starts):
+    """
+    Cut the list `values` at `starts` and turn every piece into a tuple.
+    """
+    ends = list(starts[1:]) + [len(values)]
+    return [tuple(values[s:e]) for s, e in zip(starts, ends)]
+
+
+def collect_tuples(df, key, columns):
+    """
+    Collect `columns` per `key` into tuples, one row per key.
+
+    Vectorized equivalent of `df.groupby(key)[columns].apply(merge_values).reset_index()`:
+    keys come out sorted, values keep their original order within a key.
+    """
+    df, starts = group_starts(df, [key])
+    result = {key: df[key].to_numpy()[starts]}
+    for col in columns:
+        result[col] = split_tuples(df[col].tolist(), starts)
+    return pd.DataFrame(result, columns=[key] + list(columns))
+
+
+def collect_max_by(df, key, by, max_column, tuple_columns):
+    """
+    Per (`key`, `by`) pair keep the maximum of `max_column` and collect `tuple_columns` into tuples,
+    then collect everything per `key`.
+
+    E.g. key=e, by=type, max_column=type_cv, tuple_columns=[type_just] gives one row per entity with
+    `type` (distinct types), `type_cv` (max cv of each type) and `type_just` (tuple of justifications of each type).
+    Types of an entity are in sorted order.
+    """
+    df, starts = group_starts(df, [key, by])
+    pairs = {
+        key: df[key].to_numpy()[starts],
+        by: df[by].to_numpy()[starts],
+    }
+    if len(starts):
+        pairs[max_column] = np.fmax.reduceat(df[max_column].to_numpy(), starts) \
+            if pd.api.types.is_numeric_dtype(df[max_column]) \
+            else [max(v) for v in split_tuples(df[max_column].tolist(), starts)]
+    else:
+        pairs[max_column] = []
+    for col in tuple_columns:
+        pairs[col] = split_tuples(df[col].tolist(), starts)
+    pairs = pd.DataFrame(pairs, columns=[key, by, max_column] + list(tuple_columns))
+    return collect_tuples(pairs, key, [by, max_column] + list(tuple_columns))
+
+
+def collect_records(df, key, columns):
+    """
+    Collect `columns` per `key` into a list of {column: value} records, one row per key, the list is in column `records`.
+
+    Vectorized equivalent of `df.groupby(key)[columns].apply(...)` turning every row of a group into a dict with
+    `iterrows`: keys come out sorted, records keep their original order within a key.
+    The columns are read once as plain lists and zipped, instead of building a Series per row.
+    """
+    df, starts = group_starts(df, [key])
+    records = [dict(zip(columns, row)) for row in zip(*(df[col].tolist() for col in columns))]
+    ends = list(starts[1:]) + [len(records)]
+    return pd.DataFrame({
+        key: df[key].to_numpy()[starts],
+        'records': [records[s:e] for s, e in zip(starts, ends)],
+    }, columns=[key, 'records'])
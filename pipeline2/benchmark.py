@@ -0,0 +1,315 @@
+import os
+import sys
+import time
+import json
+import shutil
+import filecmp
+import tempfile
+import traceback
+import subprocess
+import multiprocessing
+import numpy as np
+import pandas as pd
+from config import config, get_logger
+import importer
+import clusterer
+import exporter
+from importer import Importer
+from aggregate import collect_tuples, collect_max_by, collect_records
+from metrics import peak_rss, cpu_time
+import synthetic
+
+
+logger = get_logger('benchmark')
+
+
+def count_lines(infile):
+    n = 0
+    with open(infile, 'rb') as f:
+        for _ in f:
+            n += 1
+    return n
+
+
+def bench_convert(ttl_file, repeat=3):
+    """
+    Compare the riot + regex conversion (temp file, second pass) with the streaming conversion.
+    """
+    source = os.path.basename(ttl_file).split('.')[0]
+    size_mb = os.stat(ttl_file).st_size / 1024 / 1024
+    importer = Importer(source=source)
+    os.makedirs(config['temp_dir'], exist_ok=True)
+    importer.temp_dir = tempfile.mkdtemp(dir=config['temp_dir'])
+    stream_convert = config.get('stream_convert', False)
+
+    outputs = {}
+    try:
+        for mode in ('riot', 'stream'):
+            config['stream_convert'] = mode == 'stream'
+            nt_file = os.path.join(importer.temp_dir, f'{source}.{mode}.nt')
+            elapsed = []
+            for _ in range(repeat):
+                start = time.time()
+                importer.convert_ttl_to_nt(ttl_file, nt_file)
+                elapsed.append(time.time() - start)
+            best = min(elapsed)
+            triples = count_lines(nt_file)
+            outputs[mode] = nt_file
+            logger.info(f'{mode}: best of {repeat} {best:.2f}s, {size_mb / best:.2f} MB/s, {triples / best:.0f} triples/s')
+
+        if not filecmp.cmp(outputs['riot'], outputs['stream'], shallow=False):
+            logger.error('outputs of riot and stream conversion are different')
+    finally:
+        config['stream_convert'] = stream_convert
+        for nt_file in outputs.values():
+            os.remove(nt_file)
+        importer.clean_temp_files()
+        os.rmdir(importer.temp_dir)
+
+
+def merge_values(values):
+    # groupby-apply reference of collect_tuples
+    ret = {}
+    for col in values.columns:
+        ret[col] = tuple(values[col].tolist())
+    return pd.Series(ret)
+
+
+def merge_just(v):
+    # row-wise reference of collect_max_by
+    result = {'e': v['e'], 'type': [], 'type_cv': [], 'type_just': []}
+    type_, type_cv, type_just = v['type'], v['type_cv'], v['type_just']
+    for t in sorted(set(type_)):
+        indices = [i for i, x in enumerate(type_) if x == t]
+        result['type'].append(t)
+        result['type_cv'].append(max([type_cv[i] for i in indices]))
+        result['type_just'].append(tuple([type_just[i] for i in indices]))
+    return pd.Series({k: tuple(v) if k != 'e' else v for k, v in result.items()})
+
+
+def merge_time(values):
+    # iterrows reference of collect_records
+    output = []
+    for idx, row in values.iterrows():
+        output_inner = {}
+        for k, v in row.items():
+            output_inner[k] = v
+        output.append(output_inner)
+    return pd.Series({'dt': output})
+
+
+def same_values(df1, df2):
+    # row-wise apply doesn't keep column dtypes, only compare columns and values
+    return list(df1.columns) == list(df2.columns) and df1.values.tolist() == df2.values.tolist()
+
+
+def bench_aggregate(rows=10 ** 6, repeat=3):
+    """
+    Compare groupby-apply merge_values / row-wise merge_just with the vectorized collect_tuples / collect_max_by.
+    """
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'e': ['e{}'.format(i) for i in rng.integers(0, rows // 4, rows)],
+        'type': ['t{}'.format(i) for i in rng.integers(0, 50, rows)],
+        'type_cv': rng.random(rows),
+        'type_just': ['j{}'.format(i) for i in range(rows)],
+    })
+
+    def timeit(name, func):
+        elapsed = []
+        for _ in range(repeat):
+            start = time.time()
+            result = func()
+            elapsed.append(time.time() - start)
+        best = min(elapsed)
+        logger.info(f'{name}: best of {repeat} {best:.2f}s, {rows / best:.0f} rows/s')
+        return result
+
+    cols = ['type', 'type_cv', 'type_just']
+    old = timeit('merge_values', lambda: df.groupby('e')[cols].apply(merge_values).reset_index())
+    new = timeit('collect_tuples', lambda: collect_tuples(df, 'e', cols))
+    if not same_values(old, new):
+        logger.error('outputs of merge_values and collect_tuples are different')
+
+    old = timeit('merge_values + merge_just', lambda: df.groupby('e')[cols].apply(merge_values).reset_index()
+                 .apply(merge_just, axis=1).reset_index(drop=True))
+    new = timeit('collect_max_by', lambda: collect_max_by(df, 'e', 'type', 'type_cv', ['type_just']))
+    if not same_values(old, new):
+        logger.error('outputs of merge_just and collect_max_by are different')
+
+
+def bench_time(rows=10 ** 5, repeat=3):
+    """
+    Compare groupby-apply merge_time with the vectorized collect_records on synthetic ldcTime rows.
+    """
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'e': ['e{}'.format(i) for i in rng.integers(0, rows // 2, rows)],
+        'type': rng.choice(['aida:ON', 'aida:BEFORE', 'aida:AFTER', 'aida:UNKNOWN'], rows),
+        'day': np.where(rng.random(rows) < 0.5, np.nan, rng.integers(1, 29, rows)),
+        'month': np.where(rng.random(rows) < 0.3, np.nan, rng.integers(1, 13, rows)),
+        'year': np.where(rng.random(rows) < 0.1, np.nan, rng.integers(1990, 2022, rows)),
+    })
+
+    cols = ['type', 'day', 'month', 'year']
+    elapsed = {}
+    for name, func in (('merge_time', lambda: df.groupby('e')[cols].apply(merge_time).reset_index()),
+                       ('collect_records', lambda: collect_records(df, 'e', cols).rename(columns={'records': 'dt'}))):
+        times = []
+        for _ in range(repeat):
+            start = time.time()
+            result = func()
+            times.append(time.time() - start)
+        elapsed[name] = (min(times), result)
+        logger.info(f'{name}: best of {repeat} {min(times):.2f}s, {rows / min(times):.0f} rows/s')
+
+    # NaN != NaN, compare the string forms of the records
+    old, new = elapsed['merge_time'][1], elapsed['collect_records'][1]
+    if not (list(old.columns) == list(new.columns) and old.astype(str).values.tolist() == new.astype(str).values.tolist()):
+        logger.error('outputs of merge_time and collect_records are different')
+
+
+PIPELINE_STAGES = (
+    ('importer', importer.process),
+    ('clusterer', clusterer.process),
+    ('exporter', exporter.process),
+)
+RESULT_COLUMNS = ['documents', 'stage', 'triples', 'entities', 'wall', 'cpu', 'peak_rss_mb',
+                  'triples_per_s', 'entities_per_s']
+BENCHMARK_CONFIG = ('input_dir', 'output_dir', 'temp_dir', 'run_name', 'subrun_name',
+                    'incremental_import', 'resume_import')
+
+
+def run_forked(func):
+    """
+    Run `func` in a forked process and return its wall time, cpu time and peak RSS (bytes, its own or its
+    largest child's). A fresh process per stage, so that a stage's peak isn't the high-water mark of the previous ones.
+    """
+    ctx = multiprocessing.get_context('fork')
+    queue = ctx.Queue()
+
+    def target():
+        try:
+            start, start_cpu = time.time(), cpu_time()
+            func()
+            wall, cpu = time.time() - start, cpu_time() - start_cpu
+            queue.put({'wall': wall, 'cpu': cpu, 'peak_rss': max(peak_rss())})
+        except:
+            queue.put({'error': traceback.format_exc()})
+
+    process = ctx.Process(target=target)
+    process.start()
+    result = queue.get()
+    process.join()
+    if 'error' in result:
+        raise RuntimeError(result['error'])
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def bench_pipeline(scales, outfile, **counts):
+    """
+    Time importer, clusterer and exporter separately on synthetic runs of `scales` documents
+    (`counts` per document, see synthetic.DEFAULTS) and write the results to `outfile`.
+    Every scale is generated and imported from scratch in `temp_dir`/benchmark, which is removed afterwards.
+    """
+    saved = {k: config.get(k) for k in BENCHMARK_CONFIG}
+    bench_dir = os.path.join(config['temp_dir'], 'benchmark')
+    rows = []
+    try:
+        for documents in scales:
+            root = os.path.join(bench_dir, str(documents))
+            shutil.rmtree(root, ignore_errors=True)
+            config.update({
+                'input_dir': os.path.join(root, 'input'),
+                'output_dir': os.path.join(root, 'output'),
+                'temp_dir': os.path.join(root, 'temp'),
+                'run_name': 'benchmark',
+                'subrun_name': 'synthetic',
+                'incremental_import': False,
+                'resume_import': False,
+            })
+            total = synthetic.generate(os.path.join(config['input_dir'], 'benchmark', 'synthetic'), documents, **counts)
+            logger.info(f'{documents} documents: {total["triples"]} triples, {total["bytes"] / 1024 / 1024:.1f} MB')
+            for stage, func in PIPELINE_STAGES:
+                result = run_forked(func)
+                row = {
+                    'documents': documents,
+                    'stage': stage,
+                    'triples': total['triples'],
+                    'entities': total['entities'],
+                    'wall': result['wall'],
+                    'cpu': result['cpu'],
+                    'peak_rss_mb': result['peak_rss'] / 1024 / 1024,
+                    'triples_per_s': total['triples'] / result['wall'] if result['wall'] else 0.0,
+                    'entities_per_s': total['entities'] / result['wall'] if result['wall'] else 0.0,
+                }
+                rows.append(row)
+                logger.info(f'{stage}: {row["wall"]:.2f}s, {row["triples_per_s"]:.0f} triples/s, '
+                            f'{row["entities_per_s"]:.0f} entities/s, peak RSS {row["peak_rss_mb"]:.0f} MB')
+            shutil.rmtree(root, ignore_errors=True)
+    finally:
+        config.update(saved)
+
+    write_results(rows, outfile, dict(synthetic.DEFAULTS, **counts))
+    return rows
+
+
+def write_results(rows, outfile, counts):
+    """
+    One row per (documents, stage), rounded so that the file of two commits can be diffed.
+    """
+    df = pd.DataFrame(rows, columns=RESULT_COLUMNS)
+    for col in ('wall', 'cpu'):
+        df[col] = df[col].round(2)
+    for col in ('peak_rss_mb', 'triples_per_s', 'entities_per_s'):
+        df[col] = df[col].round().astype(int)
+    with open(outfile, 'w') as f:
+        f.write(f'# commit {git_commit()}\n')
+        f.write(f'# per document {json.dumps(counts, sort_keys=True)}\n')
+        df.to_csv(f, sep='\t', index=False)
+
+
+def read_results(infile):
+    return pd.read_csv(infile, sep='\t', comment='#')
+
+
+def compare_results(old_file, new_file):
+    """
+    Wall time and peak RSS of the stages of `new_file` relative to `old_file`.
+    """
+    df = pd.merge(read_results(old_file), read_results(new_file), on=['documents', 'stage'], suffixes=('_old', '_new'))
+    for _, row in df.iterrows():
+        logger.info(f'{row["documents"]:>8} {row["stage"]:<10} '
+                    f'wall {row["wall_old"]:>8.2f}s -> {row["wall_new"]:>8.2f}s ({row["wall_new"] / row["wall_old"]:.2f}x) '
+                    f'rss {row["peak_rss_mb_old"]:>6} MB -> {row["peak_rss_mb_new"]:>6} MB')
+    return df
+
+
+if __name__ == '__main__':
+    argv = sys.argv
+    if argv[1] == 'convert':
+        ttl_file = argv[2]
+        repeat = int(argv[3]) if len(argv) > 3 else 3
+        bench_convert(ttl_file, repeat)
+    elif argv[1] == 'aggregate':
+        rows = int(argv[2]) if len(argv) > 2 else 10 ** 6
+        repeat = int(argv[3]) if len(argv) > 3 else 3
+        bench_aggregate(rows, repeat)
+    elif argv[1] == 'time':
+        rows = int(argv[2]) if len(argv) > 2 else 10 ** 5
+        repeat = int(argv[3]) if len(argv) > 3 else 3
+        bench_time(rows, repeat)
+    elif argv[1] == 'pipeline':
+        scales = [int(x) for x in argv[2].split(',')]
+        outfile = argv[3] if len(argv) > 3 else 'benchmark.tsv'
+        bench_pipeline(scales, outfile, **synthetic.parse_counts(argv[4:]))
+    elif argv[1] == 'compare':
+        compare_results(argv[2], argv[3])
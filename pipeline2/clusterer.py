@@ -17,6 +17,8 @@ from itertools import combinations
 import glob
 import warnings
 from config import config, get_logger
+from storage import EXTENSIONS, read_frame, write_frame
+from uri_dict import URIDictionary, dictionary_path, URI_COLUMNS, NULL_ID
 from operator import itemgetter
 import requests
 import rltk
@@ -33,6 +35,12 @@ random.seed(2021)
 
 kgtk_p279 = defaultdict(set)
 
+# columns used by clustering and by the exporter, the rest of the importer output is not loaded
+ENTITY_COLUMNS = ['e', 'type', 'type_cv', 'type_just', 'link', 'link_cv', 'info_just', 'asso_claim', 'claim_seman', 'source']
+EVENT_COLUMNS = ['e', 'proto', 'cluster']
+RELATION_COLUMNS = ['e', 'proto', 'cluster']
+ROLE_COLUMNS = ['e1', 'e2', 'e1_type', 'e2_type', 'role', 'cv', 'just']
+
 
 class Cluster(object):
 
@@ -150,25 +158,30 @@ def process():
 
     # load_resource()
 
-    df_entity = pd.DataFrame()
-    df_event = pd.DataFrame()
-    df_relation = pd.DataFrame()
-    df_role = pd.DataFrame()
-
     logger.info('loading entity dataframes')
-    for infile in glob.glob(os.path.join(config['temp_dir'], config['run_name'], config["subrun_name"], '*/*.entity.h5')):
-        source = os.path.basename(infile).split('.')[0]
+    # with uri_encoding, URIs are ids and the uris of a run are the union of the dictionaries of its frames
+    encoded = config.get('uri_encoding', False)
+    df_entity, df_event, df_relation, df_role, dictionaries = [], [], [], [], []
+    entity_ext = '.entity' + EXTENSIONS[config.get('storage_format', 'hdf')]
+    for infile in glob.glob(os.path.join(config['temp_dir'], config['run_name'], config["subrun_name"], '*/*' + entity_ext)):
+        prefix = infile[:-len(entity_ext)]
+        if encoded:
+            for table in ('entity', 'event', 'relation', 'role'):
+                dictionaries.append(read_frame(dictionary_path(prefix + '.' + table)))
         # entity
-        df_entity = df_entity.append(pd.read_hdf(infile))
+        df_entity.append(read_frame(prefix + '.entity', columns=ENTITY_COLUMNS))
         # event
-        event_file = infile[:-len('entity.h5')] + 'event.h5'
-        df_event = df_event.append(pd.read_hdf(event_file))
+        df_event.append(read_frame(prefix + '.event', columns=EVENT_COLUMNS))
         # relation
-        relation_file = infile[:-len('entity.h5')] + 'relation.h5'
-        df_relation = df_relation.append(pd.read_hdf(relation_file))
+        df_relation.append(read_frame(prefix + '.relation', columns=RELATION_COLUMNS))
         # role
-        role_file = infile[:-len('entity.h5')] + 'role.h5'
-        df_role = df_role.append(pd.read_hdf(role_file))
+        df_role.append(read_frame(prefix + '.role', columns=ROLE_COLUMNS))
+    df_entity = pd.concat(df_entity, ignore_index=True) if df_entity else pd.DataFrame(columns=ENTITY_COLUMNS)
+    df_event = pd.concat(df_event, ignore_index=True) if df_event else pd.DataFrame(columns=EVENT_COLUMNS)
+    df_relation = pd.concat(df_relation, ignore_index=True) if df_relation else pd.DataFrame(columns=RELATION_COLUMNS)
+    df_role = pd.concat(df_role, ignore_index=True) if df_role else pd.DataFrame(columns=ROLE_COLUMNS)
+    uris = URIDictionary(dictionaries) if encoded else None
+    del dictionaries
 
     logger.info(f'Read in {len(df_entity)} entities, {len(df_event)} events, {len(df_relation)} relations, {len(df_role)} roles')
     df_entity = df_entity.drop_duplicates(subset=['e'], keep='last')  # cmu data has cross document entities, only keep one
@@ -193,7 +206,6 @@ def process():
     df_entity_cluster['synthetic'] = False
     df_entity_cluster['cluster_member_cv'] = None
 
-    entities = {row['e']: row for row in df_entity_cluster.to_dict(orient='records')}
     unclustered_entities = set(df_entity_cluster['e'].to_list())
     clusters = []
 
@@ -453,15 +465,18 @@ def process():
         cid = ''.join(random.choice(string.ascii_letters + string.digits) for _ in range(10))
         c.id_ = cid
         cid_to_cluster[cid] = c
-        for e in c.rids:
-            entities[e]['cluster'] = cid
+    cluster_uris = [f'gaia:entity/cluster/{c.id_}' for c in clusters]
+    proto_uris = [f'gaia:entity/prototype/{c.id_}' for c in clusters]
+    if encoded:
+        cluster_uris = uris.encode(cluster_uris).tolist()
+        proto_uris = uris.encode(proto_uris).tolist()
 
     # prepare output
-    # assign string id to entities
+    # assign cluster uri to entities
     logger.info('updating cluster info for each entity')
-    for idx, row in df_entity_cluster[['e']].iterrows():
-        df_entity_cluster.at[idx, 'cluster'] = 'gaia:entity/cluster/' + entities[row['e']]['cluster']
-        df_entity_cluster.at[idx, 'cluster_member_cv'] = 1.0
+    entity_to_cluster = {e: cluster for c, cluster in zip(clusters, cluster_uris) for e in c.rids}
+    df_entity_cluster['cluster'] = df_entity_cluster['e'].map(entity_to_cluster)
+    df_entity_cluster['cluster_member_cv'] = 1.0
     # print(len(df_entity_cluster))
 
     # # elect link
@@ -482,10 +497,9 @@ def process():
     # df_entity_prototype = df_entity_cluster.groupby(['cluster']).head(1).reset_index(drop=True)
     prototype_dict = {'e': [], 'cluster': [], 'synthetic': [], 'link': [],
                       'link_cv': [], 'type': [], 'type_cv': []}
-    for c in clusters:
-        cid = c.id_
-        prototype_dict['e'].append(f'gaia:entity/prototype/{cid}')
-        prototype_dict['cluster'].append(f'gaia:entity/cluster/{cid}')
+    for c, cluster, proto in zip(clusters, cluster_uris, proto_uris):
+        prototype_dict['e'].append(proto)
+        prototype_dict['cluster'].append(cluster)
         prototype_dict['synthetic'].append(True)
         # links = [(link, cv) for link, cv in cluster_links[cid].items()]
         prototype_dict['link'].append(tuple(c.links))
@@ -493,6 +507,11 @@ def process():
         prototype_dict['type'].append(tuple(c.types))
         prototype_dict['type_cv'].append(tuple(c.type_cvs))
     df_entity_prototype = pd.DataFrame.from_dict(prototype_dict)
+    if encoded:
+        # prototypes have no justification, NaN would turn the id column into floats
+        for col in URI_COLUMNS['entity']:
+            if col not in df_entity_prototype.columns:
+                df_entity_prototype[col] = NULL_ID
 
     # print(prototype_dict)
     # print(df_entity_prototype.shape)
@@ -502,7 +521,7 @@ def process():
     # df_entity_prototype['e'] = df_entity_prototype['e'].apply(lambda x: f'{x}-prototype')
 
     logger.info('appending dataframes')
-    df_complete_entity_clusters = df_entity_cluster.append(df_entity_prototype).reset_index(drop=True)
+    df_complete_entity_clusters = pd.concat([df_entity_cluster, df_entity_prototype]).reset_index(drop=True)
     # update cluster string id to uri
     # df_complete_entity_clusters['cluster'] = df_complete_entity_clusters['cluster']\
     #     .apply(lambda x: f'{cluster_prefixes[x]}-cluster-{x}')
@@ -512,77 +531,54 @@ def process():
     # event_output_file = os.path.join(config['temp_dir'], config['run_name'], 'event')
     # relation_output_file = os.path.join(config['temp_dir'], config['run_name'], 'relation')
     # role_output_file = os.path.join(config['temp_dir'], config['run_name'], 'role')
-    with warnings.catch_warnings():
-        warnings.simplefilter('ignore')
-        df_complete_entity_clusters.to_hdf(entity_cluster_output_file + '.h5', 'entity', mode='w', format='fixed')
-        df_complete_entity_clusters.to_csv(entity_cluster_output_file + '.h5.csv')
+    write_frame(df_complete_entity_clusters, entity_cluster_output_file, 'entity')
 
     ### construct super edge
     logger.info('constructing super edge')
 
-    entity_to_proto = {}
-    for c in clusters:
-        cid = c.id_
-        for rid in c.rids:
-            entity_to_proto[rid] = f'gaia:entity/prototype/{cid}'
-    event_to_proto = {}
-    for _, row in df_event[['e', 'proto']].iterrows():
-        event_to_proto[row['e']] = row['proto']
-    relation_to_proto = {}
-    for _, row in df_relation[['e', 'proto']].iterrows():
-        relation_to_proto[row['e']] = row['proto']
-
-    # merge edges to be super edges
-    super_edge_merged = defaultdict(
-        lambda: {'just': set([]), 'cv': 0.0, 'proto1': proto1, 'proto2': proto2, 'role': role})
-    for _, row in df_role.iterrows():
-        e1 = row['e1']
-        e2 = row['e2']
-        e1_type = row['e1_type']
-        e2_type = row['e2_type']
-        role = row['role']
-        cv = row['cv']
-        just = row['just']
-
-        proto1 = None
-        if e1_type == 'aida:Event':
-            proto1 = event_to_proto[e1]
-        elif e1_type == 'aida:Relation':
-            proto1 = relation_to_proto[e1]
-        elif e1_type == 'aida:Entity':
-            proto1 = entity_to_proto[e1]
-        else:
-            logger.error(f'Unknown type1 {e1_type} for prototype1 {proto1} while creating the super edge')
-
-        proto2 = None
-        if e2_type == 'aida:Event':
-            proto2 = event_to_proto[e2]
-        elif e2_type == 'aida:Relation':
-            proto2 = relation_to_proto[e2]
-        elif e2_type == 'aida:Entity':
-            proto2 = entity_to_proto[e2]
-        else:
-            logger.error(f'Unknown type2 {e2_type} for prototype2 {proto2} while creating the super edge')
-
-        k = f'{proto1}-{proto2}-{role}'  # key for merging
-        super_edge_merged[k]['just'].add(just)
-        super_edge_merged[k]['cv'] = max(super_edge_merged[k]['cv'], cv)
-
-    # construct dataframe
-    super_edges = {'proto1': [], 'proto2': [], 'role': [], 'cv': [], 'just': []}
-    for _, v in super_edge_merged.items():
-        super_edges['proto1'].append(v['proto1'])
-        super_edges['proto2'].append(v['proto2'])
-        super_edges['role'].append(v['role'])
-        super_edges['cv'].append(v['cv'])
-        super_edges['just'].append(tuple(v['just']))
-    df_super_edge = pd.DataFrame.from_dict(super_edges)
+    # prototype of every entity, event and relation, the arguments of the roles are joined on (e, type)
+    df_proto = pd.DataFrame({
+        'e': [rid for c in clusters for rid in c.rids],
+        'e_type': 'aida:Entity',
+        'proto': [proto for c, proto in zip(clusters, proto_uris) for _ in c.rids],
+    })
+    df_proto = pd.concat([df_proto] + [df for df in (
+        df_event[['e', 'proto']].assign(e_type='aida:Event'),
+        df_relation[['e', 'proto']].assign(e_type='aida:Relation'),
+    ) if len(df)], ignore_index=True)
+    for col in ('e1_type', 'e2_type'):
+        for e_type in set(df_role[col].to_list()) - {'aida:Entity', 'aida:Event', 'aida:Relation'}:
+            logger.error(f'Unknown type {e_type} of {col[:2]} while creating the super edge')
+    if encoded:
+        # a nullable column, so the left joins don't round the 64 bit ids through floats
+        df_proto['proto'] = df_proto['proto'].astype('Int64')
+    # an argument of unknown type (or without prototype) keeps its role, with a missing prototype
+    df_role = df_role \
+        .merge(df_proto.rename(columns={'e': 'e1', 'e_type': 'e1_type', 'proto': 'proto1'}),
+               on=['e1', 'e1_type'], how='left') \
+        .merge(df_proto.rename(columns={'e': 'e2', 'e_type': 'e2_type', 'proto': 'proto2'}),
+               on=['e2', 'e2_type'], how='left')
+    missing = df_role['proto1'].isna() | df_role['proto2'].isna()
+    if missing.any():
+        logger.error(f'{missing.sum()} roles have an argument without prototype')
+    if encoded:
+        for col in ('proto1', 'proto2'):
+            df_role[col] = df_role[col].fillna(NULL_ID).astype('int64')
+
+    # merge edges to be super edges: max cv (at least 0) and distinct justifications of every (proto1, proto2, role)
+    keys = ['proto1', 'proto2', 'role']
+    super_edge_cv = df_role.groupby(keys, sort=False, dropna=False)['cv'].max().clip(lower=0.0).fillna(0.0)
+    super_edge_just = df_role.drop_duplicates(subset=keys + ['just'])\
+        .groupby(keys, sort=False, dropna=False)['just'].agg(tuple)
+    df_super_edge = pd.concat([super_edge_cv, super_edge_just], axis=1).reset_index()[keys + ['cv', 'just']]
+    if not encoded:
+        for col in ('proto1', 'proto2'):
+            df_super_edge[col] = df_super_edge[col].astype(object).where(df_super_edge[col].notna(), None)
 
     super_edge_output_file = os.path.join(config['temp_dir'], config['run_name'], config["subrun_name"], 'super_edge')
-    with warnings.catch_warnings():
-        warnings.simplefilter('ignore')
-        df_super_edge.to_hdf(super_edge_output_file + '.h5', 'super_edge', mode='w', format='fixed')
-        df_super_edge.to_csv(super_edge_output_file + '.h5.csv')
+    write_frame(df_super_edge, super_edge_output_file, 'super_edge')
+    if encoded:
+        uris.save(os.path.join(config['temp_dir'], config['run_name'], config["subrun_name"], 'uris'))
 
 
     # viz
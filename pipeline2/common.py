@@ -1,17 +1,93 @@
+import ast
+import json
 import subprocess
+import threading
+from contextlib import contextmanager
+import pandas as pd
 import os
 # import sh
 
 
-def exec_sh(s, logger):
+def exec_sh(s, logger, check=False):
+    """
+    Run `s` in a shell, a non-zero return code or any stderr is logged.
+    With `check`, a non-zero return code also raises CalledProcessError (stderr alone, e.g. warnings, doesn't).
+    """
     logger.debug('exec_sh:' + s)
     process = subprocess.Popen(s, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     stdout, stderr = process.communicate()
     if process.returncode != 0 or stderr != b'':
         logger.error('exec_sh: %s . return code: %s . stderr: %s', s, process.returncode, stderr)
+    if check and process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, s, stdout, stderr)
     return stdout, stderr
 
 
+@contextmanager
+def exec_sh_stream(s, logger, check=False):
+    """
+    Streaming variant of exec_sh: yields the stdout of `s` as a binary stream (e.g. for pd.read_csv),
+    so the output is parsed while the command is still running and never written to a temp file.
+    stderr is drained in the background and checked like exec_sh once the stream is done.
+    """
+    logger.debug('exec_sh_stream:' + s)
+    process = subprocess.Popen(s, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stderr = []
+    reader = threading.Thread(target=lambda: stderr.append(process.stderr.read()))
+    reader.start()
+    try:
+        yield process.stdout
+    finally:
+        process.stdout.close()
+        process.wait()
+        reader.join()
+        process.stderr.close()
+        if process.returncode != 0 or stderr[0] != b'':
+            logger.error('exec_sh_stream: %s . return code: %s . stderr: %s', s, process.returncode, stderr[0])
+    # only reached if the stream has been consumed without an exception
+    if check and process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, s, None, stderr[0])
+
+
+def unquote_literal(literal):
+    r"""
+    Python string of a KGTK string literal, e.g. "{\"fileType\":\"en\"}" -> {"fileType":"en"}.
+    Plain JSON string escapes are decoded directly, anything else (e.g. \|) by literal_eval, never by eval.
+    """
+    try:
+        return json.loads(literal)
+    except ValueError:
+        return ast.literal_eval(literal)
+
+
+def decode_json_literal(literal):
+    try:
+        value = json.loads(unquote_literal(literal))
+        return value if isinstance(value, dict) else None
+    except (ValueError, SyntaxError, TypeError):
+        return None
+
+
+def decode_json_literals(values, keys=None):
+    """
+    Decode a column of KGTK quoted JSON literals (e.g. aida:jsonContent read with csv.QUOTE_NONE).
+    Identical payloads are decoded once. Values which are missing or not a JSON object decode to None.
+
+    Without `keys`, returns the list of decoded dicts. With `keys`, returns {key: list of values},
+    only the requested keys are extracted from every payload.
+    """
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+    codes = codes.tolist()
+    decoded = [decode_json_literal(v) for v in uniques]
+
+    def take(column):
+        return [column[c] if c >= 0 else None for c in codes]
+
+    if keys is None:
+        return take(decoded)
+    return {k: take([d.get(k) if d is not None else None for d in decoded]) for k in keys}
+
+
 # def exec_sh(s, logger):
 #     logger.debug('exec_sh:' + s)
 #
@@ -37,9 +37,21 @@ def get_config():
             'logging_level': logging.INFO,
             'num_of_processor': 1,
             'extract_mention': True,
+            'stream_convert': True,
+            'stream_clean': True,
+            'kgtk_session': True,
+            'storage_format': 'parquet',
+            'debug_csv': False,
+            'uri_encoding': True,
+            'incremental_import': True,
+            'resume_import': True,
+            'extract_workers': 1,
+            'shard_size': 0,
+            'num_shards': 0,
 
             'namespace_file': '../pipeline2_test/res/aida-namespaces-base.tsv',
             'kgtk_labels': '../pipeline2_test/res/labels.en.100.tsv.gz',
+            'kgtk_labels_index': None,
             'kgtk_p279': '../pipeline2_test/res/derived.P279star.tsv.gz',
             # 'kgtk_search_url': 'https://kgtk.isi.edu/api',
             # 'kgtk_similarity_url': 'https://kgtk.isi.edu/similarity_api',
@@ -59,9 +71,21 @@ def get_config():
             'logging_level': DEBUG_LEVEL.get(get_env_var('LOGGING', optional=True, default='INFO'), logging.INFO),
             'num_of_processor': int(get_env_var('NUM_PROC', optional=True, default='2')),
             'extract_mention': get_env_var('EXTRACT_MENTION', optional=True, default='False').lower() == 'true',
+            'stream_convert': get_env_var('STREAM_CONVERT', optional=True, default='True').lower() == 'true',
+            'stream_clean': get_env_var('STREAM_CLEAN', optional=True, default='True').lower() == 'true',
+            'kgtk_session': get_env_var('KGTK_SESSION', optional=True, default='True').lower() == 'true',
+            'storage_format': get_env_var('STORAGE_FORMAT', optional=True, default='parquet'),
+            'debug_csv': get_env_var('DEBUG_CSV', optional=True, default='False').lower() == 'true',
+            'uri_encoding': get_env_var('URI_ENCODING', optional=True, default='True').lower() == 'true',
+            'incremental_import': get_env_var('INCREMENTAL_IMPORT', optional=True, default='True').lower() == 'true',
+            'resume_import': get_env_var('RESUME_IMPORT', optional=True, default='True').lower() == 'true',
+            'extract_workers': int(get_env_var('EXTRACT_WORKERS', optional=True, default='1')),
+            'shard_size': int(get_env_var('SHARD_SIZE', optional=True, default='0')),
+            'num_shards': int(get_env_var('NUM_SHARDS', optional=True, default='0')),
 
             'namespace_file': os.path.join(get_env_var('NAMESPACE')),
             'kgtk_labels': get_env_var('KGTK_LABELS'),
+            'kgtk_labels_index': get_env_var('KGTK_LABELS_INDEX', optional=True),
             'kgtk_p279': get_env_var('KGTK_P279'),
         }
 
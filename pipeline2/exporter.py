@@ -6,6 +6,8 @@ import re
 from collections import defaultdict
 from config import config, get_logger
 from common import exec_sh
+from storage import read_frame
+from uri_dict import URIDictionary
 
 
 logger = get_logger('exporter')
@@ -107,6 +109,10 @@ SUPER_EDGE_TEMPLATE = """[ a rdf:Statement, aida:ArgumentStatement ;
 
 SUPER_EDGE_JUST_TEMPLATE = """    aida:justifiedBy {just} ;\n"""
 
+# columns of entity_cluster used for export
+ENTITY_COLUMNS = ['e', 'cluster', 'synthetic', 'cluster_member_cv', 'source', 'info_just',
+                  'link', 'link_cv', 'type', 'type_cv', 'type_just', 'asso_claim', 'claim_seman']
+
 # SUPER_EDGE_COMPOUND_JUSTIFICATION = """aida:containedJustification {infojust} ;\n"""
 
 # COLUMNS = ['e', 'name', 'type', 'target', 'target_score', 'target_type',
@@ -132,13 +138,15 @@ SUPER_EDGE_JUST_TEMPLATE = """    aida:justifiedBy {just} ;\n"""
 
 
 class Exporter(object):
-    def __init__(self, entity, super_edge, outfile):
+    def __init__(self, entity, super_edge, outfile, uris=None):
 
-        df = pd.read_hdf(entity)
+        df = read_frame(entity, columns=ENTITY_COLUMNS)
+        # URI ids of the frames (uri_encoding) are only turned back into URIs when they're written
+        self.uris = URIDictionary.load(uris) if uris else None
         self.fp = open(outfile, "w")
         self.df = df[df["synthetic"] == False] # [ESSENTIAL_COLUMNS]
         self.proto_df = df[df["synthetic"] == True] # [ESSENTIAL_COLUMNS]
-        self.df_super_edge = pd.read_hdf(super_edge)
+        self.df_super_edge = read_frame(super_edge)
         self.n = self.df.shape[0]
         self.entities = None
         self.clusters = set()
@@ -168,6 +176,8 @@ class Exporter(object):
         return name_space
 
     def extend_prefix(self, s):
+        if self.uris is not None:
+            s = self.uris.decode(s)
         if s.startswith('<') and s.endswith('>'):
             return s
         if not s.startswith(('http://', 'https://')):
@@ -416,14 +426,15 @@ def process():
     output_dir = os.path.join(config['output_dir'], config['run_name'], config["subrun_name"])
     os.makedirs(output_dir, exist_ok=True)
 
-    infile = os.path.join(temp_dir, 'entity_cluster.h5')
+    infile = os.path.join(temp_dir, 'entity_cluster')
     # event_file = infile[:-len('entity_cluster.h5')] + 'event_cluster.h5'
     # event_role_file = infile[:-len('entity_cluster.h5')] + 'event_role.h5'
     # relation_file = infile[:-len('entity_cluster.h5')] + 'relation_cluster.h5'
     # relation_role_file = infile[:-len('entity_cluster.h5')] + 'relation_role.h5'
-    super_edge_file = infile[:-len('entity_cluster.h5')] + 'super_edge.h5'
+    super_edge_file = os.path.join(temp_dir, 'super_edge')
     outfile = os.path.join(output_dir, 'ta2_entity_cluster.ttl')
-    exporter = Exporter(infile, super_edge_file, outfile)
+    uris_file = os.path.join(temp_dir, 'uris') if config.get('uri_encoding', False) else None
+    exporter = Exporter(infile, super_edge_file, outfile, uris_file)
     exporter.run()
 
     # # assign bnode globally unique id
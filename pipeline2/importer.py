@@ -6,11 +6,25 @@ import csv
 import sys
 from collections import defaultdict
 import glob
+import time
+import threading
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import pyrallel
 from config import config, get_logger
-from common import exec_sh
+from common import exec_sh, exec_sh_stream, decode_json_literals
+from kgtk_session import KgtkQuerySession
+from aggregate import collect_tuples, collect_max_by, collect_records
+from storage import frame_file, write_frame, read_frame
+from uri_dict import URIDictionary, write_table, dictionary_path, uri_ids
+import manifest
+import metrics
+from metrics import Metrics, staged
+import scheduler
+from label_index import LabelIndex
+from sharding import shard_nt
+from ntriples import re_bnode, bnode_replacement, stream_ttl_to_nt, load_namespaces, strip_ta1_clusters
 import re
 
 
@@ -19,50 +33,273 @@ import re
 # kb_to_fb_mapping = None
 kgtk_labels = {}
 
+TABLES = ('entity', 'event', 'relation', 'role')
+
+# bump it when the outputs change, sources imported by another version are not reused
+IMPORTER_VERSION = '2.2'
+
 re_cluster = re.compile(r'<.*InterchangeOntology#(clusterMember|ClusterMembership|SameAsCluster|cluster|prototype)>')
 re_entity = re.compile(r'<.*InterchangeOntology#(Event|Entity|Relation)>')
-re_bnode = re.compile(r'_:([^\s]*)')
 
 
 class Importer(object):
 
-    def __init__(self, source):
+    def __init__(self, source, shard=None):
         self.source = source
-        self.logger = get_logger('importer-' + source)
+        self.shard = shard
+        self.logger = get_logger('importer-' + source + ('' if shard is None else f'-{shard}'))
         self.infile = os.path.join(config['input_dir'], config['run_name'], config['subrun_name'], f'{source}.ttl')
         self.temp_dir = os.path.join(config['temp_dir'], config['run_name'], config['subrun_name'], source)
+        if shard is not None:
+            # a shard of a big source is imported in its own directory, see prepare_shards
+            self.temp_dir = self.shard_dir(shard)
         self.stat_info = {}
+        self.session = None
+        self.local = threading.local()  # temp namespace and query session of an extraction thread
+        self.thread_sessions = []
+        self.lock = threading.Lock()
+        self.metrics = Metrics(source)
 
     def run(self):
+        """
+        Import the source (or the shard), returns False if it failed.
+        """
         # global ldc_kg, df_wd_fb, kb_to_fb_mapping
+        if self.shard is not None:
+            return self.run_shard()
         os.makedirs(self.temp_dir, exist_ok=True)
 
+        nt_file = os.path.join(self.temp_dir, '{}.nt'.format(self.source))
+        cleaned_nt_file = os.path.join(self.temp_dir, '{}.cleaned.nt'.format(self.source))
+        kgtk_file = os.path.join(self.temp_dir, '{}.tsv'.format(self.source))
+        kgtk_db_file = os.path.join(self.temp_dir, '{}.sqlite'.format(self.source))
+        outfiles = {table: os.path.join(self.temp_dir, '{}.{}'.format(self.source, table)) for table in TABLES}
+
+        outputs = self.output_files()
+        fingerprint = None
+        if config.get('incremental_import', False) or config.get('resume_import', False):
+            fingerprint = manifest.fingerprint(self.infile, IMPORTER_VERSION)
+
+        # skip the source if it has been imported from the same inputs
+        if self.reuse_outputs(fingerprint, outputs):
+            return True
+
+        start = time.time()
+        succeeded = False
         try:
 
-            nt_file = os.path.join(self.temp_dir, '{}.nt'.format(self.source))
-            cleaned_nt_file = os.path.join(self.temp_dir, '{}.cleaned.nt'.format(self.source))
-            kgtk_file = os.path.join(self.temp_dir, '{}.tsv'.format(self.source))
-            kgtk_db_file = os.path.join(self.temp_dir, '{}.sqlite'.format(self.source))
-            entity_outfile = os.path.join(self.temp_dir, '{}.entity.h5'.format(self.source))
-            event_outfile = os.path.join(self.temp_dir, '{}.event.h5'.format(self.source))
-            relation_outfile = os.path.join(self.temp_dir, '{}.relation.h5'.format(self.source))
-            role_outfile = os.path.join(self.temp_dir, '{}.role.h5'.format(self.source))
-
-            self.convert_ttl_to_nt(self.infile, nt_file)
-            self.clean_nt(nt_file, cleaned_nt_file)
-            self.convert_nt_to_kgtk(nt_file, kgtk_file)
-            self.create_entity_df(kgtk_file, kgtk_db_file, entity_outfile, self.source)
-            self.create_event_df(kgtk_file, kgtk_db_file, event_outfile, self.source)
-            self.create_relation_df(kgtk_file, kgtk_db_file, relation_outfile, self.source)
-            self.create_role(kgtk_file, kgtk_db_file, role_outfile, self.source)
+            self.run_stage(fingerprint, 'convert_ttl_to_nt', self.convert_ttl_to_nt, (self.infile, nt_file),
+                           [self.infile], [nt_file])
+            self.run_stage(fingerprint, 'clean_nt', self.clean_nt, (nt_file, cleaned_nt_file),
+                           [nt_file], [cleaned_nt_file])
+            self.run_stage(fingerprint, 'convert_nt_to_kgtk', self.convert_nt_to_kgtk, (nt_file, kgtk_file),
+                           [nt_file], [kgtk_file])
+            self.extract(fingerprint, kgtk_file, kgtk_db_file, outfiles)
+            succeeded = True
+
+        except:
+            self.logger.exception('Exception caught in Importer.run()')
+
+        self.close_sessions()
+
+        # intermediate files are kept for resuming the failed stages, until all the outputs exist
+        if not config.get('resume_import', False) or all(os.path.exists(f) for f in outputs):
+            for f in (nt_file, kgtk_file, kgtk_db_file):
+                if os.path.exists(f):
+                    os.remove(f)
+            manifest.remove_checkpoints(self.temp_dir, self.source)
+        self.clean_temp_files()
+        self.metrics.save(self.temp_dir, time.time() - start)
+
+        if config.get('incremental_import', False) and succeeded:
+            manifest.save_manifest(self.temp_dir, self.source, fingerprint, 'rebuilt', time.time() - start)
+        return succeeded
+
+    def output_files(self):
+        """
+        Files written by the import of the source: the tables (and their URI dictionaries) and the cleaned nt.
+        """
+        tables = [os.path.join(self.temp_dir, '{}.{}'.format(self.source, table)) for table in TABLES]
+        if config.get('uri_encoding', False):
+            tables += [dictionary_path(f) for f in tables]
+        return [frame_file(f) for f in tables] + [os.path.join(self.temp_dir, '{}.cleaned.nt'.format(self.source))]
+
+    def reuse_outputs(self, fingerprint, outputs):
+        """
+        With `incremental_import`, True if the outputs have been imported from the same inputs and can be reused.
+        """
+        if not config.get('incremental_import', False):
+            return False
+        if manifest.is_up_to_date(self.temp_dir, self.source, fingerprint, outputs):
+            self.logger.info('outputs are up to date, reuse them')
+            manifest.save_manifest(self.temp_dir, self.source, fingerprint, 'reused')
+            return True
+        manifest.remove_manifest(self.temp_dir, self.source)
+        return False
+
+    def extract(self, fingerprint, kgtk_file, kgtk_db_file, outfiles):
+        """
+        Extract the tables from the kgtk file, `outfiles` is {table: output file}.
+        """
+        with self.metrics.stage('query_session', infile=kgtk_file):
+            if config.get('kgtk_session', False):
+                self.session = KgtkQuerySession(kgtk_db_file, kgtk_file, self.logger)
+        self.run_tasks([
+            (name, self.run_stage, (fingerprint, name, func, (kgtk_file, kgtk_db_file, outfiles[name], self.source),
+                                    [kgtk_file], [frame_file(outfiles[name])]))
+            for name, func in (
+                ('entity', self.create_entity_df),
+                ('event', self.create_event_df),
+                ('relation', self.create_relation_df),
+                ('role', self.create_role),
+            )
+        ])
+
+    def close_sessions(self):
+        for session in self.thread_sessions:
+            session.close()
+        self.thread_sessions = []
+        if self.session:
+            self.session.close()
+            self.session = None
+
+    def shard_dir(self, shard):
+        return os.path.join(config['temp_dir'], config['run_name'], config['subrun_name'], self.source,
+                            'shards', str(shard))
+
+    def prepare_shards(self, num_shards):
+        """
+        Pre-stage of a big source (main process, in a thread while the workers import the other sources):
+        convert and clean the whole ttl, then split the nt into `num_shards` shards by subject hash.
+        `Importer(source, shard)` imports a shard, `merge_shards` merges them back.
+        Returns False if the outputs of the source are up to date.
+        """
+        os.makedirs(self.temp_dir, exist_ok=True)
+        nt_file = os.path.join(self.temp_dir, '{}.nt'.format(self.source))
+        cleaned_nt_file = os.path.join(self.temp_dir, '{}.cleaned.nt'.format(self.source))
+        outputs = self.output_files()
+        self.fingerprint = None
+        if config.get('incremental_import', False) or config.get('resume_import', False):
+            self.fingerprint = manifest.fingerprint(self.infile, IMPORTER_VERSION)
+        if self.reuse_outputs(self.fingerprint, outputs):
+            return False
+
+        self.start = time.time()
+        shard_nt_files, stub_nt_files = [], []
+        for shard in range(num_shards):
+            os.makedirs(self.shard_dir(shard), exist_ok=True)
+            shard_nt_files.append(os.path.join(self.shard_dir(shard), '{}.nt'.format(self.source)))
+            stub_nt_files.append(os.path.join(self.shard_dir(shard), '{}.stubs.nt'.format(self.source)))
+
+        self.run_stage(self.fingerprint, 'convert_ttl_to_nt', self.convert_ttl_to_nt, (self.infile, nt_file),
+                       [self.infile], [nt_file])
+        self.run_stage(self.fingerprint, 'clean_nt', self.clean_nt, (nt_file, cleaned_nt_file),
+                       [nt_file], [cleaned_nt_file])
+        self.logger.info(f'splitting nt into {num_shards} shards')
+        with self.metrics.stage('shard_nt', infile=nt_file):
+            aida = load_namespaces(config['namespace_file'])['aida']
+            counts = shard_nt(nt_file, shard_nt_files, stub_nt_files, aida)
+        self.logger.info('triples per shard: {}'.format(', '.join(str(c) for c in counts)))
+        self.clean_temp_files()
+        return True
 
+    def run_shard(self):
+        """
+        Import a shard written by `prepare_shards`, the tables are written to the shard directory.
+        Returns False if it failed, the source is then not merged.
+        """
+        nt_file = os.path.join(self.temp_dir, '{}.nt'.format(self.source))
+        stub_nt_file = os.path.join(self.temp_dir, '{}.stubs.nt'.format(self.source))
+        kgtk_file = os.path.join(self.temp_dir, '{}.tsv'.format(self.source))
+        stub_kgtk_file = os.path.join(self.temp_dir, '{}.stubs.tsv'.format(self.source))
+        kgtk_db_file = os.path.join(self.temp_dir, '{}.sqlite'.format(self.source))
+        outfiles = {table: os.path.join(self.temp_dir, '{}.{}'.format(self.source, table)) for table in TABLES}
+
+        start = time.time()
+        succeeded = False
+        try:
+            self.convert_nt_to_kgtk(nt_file, kgtk_file)
+            # same import as the shard, so the stub ids are the ids in the tables
+            if os.path.getsize(stub_nt_file) > 0:
+                self.convert_nt_to_kgtk(stub_nt_file, stub_kgtk_file)
+            self.extract(None, kgtk_file, kgtk_db_file, outfiles)
+            succeeded = True
         except:
             self.logger.exception('Exception caught in Importer.run()')
 
-        os.remove(nt_file)
-        os.remove(kgtk_file)
-        os.remove(kgtk_db_file)
+        self.close_sessions()
+        for f in (nt_file, stub_nt_file, kgtk_file, kgtk_db_file):
+            if os.path.exists(f):
+                os.remove(f)
         self.clean_temp_files()
+        self.metrics.save(self.temp_dir, time.time() - start)
+        return succeeded
+
+    def merge_shards(self, num_shards, succeeded):
+        """
+        Merge the tables of the shards into the outputs of the source. Rows of roots a shard only has a stub of
+        (referred to from the shard, owned by another one) are dropped, every other row exists in one shard only.
+        `succeeded` are the shards whose import succeeded, nothing is merged unless all of them did.
+        """
+        failed = [shard for shard in range(num_shards) if shard not in succeeded]
+        if failed:
+            self.logger.error('shards {} failed, the shards are kept'.format(', '.join(str(s) for s in failed)))
+            return
+        self.logger.info(f'merging {num_shards} shards')
+        frames, dictionaries = defaultdict(list), defaultdict(list)
+        encoded = config.get('uri_encoding', False)
+        with self.metrics.stage('merge_shards'):
+            for shard in range(num_shards):
+                stub_kgtk_file = os.path.join(self.shard_dir(shard), '{}.stubs.tsv'.format(self.source))
+                stubs = set(pd.read_csv(stub_kgtk_file, delimiter='\t', usecols=['node1'])['node1']) \
+                    if os.path.exists(stub_kgtk_file) else set()
+                if encoded:
+                    stubs = set(uri_ids(stubs)[0].tolist())
+                for table in TABLES:
+                    path = os.path.join(self.shard_dir(shard), '{}.{}'.format(self.source, table))
+                    if not os.path.exists(frame_file(path)):
+                        self.logger.error(f'shard {shard} has no {table} table, the shards are kept')
+                        return
+                    df = read_frame(path)
+                    if table != 'role':
+                        df = df.loc[~df['e'].isin(stubs)]
+                    frames[table].append(df)
+                    if encoded:
+                        dictionaries[table].append(read_frame(dictionary_path(path)))
+
+            rows = 0
+            for table in TABLES:
+                df = pd.concat(frames[table], ignore_index=True)
+                rows += len(df)
+                path = os.path.join(self.temp_dir, '{}.{}'.format(self.source, table))
+                if encoded:
+                    # the ids don't depend on the shard, only the dictionaries have to be merged
+                    URIDictionary(dictionaries[table]).save(dictionary_path(path))
+                write_frame(df, path, table)
+            self.metrics.count(rows)
+
+        nt_file = os.path.join(self.temp_dir, '{}.nt'.format(self.source))
+        if os.path.exists(nt_file):
+            os.remove(nt_file)
+        shutil.rmtree(os.path.join(self.temp_dir, 'shards'))
+        manifest.remove_checkpoints(self.temp_dir, self.source)
+        self.metrics.save(self.temp_dir, time.time() - self.start)
+        if config.get('incremental_import', False):
+            manifest.save_manifest(self.temp_dir, self.source, self.fingerprint, 'rebuilt', time.time() - self.start)
+
+    def run_stage(self, fingerprint, name, func, args, inputs, outputs):
+        """
+        Run a stage of `run`. With `resume_import`, a stage whose completion marker matches its inputs
+        and whose outputs exist is skipped, and a stage which succeeds writes its marker.
+        """
+        if not fingerprint or not config.get('resume_import', False):
+            return func(*args)
+        key = manifest.stage_key(fingerprint, name, inputs)
+        if manifest.is_stage_done(self.temp_dir, self.source, name, key, outputs):
+            self.logger.info(f'{name} is complete, resume after it')
+            return
+        func(*args)
+        manifest.mark_stage_done(self.temp_dir, self.source, name, key)
 
     def create_namespace_file(self, outfile):
         os.makedirs(self.temp_dir, exist_ok=True)
@@ -70,29 +307,85 @@ class Importer(object):
         kgtk_file = os.path.join(self.temp_dir, '{}.tsv'.format(self.source))
         self.convert_ttl_to_nt(self.infile, nt_file)
         exec_sh('''kgtk import-ntriples -i {nt_file} > {kgtk_file}'''
-                     .format(nt_file=nt_file, kgtk_file=kgtk_file), self.logger)
+                     .format(nt_file=nt_file, kgtk_file=kgtk_file), self.logger, check=True)
         shutil.copy(kgtk_file, outfile)
 
     def tmp_file_path(self, x=None):
         suffix = '' if not x else '.{}'.format(x)
-        return os.path.join(self.temp_dir, 'tmp{}'.format(suffix))
+        namespace = getattr(self.local, 'namespace', None)
+        namespace = '' if not namespace else '.{}'.format(namespace)
+        return os.path.join(self.temp_dir, 'tmp{}{}'.format(namespace, suffix))
+
+    def query_session(self):
+        """
+        Query session of the current thread, extraction threads get a clone if the session can't be shared.
+        """
+        if not self.session or not getattr(self.local, 'worker', False):
+            return self.session
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.session.clone()
+            self.local.session = session
+            if session is not self.session:
+                with self.lock:
+                    self.thread_sessions.append(session)
+        return session
+
+    def run_tasks(self, tasks):
+        """
+        Run independent extraction tasks [(name, func, args)] and return their results in order.
+        With `extract_workers` > 1 they run in a bounded thread pool, every task writes its temp files
+        in its own namespace (nested tasks extend the namespace of their parent).
+        """
+        workers = config.get('extract_workers', 1)
+        if workers <= 1 or len(tasks) <= 1:
+            return [func(*args) for _, func, args in tasks]
+
+        parent = getattr(self.local, 'namespace', None)
+
+        def run_task(name, func, args):
+            self.local.worker = True
+            self.local.namespace = '{}.{}'.format(parent, name) if parent else name
+            try:
+                return func(*args)
+            finally:
+                self.local.namespace = None
+
+        with ThreadPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            futures = [executor.submit(run_task, name, func, args) for name, func, args in tasks]
+            return [f.result() for f in futures]
 
     def clean_temp_files(self):
         for f in glob.glob(os.path.join(self.temp_dir, 'tmp*')):
             os.remove(f)
 
+    def read_sh(self, cmd, **kwargs):
+        """
+        Parse the tsv output of `cmd` while it runs, instead of redirecting it to a tmp file first.
+        """
+        with exec_sh_stream(cmd, self.logger, check=True) as stdout:
+            return pd.read_csv(stdout, delimiter='\t', **kwargs)
+
+    @staged(1)
     def predicate_path(self, dbfile, infile, path, quoting=0, doublequote=True):
         all_p = path.split('/')
         all_p = [f'-[:`{p}`]->' for p in all_p]
         all_p_str = ''.join([f'{all_p[idx]}(t{idx})' for idx in range(len(all_p)-1)]) \
                     + all_p[-1]  # create temp nodes in the middle
 
-        exec_sh('kgtk query --graph-cache "{dbfile}" -i "{infile}" --match \'(s){p}(o)\' --return \'s,o\' > {tmp_file}'
-                .format(dbfile=dbfile, infile=infile, p=all_p_str, tmp_file=self.tmp_file_path()), self.logger)
-        pd_tmp = pd.read_csv(self.tmp_file_path(), delimiter='\t', quoting=quoting, doublequote=doublequote)
-        return pd_tmp
+        session = self.query_session()
+        if session:
+            return session.query(f'(s){all_p_str}(o)', return_='s,o', quoting=quoting, doublequote=doublequote)
+
+        return self.read_sh('kgtk query --graph-cache "{dbfile}" -i "{infile}" --match \'(s){p}(o)\' --return \'s,o\''
+                            .format(dbfile=dbfile, infile=infile, p=all_p_str), quoting=quoting, doublequote=doublequote)
 
+    @staged(1)
     def kgtk_query(self, dbfile, infile, match, option=None, return_=None, where=None, quoting=csv.QUOTE_MINIMAL):
+        session = self.query_session()
+        if session:
+            return session.query(match, option=option, return_=return_, where=where, quoting=quoting)
+
         query = f'kgtk query --graph-cache "{dbfile}" -i "{infile}"'
 
         if match:
@@ -105,43 +398,56 @@ class Importer(object):
         if return_:
             query += f' --return \'{return_}\''
 
-        query += f' > {self.tmp_file_path()}'
         # print(query)
-        exec_sh(query, self.logger)
 
         # kgtk query set quoting to csv.QUOTE_NONE by default
         # https://github.com/usc-isi-i2/kgtk/blob/6168e06fac121f2e60b687ff90ee6f5cc3d074b5/kgtk/cli/query.py#L288
-        pd_tmp = pd.read_csv(self.tmp_file_path(), delimiter='\t', quoting=quoting)
-        return pd_tmp
+        return self.read_sh(query, quoting=quoting)
 
+    @staged()
     def convert_ttl_to_nt(self, ttl_file, nt_file):
         self.logger.info('converting ttl to nt')
+        if config.get('stream_convert', False):
+            stream_ttl_to_nt(ttl_file, nt_file, self.source, self.tmp_file_path('err'), self.logger)
+            return
+
         exec_sh('apache-jena-3.16.0/bin/riot --syntax=ttl --output=nt < {ttl} > {nt}'
-                     .format(ttl=ttl_file, nt=self.tmp_file_path()), self.logger)
+                     .format(ttl=ttl_file, nt=self.tmp_file_path()), self.logger, check=True)
 
         # normalization (make iri globally unique)
+        replacement = bnode_replacement(self.source)
         with open(self.tmp_file_path(), 'r') as fin:
             with open(nt_file, 'w') as fout:
                 for line in fin:
                     line = line.strip()
                     # normalize bnode
-                    line = re_bnode.sub(f'<http://www.isi.edu/gaia/bnode/{self.source}/' + r'\1' + '>', line)
+                    line = re_bnode.sub(replacement, line)
 
                     fout.write(line + '\n')
 
+    @staged()
     def execute_update(self, infile, query):
         query_file = self.tmp_file_path('query')
         tmp_outfile = self.tmp_file_path('out')
         with open(query_file, 'w') as f:
             f.write(query)
-        exec_sh(f'apache-jena-3.16.0/bin/update --data={infile} --update={query_file} --dump > {tmp_outfile}', self.logger)
+        exec_sh(f'apache-jena-3.16.0/bin/update --data={infile} --update={query_file} --dump > {tmp_outfile}', self.logger, check=True)
         shutil.move(tmp_outfile, infile)
         os.remove(query_file)
 
+    @staged()
     def clean_nt(self, nt_file, cleaned_nt_file):
         # remove conflict TA1 triples
         self.logger.info('cleaning nt')
 
+        if config.get('stream_clean', False):
+            self.logger.info('Removing TA1 entity clusters')
+            stats = strip_ta1_clusters(nt_file, cleaned_nt_file, load_namespaces(config['namespace_file'])['aida'])
+            self.logger.info('Removed {associatedKEs} associatedKEs, {claimSemantics} claimSemantics, '
+                             '{ClusterMembership} ClusterMembership and {SameAsCluster} SameAsCluster triples'
+                             .format(**stats))
+            return
+
         # remove clusters
         self.logger.info('Loading TA1 graph')
 
@@ -219,6 +525,7 @@ class Importer(object):
         }'''
         self.execute_update(cleaned_nt_file, str_ns + str_update)
 
+    @staged()
     def convert_nt_to_kgtk(self, nt_file, kgtk_file):
         self.logger.info('convert nt to kgtk')
         exec_sh('''kgtk import-ntriples \
@@ -231,23 +538,22 @@ class Importer(object):
       --local-namespace-use-uuid False \
       -i {nt_file} > {kgtk_file}'''
         .format(ns_file=config['namespace_file'], prefix=self.source,  # prefix here would produce an invalid triple files
-                nt_file=nt_file, kgtk_file=kgtk_file), self.logger)
-
-    def merge_values(self, values):
-        # print(type(values))
-        # print(values, values.index > 0)
-        ret = {}
-        for col in values.columns:
-            if not values.empty:
-                ret[col] = tuple(values[col].tolist())
-            else:
-                ret[col] = tuple([])
-        return pd.Series(ret)
+                nt_file=nt_file, kgtk_file=kgtk_file), self.logger, check=True)
 
     def assign_qnode_label(self, value):
-        global kgtk_labels
-        return tuple([kgtk_labels.get(v) for v in value])
-
+        labels = get_kgtk_labels()
+        return tuple([labels.get(v) for v in value])
+
+    def assign_qnode_labels(self, values):
+        """
+        Labels of a column of qnode tuples, all the distinct qnodes are looked up in one batch.
+        """
+        labels = get_kgtk_labels()
+        qnodes = set([v for value in values for v in value])
+        found = labels.lookup(qnodes) if isinstance(labels, LabelIndex) else labels
+        return [tuple([found.get(v) for v in value]) for value in values]
+
+    @staged()
     def create_entity_df(self, kgtk_file, kgtk_db_file, output_file, source):
         self.logger.info('create entity df for ' + source)
 
@@ -259,158 +565,154 @@ class Importer(object):
             return_='e AS e'
         )
         df_entity = df_entity.drop_duplicates().reset_index(drop=True)
-        # df_entity = df_entity.groupby('e')[['e_just']].apply(self.merge_values).reset_index()
+        # df_entity = collect_tuples(df_entity, 'e', ['e_just'])
 
         ### type
-        self.logger.info('creating type')
-
-        df_type = self.kgtk_query(kgtk_db_file, kgtk_file,
-            match='(stmt)-[:`rdf:type`]->(stmt_type),'+
-                  '(stmt)-[:`rdf:subject`]->(e),'+
-                  '(stmt)-[:`rdf:predicate`]->(:`rdf:type`),'+
-                  '(stmt)-[:`rdf:object`]->(type),'+
-                  '(stmt)-[:`aida:confidence`]->(c)-[:`aida:confidenceValue`]->(cv),'+
-                  '(stmt)-[:`aida:justifiedBy`]->(just)',
-            where='stmt_type IN ["rdf:Statement", "aida:TypeStatement"]',
-            return_='e AS e,type AS type,cv AS type_cv,just AS type_just'
-        )
-        df_type = pd.merge(df_entity, df_type, left_on='e', right_on='e')
-        df_type = df_type.groupby('e')[['type', 'type_cv', 'type_just']].apply(self.merge_values).reset_index()
-
-        def merge_just(v):
-
-            result = {'e': v['e'], 'type': [], 'type_cv': [], 'type_just': []}
-
-            type_, type_cv, type_just = v['type'], v['type_cv'], v['type_just']
-            unique_type = set(type_)
-            for t in unique_type:
-                # use the maximum cv
-                # aggregate justification
-                indices = [i for i, x in enumerate(type_) if x == t]
-                cv = max([type_cv[i] for i in indices])
-                justs = tuple([type_just[i] for i in indices])
-
-                result['type'].append(t)
-                result['type_cv'].append(cv)
-                result['type_just'].append(justs)
-
-            result['type'] = tuple(result['type'])
-            result['type_cv'] = tuple(result['type_cv'])
-            result['type_just'] = tuple(result['type_just'])
-            return pd.Series(result)
-
-        df_type = df_type.apply(merge_just, axis=1).reset_index(drop=True)
-
-        ### assign type label
-        self.logger.info('assigning type label')
-        df_type['type_label'] = df_type['type'].apply(self.assign_qnode_label)
+        def create_type():
+            self.logger.info('creating type')
+
+            df_type = self.kgtk_query(kgtk_db_file, kgtk_file,
+                match='(stmt)-[:`rdf:type`]->(stmt_type),'+
+                      '(stmt)-[:`rdf:subject`]->(e),'+
+                      '(stmt)-[:`rdf:predicate`]->(:`rdf:type`),'+
+                      '(stmt)-[:`rdf:object`]->(type),'+
+                      '(stmt)-[:`aida:confidence`]->(c)-[:`aida:confidenceValue`]->(cv),'+
+                      '(stmt)-[:`aida:justifiedBy`]->(just)',
+                where='stmt_type IN ["rdf:Statement", "aida:TypeStatement"]',
+                return_='e AS e,type AS type,cv AS type_cv,just AS type_just'
+            )
+            df_type = pd.merge(df_entity, df_type, left_on='e', right_on='e')
+            # use the maximum cv of each type, aggregate justification
+            df_type = collect_max_by(df_type, 'e', 'type', 'type_cv', ['type_just'])
+
+            ### assign type label
+            self.logger.info('assigning type label')
+            df_type['type_label'] = self.assign_qnode_labels(df_type['type'])
+            return df_type
 
         ### confidence
-        self.logger.info('creating confidence')
-        df_confidence = self.predicate_path(kgtk_db_file, kgtk_file, 'aida:confidence/aida:confidenceValue')\
-            .rename(columns={'node1': 'e', 'node2': 'cv'})
-        df_confidence = pd.merge(df_entity, df_confidence, left_on='e', right_on='e')
+        def create_confidence():
+            self.logger.info('creating confidence')
+            df_confidence = self.predicate_path(kgtk_db_file, kgtk_file, 'aida:confidence/aida:confidenceValue')\
+                .rename(columns={'node1': 'e', 'node2': 'cv'})
+            df_confidence = pd.merge(df_entity, df_confidence, left_on='e', right_on='e')
+            return df_confidence
 
         ### name
-        self.logger.info('creating name')
-        df_name = self.predicate_path(kgtk_db_file, kgtk_file, 'aida:hasName')\
-            .rename(columns={'node1': 'e', 'node2': 'name'})
-        df_name = pd.merge(df_entity, df_name, left_on='e', right_on='e')
-        df_name = df_name.groupby('e')[['name']].apply(self.merge_values).reset_index()
+        def create_name():
+            self.logger.info('creating name')
+            df_name = self.predicate_path(kgtk_db_file, kgtk_file, 'aida:hasName')\
+                .rename(columns={'node1': 'e', 'node2': 'name'})
+            df_name = pd.merge(df_entity, df_name, left_on='e', right_on='e')
+            df_name = collect_tuples(df_name, 'e', ['name'])
+            return df_name
 
         ### link
-        self.logger.info('creating link')
-        df_link = self.kgtk_query(kgtk_db_file, kgtk_file,
-            match='(e)-[:`aida:link`]->(t1)-[:`aida:linkTarget`]->(link),'+
-                  '(e)-[:`aida:link`]->(t1)-[:`aida:confidence`]->(t2)-[:`aida:confidenceValue`]->(cv)',
-            return_='e AS e,link AS link,cv AS link_cv'
-        )
-        df_link = pd.merge(df_entity, df_link, left_on='e', right_on='e')
-        df_link = df_link.groupby('e')[['link', 'link_cv']].apply(self.merge_values).reset_index()
-
-        ### assign link label
-        self.logger.info('assigning type label')
-        df_link['link_label'] = df_link['link'].apply(self.assign_qnode_label)
+        def create_link():
+            self.logger.info('creating link')
+            df_link = self.kgtk_query(kgtk_db_file, kgtk_file,
+                match='(e)-[:`aida:link`]->(t1)-[:`aida:linkTarget`]->(link),'+
+                      '(e)-[:`aida:link`]->(t1)-[:`aida:confidence`]->(t2)-[:`aida:confidenceValue`]->(cv)',
+                return_='e AS e,link AS link,cv AS link_cv'
+            )
+            df_link = pd.merge(df_entity, df_link, left_on='e', right_on='e')
+            df_link = collect_tuples(df_link, 'e', ['link', 'link_cv'])
+
+            ### assign link label
+            self.logger.info('assigning type label')
+            df_link['link_label'] = self.assign_qnode_labels(df_link['link'])
+            return df_link
 
         ### informative justification
-        self.logger.info('creating informative justification')
-        df_infojust = self.kgtk_query(kgtk_db_file, kgtk_file,
-                                    match='(e)-[:`rdf:type`]->(:`aida:Entity`),'+
-                                          '(e)-[:`aida:informativeJustification`]->(ij)',
-                                    return_='e AS e, ij AS info_just'
-                                    )
-        df_infojust = pd.merge(df_entity, df_infojust, left_on='e', right_on='e')
-
-        ### informative justification extension
-        if config.get('extract_mention', False):
-            self.logger.info('creating informative justification extension')
-            df_infojust_ext = self.kgtk_query(kgtk_db_file, kgtk_file,
-                                          match='(e)-[:`rdf:type`]->(:`aida:Entity`),'+
-                                                '(e)-[:`aida:informativeJustification`]->(ij),'+
-                                                '(ij)-[:`rdf:type`]->(:`aida:TextJustification`),'+
-                                                '(ij)-[:`aida:startOffset`]->(ij_start),'+
-                                                '(ij)-[:`aida:endOffsetInclusive`]->(ij_end),'+
-                                                '(ij)-[:`aida:privateData`]->(p),'+
-                                                '(p)-[:`aida:jsonContent`]->(j),'+
-                                                '(p)-[:`aida:system`]->(:`http://www.uiuc.edu/mention`)',
-                                          return_='ij AS info_just, ij_start AS ij_start, ij_end AS ij_end, j AS mention',
-                                          quoting=csv.QUOTE_NONE  # this maks mention string properly parsed
-                                          )
-
-            def parse_private_date(v):
-                try:
-                    v = json.loads(eval(v))
-                    return v
-                    # return v.get('mention_string')
-                except:
-                    return None
-
-            df_infojust_ext['mention'] = df_infojust_ext['mention'].apply(parse_private_date)
-            df_infojust = pd.merge(df_infojust, df_infojust_ext, left_on='info_just', right_on='info_just', how='left')
-
+        def create_infojust():
+            self.logger.info('creating informative justification')
+            df_infojust = self.kgtk_query(kgtk_db_file, kgtk_file,
+                                        match='(e)-[:`rdf:type`]->(:`aida:Entity`),'+
+                                              '(e)-[:`aida:informativeJustification`]->(ij)',
+                                        return_='e AS e, ij AS info_just'
+                                        )
+            df_infojust = pd.merge(df_entity, df_infojust, left_on='e', right_on='e')
+
+            ### informative justification extension
+            if config.get('extract_mention', False):
+                self.logger.info('creating informative justification extension')
+                df_infojust_ext = self.kgtk_query(kgtk_db_file, kgtk_file,
+                                              match='(e)-[:`rdf:type`]->(:`aida:Entity`),'+
+                                                    '(e)-[:`aida:informativeJustification`]->(ij),'+
+                                                    '(ij)-[:`rdf:type`]->(:`aida:TextJustification`),'+
+                                                    '(ij)-[:`aida:startOffset`]->(ij_start),'+
+                                                    '(ij)-[:`aida:endOffsetInclusive`]->(ij_end),'+
+                                                    '(ij)-[:`aida:privateData`]->(p),'+
+                                                    '(p)-[:`aida:jsonContent`]->(j),'+
+                                                    '(p)-[:`aida:system`]->(:`http://www.uiuc.edu/mention`)',
+                                              return_='ij AS info_just, ij_start AS ij_start, ij_end AS ij_end, j AS mention',
+                                              quoting=csv.QUOTE_NONE  # this maks mention string properly parsed
+                                              )
+
+                df_infojust_ext['mention'] = decode_json_literals(df_infojust_ext['mention'])
+                df_infojust = pd.merge(df_infojust, df_infojust_ext, left_on='info_just', right_on='info_just', how='left')
+            return df_infojust
 
         ### associated claims
-        self.logger.info('creating associated claims')
-        df_asso_claim = self.kgtk_query(kgtk_db_file, kgtk_file,
-                                  match='(cluster)-[:`rdf:type`]->(:`aida:SameAsCluster`),'+
-                                        '(cluster)-[:`aida:prototype`]->(proto)-[:`rdf:type`]->(:`aida:Entity`),'+
-                                        '(cm)-[:`rdf:type`]->(:`aida:ClusterMembership`),'+
-                                        '(cm)-[:`aida:cluster`]->(cluster),'+
-                                        '(cm)-[:`aida:clusterMember`]->(e),'+
-                                        '(claim)-[:`rdf:type`]->(:`aida:Claim`),'+
-                                        '(claim)-[:`aida:associatedKEs`]->(cluster)',
-                                  return_='e AS e, claim AS asso_claim'
-                                  )
-        df_asso_claim = pd.merge(df_entity, df_asso_claim, left_on='e', right_on='e')
-        df_asso_claim = df_asso_claim.groupby('e')[['asso_claim']].apply(self.merge_values).reset_index()
+        def create_asso_claim():
+            self.logger.info('creating associated claims')
+            df_asso_claim = self.kgtk_query(kgtk_db_file, kgtk_file,
+                                      match='(cluster)-[:`rdf:type`]->(:`aida:SameAsCluster`),'+
+                                            '(cluster)-[:`aida:prototype`]->(proto)-[:`rdf:type`]->(:`aida:Entity`),'+
+                                            '(cm)-[:`rdf:type`]->(:`aida:ClusterMembership`),'+
+                                            '(cm)-[:`aida:cluster`]->(cluster),'+
+                                            '(cm)-[:`aida:clusterMember`]->(e),'+
+                                            '(claim)-[:`rdf:type`]->(:`aida:Claim`),'+
+                                            '(claim)-[:`aida:associatedKEs`]->(cluster)',
+                                      return_='e AS e, claim AS asso_claim'
+                                      )
+            df_asso_claim = pd.merge(df_entity, df_asso_claim, left_on='e', right_on='e')
+            df_asso_claim = collect_tuples(df_asso_claim, 'e', ['asso_claim'])
+            return df_asso_claim
 
         ### claim semantics
-        self.logger.info('creating claim semantics')
-        df_claim_seman = self.kgtk_query(kgtk_db_file, kgtk_file,
-                                        match='(cluster)-[:`rdf:type`]->(:`aida:SameAsCluster`),'+
-                                              '(cluster)-[:`aida:prototype`]->(proto)-[:`rdf:type`]->(:`aida:Entity`),'+
-                                              '(cm)-[:`rdf:type`]->(:`aida:ClusterMembership`),'+
-                                              '(cm)-[:`aida:cluster`]->(cluster),'+
-                                              '(cm)-[:`aida:clusterMember`]->(e),'+
-                                              '(claim)-[:`rdf:type`]->(:`aida:Claim`),'+
-                                              '(claim)-[:`aida:claimSemantics`]->(cluster)',
-                                        return_='e AS e, claim AS claim_seman'
-                                        )
-        df_claim_seman = pd.merge(df_entity, df_claim_seman, left_on='e', right_on='e')
-        df_claim_seman = df_claim_seman.groupby('e')[['claim_seman']].apply(self.merge_values).reset_index()
+        def create_claim_seman():
+            self.logger.info('creating claim semantics')
+            df_claim_seman = self.kgtk_query(kgtk_db_file, kgtk_file,
+                                            match='(cluster)-[:`rdf:type`]->(:`aida:SameAsCluster`),'+
+                                                  '(cluster)-[:`aida:prototype`]->(proto)-[:`rdf:type`]->(:`aida:Entity`),'+
+                                                  '(cm)-[:`rdf:type`]->(:`aida:ClusterMembership`),'+
+                                                  '(cm)-[:`aida:cluster`]->(cluster),'+
+                                                  '(cm)-[:`aida:clusterMember`]->(e),'+
+                                                  '(claim)-[:`rdf:type`]->(:`aida:Claim`),'+
+                                                  '(claim)-[:`aida:claimSemantics`]->(cluster)',
+                                            return_='e AS e, claim AS claim_seman'
+                                            )
+            df_claim_seman = pd.merge(df_entity, df_claim_seman, left_on='e', right_on='e')
+            df_claim_seman = collect_tuples(df_claim_seman, 'e', ['claim_seman'])
+            return df_claim_seman
 
         ### cluster
-        self.logger.info('creating associated cluster')
-        df_cluster = self.kgtk_query(kgtk_db_file, kgtk_file,
-                                     match='(cluster)-[:`rdf:type`]->(:`aida:SameAsCluster`),'+
-                                           '(cluster)-[:`aida:prototype`]->(proto)-[:`rdf:type`]->(:`aida:Entity`),'+
-                                           '(cm)-[:`rdf:type`]->(:`aida:ClusterMembership`),'+
-                                           '(cm)-[:`aida:cluster`]->(cluster),'+
-                                           '(cm)-[:`aida:clusterMember`]->(e)',
-                                     return_='e AS e, proto AS ta1_proto, cluster AS ta1_cluster'
-                                     )
-        df_cluster = pd.merge(df_entity, df_cluster, left_on='e', right_on='e')
-        df_cluster = df_cluster.groupby('e')[['ta1_proto', 'ta1_cluster']].apply(self.merge_values).reset_index()
+        def create_cluster():
+            self.logger.info('creating associated cluster')
+            df_cluster = self.kgtk_query(kgtk_db_file, kgtk_file,
+                                         match='(cluster)-[:`rdf:type`]->(:`aida:SameAsCluster`),'+
+                                               '(cluster)-[:`aida:prototype`]->(proto)-[:`rdf:type`]->(:`aida:Entity`),'+
+                                               '(cm)-[:`rdf:type`]->(:`aida:ClusterMembership`),'+
+                                               '(cm)-[:`aida:cluster`]->(cluster),'+
+                                               '(cm)-[:`aida:clusterMember`]->(e)',
+                                         return_='e AS e, proto AS ta1_proto, cluster AS ta1_cluster'
+                                         )
+            df_cluster = pd.merge(df_entity, df_cluster, left_on='e', right_on='e')
+            df_cluster = collect_tuples(df_cluster, 'e', ['ta1_proto', 'ta1_cluster'])
+            return df_cluster
+
+        # the parts only depend on df_entity, they can be extracted concurrently
+        df_type, df_confidence, df_name, df_link, df_infojust, df_asso_claim, df_claim_seman, df_cluster = self.run_tasks([
+            ('type', create_type, ()),
+            ('confidence', create_confidence, ()),
+            ('name', create_name, ()),
+            ('link', create_link, ()),
+            ('infojust', create_infojust, ()),
+            ('asso_claim', create_asso_claim, ()),
+            ('claim_seman', create_claim_seman, ()),
+            ('cluster', create_cluster, ()),
+        ])
 
         ### merge
         self.logger.info('merging all dfs to entity df')
@@ -428,11 +730,10 @@ class Importer(object):
 
         ### export
         self.logger.info('exporting df')
-        with warnings.catch_warnings():
-            warnings.simplefilter('ignore')
-            df_entity_complete.to_hdf(output_file, 'entity', mode='w', format='fixed')
-            df_entity_complete.to_csv(output_file + '.csv')
+        self.metrics.count(len(df_entity_complete))
+        write_table(df_entity_complete, output_file, 'entity')
 
+    @staged()
     def create_event_df(self, kgtk_file, kgtk_db_file, output_file, source):
         self.logger.info('create event df for ' + source)
 
@@ -457,8 +758,8 @@ class Importer(object):
                                   return_='e AS e,type AS type,cv AS type_cv'
                                   )
         df_type = pd.merge(df_event, df_type, left_on='e', right_on='e')
-        df_type = df_type.groupby('e')[['type', 'type_cv']].apply(self.merge_values).reset_index()
-        df_type['type_label'] = df_type['type'].apply(self.assign_qnode_label)
+        df_type = collect_tuples(df_type, 'e', ['type', 'type_cv'])
+        df_type['type_label'] = self.assign_qnode_labels(df_type['type'])
 
         ### time
         self.logger.info('creating datetime')
@@ -480,15 +781,6 @@ class Importer(object):
         #                           )
 
 
-        def merge_time(values):
-            output = []
-            for idx, row in values.iterrows():
-                output_inner = {}
-                for k, v in row.items():
-                    output_inner[k] = v
-                output.append(output_inner)
-            return pd.Series({'dt': output})
-
         df_time_end = self.kgtk_query(kgtk_db_file, kgtk_file,
                                     match='(e)-[:`aida:ldcTime`]->(dt)-[:`aida:end`]->(end)-[:`aida:timeType`]->(type)',  # dt_type: ON, BEFORE, AFTER, UNKNOWN
                                     option=('(end)-[:`aida:day`]->(e1)-[:`kgtk:structured_value`]->(day)',
@@ -496,7 +788,7 @@ class Importer(object):
                                           '(end)-[:`aida:year`]->(e3)-[:`kgtk:structured_value`]->(year)'),
                                     return_='e AS e, type AS type, day AS day, month AS month, year AS year'
                                     )
-        df_time_end = df_time_end.groupby('e')[['type', 'day', 'month', 'year']].apply(merge_time).rename(columns={'dt':'dt_end'}).reset_index()
+        df_time_end = collect_records(df_time_end, 'e', ['type', 'day', 'month', 'year']).rename(columns={'records': 'dt_end'})
         df_time_start = self.kgtk_query(kgtk_db_file, kgtk_file,
                                       match='(e)-[:`aida:ldcTime`]->(dt)-[:`aida:start`]->(start)-[:`aida:timeType`]->(type)',  # dt_type: ON, BEFORE, AFTER, UNKNOWN
                                       option=('(start)-[:`aida:day`]->(e1)-[:`kgtk:structured_value`]->(day)',
@@ -504,7 +796,7 @@ class Importer(object):
                                               '(start)-[:`aida:year`]->(e3)-[:`kgtk:structured_value`]->(year)'),
                                       return_='e AS e, type AS type, day AS day, month AS month, year AS year'
                                       )
-        df_time_start = df_time_start.groupby('e')[['type', 'day', 'month', 'year']].apply(merge_time).rename(columns={'dt':'dt_start'}).reset_index()
+        df_time_start = collect_records(df_time_start, 'e', ['type', 'day', 'month', 'year']).rename(columns={'records': 'dt_start'})
 
         df_time = pd.merge(df_time_start, df_time_end)
 
@@ -519,7 +811,7 @@ class Importer(object):
                                         return_='e AS e, proto AS proto, cluster AS cluster'
                                         )
         df_cluster = pd.merge(df_event, df_cluster, left_on='e', right_on='e')
-        df_cluster = df_cluster.groupby('e')[['proto', 'cluster']].apply(self.merge_values).reset_index()
+        df_cluster = collect_tuples(df_cluster, 'e', ['proto', 'cluster'])
 
         ### merge
         self.logger.info('merging dfs')
@@ -532,11 +824,10 @@ class Importer(object):
 
         ### export
         self.logger.info('exporting df')
-        with warnings.catch_warnings():
-            warnings.simplefilter('ignore')
-            df_event_complete.to_hdf(output_file, 'event', mode='w', format='fixed')
-            df_event_complete.to_csv(output_file + '.csv')
+        self.metrics.count(len(df_event_complete))
+        write_table(df_event_complete, output_file, 'event')
 
+    @staged()
     def create_relation_df(self, kgtk_file, kgtk_db_file, output_file, source):
         self.logger.info('create relation df for ' + source)
 
@@ -561,7 +852,7 @@ class Importer(object):
                                   return_='e AS e,type AS type,cv AS type_cv'
                                   )
         df_type = pd.merge(df_relation, df_type, left_on='e', right_on='e')
-        df_type = df_type.groupby('e')[['type', 'type_cv']].apply(self.merge_values).reset_index()
+        df_type = collect_tuples(df_type, 'e', ['type', 'type_cv'])
 
         # associated cluster
         self.logger.info('creating associated cluster')
@@ -574,7 +865,7 @@ class Importer(object):
                                      return_='e AS e, proto AS proto, cluster AS cluster'
                                      )
         df_cluster = pd.merge(df_relation, df_cluster, left_on='e', right_on='e')
-        df_cluster = df_cluster.groupby('e')[['proto', 'cluster']].apply(self.merge_values).reset_index()
+        df_cluster = collect_tuples(df_cluster, 'e', ['proto', 'cluster'])
 
         ### merge
         self.logger.info('merging dfs')
@@ -586,11 +877,10 @@ class Importer(object):
 
         ### export
         self.logger.info('exporting df')
-        with warnings.catch_warnings():
-            warnings.simplefilter('ignore')
-            df_relation_complete.to_hdf(output_file, 'relation', mode='w', format='fixed')
-            df_relation_complete.to_csv(output_file + '.csv')
+        self.metrics.count(len(df_relation_complete))
+        write_table(df_relation_complete, output_file, 'relation')
 
+    @staged()
     def create_role(self, kgtk_file, kgtk_db_file, output_file, source):
 
         self.logger.info('creating role')
@@ -615,14 +905,23 @@ class Importer(object):
         df_role['source'] = source
 
         self.logger.info('exporting df')
-        with warnings.catch_warnings():
-            warnings.simplefilter('ignore')
-            df_role.to_hdf(output_file, 'role', mode='w', format='fixed')
-            df_role.to_csv(output_file + '.csv')
+        self.metrics.count(len(df_role))
+        write_table(df_role, output_file, 'role')
+
+
+def get_kgtk_labels():
+    global kgtk_labels
+    if config.get('kgtk_labels_index') and not isinstance(kgtk_labels, LabelIndex):
+        # opening the index only maps it, workers which didn't inherit it map it again and share the same pages
+        kgtk_labels = LabelIndex(config['kgtk_labels_index'])
+    return kgtk_labels
 
 
 def load_resource():
     global kgtk_labels
+    if config.get('kgtk_labels_index'):
+        get_kgtk_labels()
+        return
     with gzip.open(config['kgtk_labels'], 'rt') as f:
         reader = csv.DictReader(f, delimiter='\t')
         for idx, row in enumerate(reader):
@@ -700,11 +999,13 @@ def load_resource():
 #     return convert_nan_to_none(pd.read_csv(config['wd_to_fb_file']))
 
 
-def worker(source, logger=None, message=None):
+def worker(source, logger=None, message=None, shard=None, _idx=None):
     if logger and message:
         logger.info(message)
-    importer = Importer(source=source)
-    importer.run()
+    start = time.time()
+    importer = Importer(source=source, shard=shard)
+    succeeded = importer.run()
+    return source if shard is None else f'{source}.{shard}', _idx, start, time.time(), succeeded
 
 
 def process():
@@ -716,23 +1017,76 @@ def process():
     # df_wd_fb = load_wd_to_fb_df()
     # kb_to_fb_mapping = load_kb_to_fb_mapping()
 
+    all_infiles = glob.glob(os.path.join(config['input_dir'], config['run_name'], config['subrun_name'], '*.ttl'))
+    # largest sources first
+    all_infiles = scheduler.longest_job_first(
+        all_infiles, os.path.join(config['temp_dir'], config['run_name'], config['subrun_name']))
+    report = scheduler.ScheduleReport(config['num_of_processor'])
+
     logger.info('starting multiprocessing mode')
+    # workers pull from one shared queue, so tasks start in the order they are added
     pp = pyrallel.ParallelProcessor(
         num_of_processor=config['num_of_processor'],
         mapper=worker,
-        max_size_per_mapper_queue=config['num_of_processor'] * 2
+        collector=report.collect,
+        max_size_per_mapper_queue=config['num_of_processor'] * 2,
+        enable_process_id=True,
+        single_mapper_queue=True
     )
     pp.start()
 
-    all_infiles = glob.glob(os.path.join(config['input_dir'], config['run_name'], config['subrun_name'], '*.ttl'))
     logger.info(f'{len(all_infiles)} files to process')
-    for idx, infile in enumerate(all_infiles):
-        source = os.path.basename(infile).split('.')[0]
-        pp.add_task(source, logger, f'starting task {source} [{idx+1}/{len(all_infiles)}]')
-
-    pp.task_done()
-    pp.join()
+    # a source bigger than shard_size is split and its shards are imported in parallel
+    num_shards = config.get('num_shards') or config['num_of_processor']
+    shard_size = config.get('shard_size', 0)
+    big_infiles = [f for f in all_infiles if shard_size and num_shards > 1 and os.stat(f).st_size > shard_size]
+    lock = threading.Lock()  # tasks are added from two threads, pp.add_task isn't thread safe
+
+    def add_task(*args, **kwargs):
+        with lock:
+            pp.add_task(*args, **kwargs)
+
+    sharded = []
+
+    def prepare():
+        # pre-stage of the big sources, the workers import the other sources meanwhile
+        for infile in big_infiles:
+            source = os.path.basename(infile).split('.')[0]
+            logger.info(f'sharding {source}')
+            importer = Importer(source=source)
+            try:
+                prepared = importer.prepare_shards(num_shards)
+            except:
+                logger.exception(f'sharding {source} failed, it is imported without sharding')
+                shutil.rmtree(os.path.join(importer.temp_dir, 'shards'), ignore_errors=True)
+                add_task(source, logger, f'starting task {source} [not sharded]')
+                continue
+            if prepared:
+                sharded.append(importer)
+                for shard in range(num_shards):
+                    add_task(source, logger, f'starting task {source} [shard {shard+1}/{num_shards}]', shard=shard)
+
+    preparer = threading.Thread(target=prepare)
+    preparer.start()
+    try:
+        for idx, infile in enumerate(all_infiles):
+            if infile in big_infiles:
+                continue
+            source = os.path.basename(infile).split('.')[0]
+            add_task(source, logger, f'starting task {source} [{idx+1}/{len(all_infiles)}]')
+    finally:
+        preparer.join()
+        pp.task_done()
+        pp.join()
+    for importer in sharded:
+        importer.merge_shards(num_shards, [shard for shard in range(num_shards)
+                                           if f'{importer.source}.{shard}' in report.succeeded])
     logger.info('all tasks are finished')
+    report.log(logger)
+
+    if config.get('incremental_import', False):
+        manifest.report(logger)
+    metrics.summary(logger)
 
     # integrity check
     # logger.info('checking file integrity')
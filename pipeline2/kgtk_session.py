@@ -0,0 +1,87 @@
+import os
+import io
+import csv
+import sqlite3
+import pandas as pd
+
+
+BUSY_TIMEOUT = 60 * 60 * 1000  # ms
+
+
+class KgtkQuerySession(object):
+    """
+    In-process replacement of `kgtk query --graph-cache {db_file} -i {kgtk_file}`.
+
+    KGTK is imported and the graph cache is opened once, every query runs on the same sqlite connection.
+    Rows are written out the way `kgtk query` does (tab separated, csv.QUOTE_NONE) but to memory,
+    so pandas parses them into exactly the same DataFrames as the CLI output.
+    """
+
+    def __init__(self, db_file, kgtk_file, logger):
+        import kgtk.kypher.query as kyquery
+        import kgtk.kypher.sqlstore as sqlstore
+
+        self.kyquery = kyquery
+        self.db_file = db_file
+        self.kgtk_file = kgtk_file
+        self.logger = logger
+        self.store = sqlstore.SqliteStore(db_file, create=not os.path.exists(db_file), loglevel=0)
+        # a clone is used by one extraction thread only, but closed by the thread which started the extraction
+        self.store.close()
+        self.store.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.store.configure()
+        # other sessions on the same graph cache may be creating indexes, wait for them instead of failing
+        self.store.get_conn().execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT}')
+        # import the graph and index it now rather than in the first query, so that clones never do it concurrently
+        self.store.add_graph(kgtk_file)
+        self.ensure_indexes()
+
+    def ensure_indexes(self):
+        """
+        Create the single column indexes the `auto` index mode asks for.
+        KGTK checks for an index and creates it in two steps, sessions sharing the cache would race on it.
+        """
+        graph = self.store.get_file_graph(self.kgtk_file)
+        for column in ('node1', 'label', 'node2'):
+            self.store.ensure_graph_index_for_columns(graph, column)
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+    def clone(self):
+        # a sqlite connection can't be shared by threads running at the same time
+        return KgtkQuerySession(self.db_file, self.kgtk_file, self.logger)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def execute(self, match, option=None, return_=None, where=None):
+        # same defaults as the kgtk query cli
+        query = self.kyquery.KgtkQuery([self.kgtk_file], self.store, loglevel=0,
+                                       match=match,
+                                       where=where,
+                                       optionals=[(opt, None) for opt in option or []],
+                                       with_=('*', None),
+                                       ret=return_ or '*',
+                                       index=['auto'])
+        result = query.execute()
+
+        output = io.StringIO()
+        csvwriter = csv.writer(output, dialect=None, delimiter='\t',
+                               quoting=csv.QUOTE_NONE, quotechar=None,
+                               lineterminator='\n',
+                               escapechar=None)
+        csvwriter.writerow(query.result_header)
+        csvwriter.writerows(result)
+        output.seek(0)
+        return output
+
+    def query(self, match, option=None, return_=None, where=None, quoting=csv.QUOTE_MINIMAL, doublequote=True):
+        self.logger.debug(f'kgtk query: match {match} where {where} optional {option} return {return_}')
+        output = self.execute(match, option=option, return_=return_, where=where)
+        return pd.read_csv(output, delimiter='\t', quoting=quoting, doublequote=doublequote)
@@ -0,0 +1,127 @@
+import os
+import sys
+import csv
+import gzip
+import mmap
+import struct
+import numpy as np
+
+
+MAGIC = b'QLABEL01'
+HEADER = struct.Struct('<8sQ')  # magic, number of keys
+
+
+class LabelIndex(object):
+    """
+    Read-only qnode -> label index, memory mapped so that all the workers share the same pages.
+
+    File layout (little endian):
+        header      magic, n
+        prefixes    uint64[n], first 8 bytes of every key (big endian, zero padded) to narrow down the search
+        key_offsets uint64[n + 1]
+        val_offsets uint64[n + 1]
+        keys        utf-8 blob, keys sorted bytewise
+        values      utf-8 blob
+    Opening it only maps the file, there's nothing to load.
+    """
+
+    def __init__(self, index_file):
+        self.index_file = index_file
+        self.fp = open(index_file, 'rb')
+        self.mm = mmap.mmap(self.fp.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.n = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{index_file} is not a label index')
+        offset = HEADER.size
+        self.prefixes = np.frombuffer(self.mm, dtype='>u8', count=self.n, offset=offset)
+        offset += 8 * self.n
+        self.key_offsets = np.frombuffer(self.mm, dtype='<u8', count=self.n + 1, offset=offset)
+        offset += 8 * (self.n + 1)
+        self.val_offsets = np.frombuffer(self.mm, dtype='<u8', count=self.n + 1, offset=offset)
+        offset += 8 * (self.n + 1)
+        self.keys_start = offset
+        self.values_start = offset + int(self.key_offsets[-1])
+
+    def close(self):
+        self.prefixes = self.key_offsets = self.val_offsets = None
+        self.mm.close()
+        self.fp.close()
+
+    def key(self, i):
+        return self.mm[self.keys_start + int(self.key_offsets[i]):self.keys_start + int(self.key_offsets[i + 1])]
+
+    def value(self, i):
+        return self.mm[self.values_start + int(self.val_offsets[i]):self.values_start + int(self.val_offsets[i + 1])]\
+            .decode('utf-8')
+
+    def lookup(self, qnodes):
+        """
+        Batched lookup, returns {qnode: label} for the qnodes which are in the index.
+        The prefix array narrows every qnode down to the keys sharing its first 8 bytes (one vectorized search),
+        then a binary search on the full keys finishes it.
+        """
+        qnodes = [q for q in set(qnodes) if isinstance(q, str)]
+        if not qnodes or not self.n:
+            return {}
+        encoded = [q.encode('utf-8') for q in qnodes]
+        query_prefixes = np.array([prefix(k) for k in encoded], dtype='>u8')
+        lo = np.searchsorted(self.prefixes, query_prefixes, side='left')
+        hi = np.searchsorted(self.prefixes, query_prefixes, side='right')
+
+        result = {}
+        for q, k, l, h in zip(qnodes, encoded, lo.tolist(), hi.tolist()):
+            while l < h:
+                mid = (l + h) // 2
+                if self.key(mid) < k:
+                    l = mid + 1
+                else:
+                    h = mid
+            if l < self.n and self.key(l) == k:
+                result[q] = self.value(l)
+        return result
+
+    def get(self, qnode, default=None):
+        return self.lookup([qnode]).get(qnode, default)
+
+
+def prefix(key):
+    return int.from_bytes(key[:8].ljust(8, b'\0'), 'big')
+
+
+def build_index(label_file, index_file):
+    """
+    Build the index from a (gzipped) KGTK label file. Later rows win, like loading it into a dict.
+    """
+    labels = {}
+    opener = gzip.open if label_file.endswith('.gz') else open
+    with opener(label_file, 'rt') as f:
+        reader = csv.DictReader(f, delimiter='\t')
+        for row in reader:
+            labels[row['node1'].encode('utf-8')] = row['node2'].encode('utf-8')
+
+    keys = sorted(labels.keys())
+    key_offsets = np.zeros(len(keys) + 1, dtype='<u8')
+    val_offsets = np.zeros(len(keys) + 1, dtype='<u8')
+    key_offsets[1:] = np.cumsum([len(k) for k in keys])
+    val_offsets[1:] = np.cumsum([len(labels[k]) for k in keys])
+
+    tmp_file = index_file + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(keys)))
+        f.write(np.array([prefix(k) for k in keys], dtype='>u8').tobytes())
+        f.write(key_offsets.tobytes())
+        f.write(val_offsets.tobytes())
+        for k in keys:
+            f.write(k)
+        for k in keys:
+            f.write(labels[k])
+    os.replace(tmp_file, index_file)
+    return len(keys)
+
+
+if __name__ == '__main__':
+    argv = sys.argv
+    if argv[1] == 'build':
+        # python label_index.py build labels.en.tsv.gz labels.en.idx
+        n = build_index(argv[2], argv[3])
+        print(f'{n} labels indexed')
@@ -0,0 +1,172 @@
+import os
+import sys
+import glob
+import json
+import time
+import hashlib
+import threading
+from config import config, get_logger
+
+
+CHUNK_SIZE = 16 * 1024 * 1024
+checkpoint_lock = threading.Lock()  # extraction stages of a source finish in parallel threads
+
+
+def file_hash(infile):
+    h = hashlib.sha256()
+    with open(infile, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def manifest_file(temp_dir, source):
+    return os.path.join(temp_dir, f'{source}.manifest.json')
+
+
+def file_stat(infile):
+    """
+    Path, size and mtime of a file too big to be hashed for every source.
+    """
+    st = os.stat(infile)
+    return [os.path.abspath(infile), st.st_size, st.st_mtime_ns]
+
+
+def fingerprint(ttl_file, version):
+    """
+    Everything the outputs of a source depend on.
+    """
+    # type_label and link_label come from the label index if there is one, from the label file otherwise
+    labels_file = config.get('kgtk_labels_index') or config['kgtk_labels']
+    return {
+        'ttl_sha256': file_hash(ttl_file),
+        'namespace_sha256': file_hash(config['namespace_file']),
+        'kgtk_labels': file_stat(labels_file),
+        'importer_version': version,
+        'extract_mention': config.get('extract_mention', False),
+        'storage_format': config.get('storage_format', 'hdf'),
+        'uri_encoding': config.get('uri_encoding', False),
+    }
+
+
+def load_manifest(temp_dir, source):
+    try:
+        with open(manifest_file(temp_dir, source), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_up_to_date(temp_dir, source, current_fingerprint, outputs):
+    """
+    True if the last successful import of `source` was made from the same inputs
+    and all its outputs are still there.
+    """
+    manifest = load_manifest(temp_dir, source)
+    if not manifest or manifest.get('fingerprint') != current_fingerprint:
+        return False
+    return all(os.path.exists(f) for f in outputs)
+
+
+def remove_manifest(temp_dir, source):
+    if os.path.exists(manifest_file(temp_dir, source)):
+        os.remove(manifest_file(temp_dir, source))
+
+
+def save_manifest(temp_dir, source, current_fingerprint, status, duration=None):
+    """
+    `status` is `rebuilt` or `reused`.
+    """
+    manifest = load_manifest(temp_dir, source) or {}
+    manifest['source'] = source
+    manifest['fingerprint'] = current_fingerprint
+    manifest['status'] = status
+    manifest['updated_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+    if duration is not None:
+        manifest['duration'] = duration
+    tmp_file = manifest_file(temp_dir, source) + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_file, manifest_file(temp_dir, source))
+
+
+def checkpoint_file(temp_dir, source):
+    return os.path.join(temp_dir, f'{source}.checkpoint.json')
+
+
+def stage_key(current_fingerprint, stage, inputs):
+    """
+    Key of the completion marker of `stage`: the source fingerprint and the size / mtime of the stage inputs.
+    A stage which rewrites its output changes the key of every stage reading it.
+    """
+    stats = []
+    for f in inputs:
+        st = os.stat(f)
+        stats.append([os.path.basename(f), st.st_size, st.st_mtime_ns])
+    key = json.dumps({'fingerprint': current_fingerprint, 'stage': stage, 'inputs': stats}, sort_keys=True)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def load_checkpoints(temp_dir, source):
+    try:
+        with open(checkpoint_file(temp_dir, source), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def is_stage_done(temp_dir, source, stage, key, outputs):
+    return load_checkpoints(temp_dir, source).get(stage) == key and all(os.path.exists(f) for f in outputs)
+
+
+def mark_stage_done(temp_dir, source, stage, key):
+    with checkpoint_lock:
+        checkpoints = load_checkpoints(temp_dir, source)
+        checkpoints[stage] = key
+        tmp_file = checkpoint_file(temp_dir, source) + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(checkpoints, f, indent=2)
+        os.replace(tmp_file, checkpoint_file(temp_dir, source))
+
+
+def remove_checkpoints(temp_dir, source):
+    if os.path.exists(checkpoint_file(temp_dir, source)):
+        os.remove(checkpoint_file(temp_dir, source))
+
+
+def report(logger=None):
+    """
+    Report which sources of the current run were reused and which were rebuilt.
+    Sources without a manifest failed or haven't been imported.
+    """
+    logger = logger or get_logger('manifest')
+    input_dir = os.path.join(config['input_dir'], config['run_name'], config['subrun_name'])
+    temp_dir = os.path.join(config['temp_dir'], config['run_name'], config['subrun_name'])
+
+    result = {'reused': [], 'rebuilt': [], 'missing': []}
+    for infile in sorted(glob.glob(os.path.join(input_dir, '*.ttl'))):
+        source = os.path.basename(infile).split('.')[0]
+        manifest = load_manifest(os.path.join(temp_dir, source), source)
+        if not manifest:
+            result['missing'].append(source)
+        else:
+            result[manifest['status']].append(source)
+
+    for status in ('rebuilt', 'reused', 'missing'):
+        for source in result[status]:
+            logger.debug(f'{status}: {source}')
+    logger.info(f'{len(result["rebuilt"])} sources rebuilt, {len(result["reused"])} reused, '
+                f'{len(result["missing"])} without a valid import')
+    return result
+
+
+if __name__ == '__main__':
+    argv = sys.argv
+    if argv[1] == 'report':
+        result = report()
+        for status in ('rebuilt', 'reused', 'missing'):
+            for source in result[status]:
+                print(f'{status}\t{source}')
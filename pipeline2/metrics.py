@@ -0,0 +1,160 @@
+import os
+import sys
+import glob
+import json
+import time
+import resource
+import threading
+import functools
+from collections import defaultdict
+from contextlib import contextmanager
+from config import config, get_logger
+
+
+def metrics_file(temp_dir, source):
+    return os.path.join(temp_dir, f'{source}.metrics.json')
+
+
+def peak_rss():
+    """
+    Peak RSS (bytes) of this process and of its largest waited-for child (riot, jena update, kgtk cli).
+    These are high-water marks of the whole worker process, not of a single stage.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024, \
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+
+
+def cpu_time():
+    # children are only accounted once they have been waited for, which exec_sh does
+    s = resource.getrusage(resource.RUSAGE_SELF)
+    c = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return s.ru_utime + s.ru_stime + c.ru_utime + c.ru_stime
+
+
+class Metrics(object):
+    """
+    Wall time, cpu time, peak RSS, input bytes and output rows of every stage of a source.
+
+    Stages nest (e.g. every jena update of clean_nt), each record has its depth within its thread.
+    CPU time is process wide: stages running in parallel extraction threads overlap.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.records = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    @contextmanager
+    def stage(self, name, infile=None, detail=None):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        record = {
+            'stage': name,
+            'depth': len(stack),
+            'input_bytes': os.path.getsize(infile) if infile and os.path.exists(infile) else None,
+            'rows': None,
+        }
+        if detail:
+            record['detail'] = detail
+        stack.append(record)
+        start, start_cpu = time.time(), cpu_time()
+        try:
+            yield record
+        finally:
+            stack.pop()
+            record['wall'] = time.time() - start
+            record['cpu'] = cpu_time() - start_cpu
+            record['peak_rss'], record['peak_rss_children'] = peak_rss()
+            with self.lock:
+                self.records.append(record)
+
+    def count(self, rows):
+        """
+        Set the output rows of the innermost stage of the current thread.
+        """
+        stack = getattr(self.local, 'stack', None)
+        if stack:
+            stack[-1]['rows'] = rows
+
+    def save(self, temp_dir, wall):
+        metrics = {
+            'source': self.source,
+            'wall': wall,
+            'stages': self.records,
+        }
+        tmp_file = metrics_file(temp_dir, self.source) + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(metrics, f, indent=2)
+        os.replace(tmp_file, metrics_file(temp_dir, self.source))
+
+
+def staged(input_arg=0):
+    """
+    Record every call of an Importer method as a stage named after the method.
+    The file in positional argument `input_arg` is the input, a DataFrame result gives the output rows.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            infile = args[input_arg] if len(args) > input_arg and isinstance(args[input_arg], str) else None
+            with self.metrics.stage(func.__name__, infile=infile, detail=kwargs.get('match')):
+                result = func(self, *args, **kwargs)
+                if hasattr(result, 'shape'):
+                    self.metrics.count(len(result))
+                return result
+        return wrapper
+    return decorator
+
+
+def load_metrics(temp_dir, source):
+    try:
+        with open(metrics_file(temp_dir, source), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def summary(logger=None, top=10):
+    """
+    Aggregate the metrics of all sources of the current run: slowest stages (total wall time over all sources)
+    and slowest sources. Sources which have been reused keep the metrics of the run which built them.
+    """
+    logger = logger or get_logger('metrics')
+    input_dir = os.path.join(config['input_dir'], config['run_name'], config['subrun_name'])
+    temp_dir = os.path.join(config['temp_dir'], config['run_name'], config['subrun_name'])
+
+    sources = []
+    stages = defaultdict(lambda: {'count': 0, 'wall': 0.0, 'cpu': 0.0, 'max_wall': 0.0, 'rows': 0, 'peak_rss': 0})
+    for infile in sorted(glob.glob(os.path.join(input_dir, '*.ttl'))):
+        source = os.path.basename(infile).split('.')[0]
+        metrics = load_metrics(os.path.join(temp_dir, source), source)
+        if not metrics:
+            continue
+        sources.append((source, metrics['wall']))
+        for record in metrics['stages']:
+            stage = stages[record['stage']]
+            stage['count'] += 1
+            stage['wall'] += record['wall']
+            stage['cpu'] += record['cpu']
+            stage['max_wall'] = max(stage['max_wall'], record['wall'])
+            stage['rows'] += record['rows'] or 0
+            stage['peak_rss'] = max(stage['peak_rss'], record['peak_rss'], record['peak_rss_children'])
+
+    slowest_stages = sorted(stages.items(), key=lambda x: -x[1]['wall'])[:top]
+    slowest_sources = sorted(sources, key=lambda x: -x[1])[:top]
+
+    logger.info(f'{"stage":<24}{"count":>8}{"wall (s)":>12}{"cpu (s)":>12}{"max (s)":>10}{"rows":>12}{"rss (MB)":>10}')
+    for name, s in slowest_stages:
+        logger.info(f'{name:<24}{s["count"]:>8}{s["wall"]:>12.1f}{s["cpu"]:>12.1f}{s["max_wall"]:>10.1f}'
+                    f'{s["rows"]:>12}{s["peak_rss"] / 1024 / 1024:>10.0f}')
+    for source, wall in slowest_sources:
+        logger.info(f'source {source}: {wall:.1f}s')
+    return {'stages': dict(stages), 'sources': dict(sources)}
+
+
+if __name__ == '__main__':
+    argv = sys.argv
+    if argv[1] == 'summary':
+        summary()
@@ -0,0 +1,148 @@
+import subprocess
+import csv
+import io
+import os
+import re
+
+
+RIOT = 'apache-jena-3.16.0/bin/riot'
+CHUNK_SIZE = 4 * 1024 * 1024  # characters per read from riot
+
+re_bnode = re.compile(r'_:([^\s]*)')
+
+
+def bnode_replacement(source):
+    # make bnode iri globally unique
+    return f'<http://www.isi.edu/gaia/bnode/{source}/' + r'\1' + '>'
+
+
+def stream_ttl_to_nt(ttl_file, nt_file, source, err_file, logger):
+    """
+    Convert ttl to nt with bnode normalization in a single pass.
+
+    riot's stdout is consumed chunk by chunk while riot is still parsing, bnodes are rewritten on the fly
+    and only the final nt file is written. Memory is bounded by CHUNK_SIZE.
+    riot's stderr goes to `err_file` so that a chatty parser can never block the pipe, it's only logged
+    (riot warns about e.g. bad IRIs), a non-zero return code raises CalledProcessError.
+    """
+    replacement = bnode_replacement(source)
+    with open(ttl_file, 'rb') as fin, open(err_file, 'wb') as ferr, open(nt_file, 'w', encoding='utf-8') as fout:
+        process = subprocess.Popen([RIOT, '--syntax=ttl', '--output=nt'], stdin=fin, stdout=subprocess.PIPE, stderr=ferr)
+        reader = io.TextIOWrapper(process.stdout, encoding='utf-8')
+        remainder = ''
+        while True:
+            chunk = reader.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            chunk = remainder + chunk
+            # only rewrite complete lines, a bnode label may be split across two reads
+            end = chunk.rfind('\n') + 1
+            chunk, remainder = chunk[:end], chunk[end:]
+            fout.write(re_bnode.sub(replacement, chunk))
+        if remainder:
+            fout.write(re_bnode.sub(replacement, remainder.strip()) + '\n')
+        process.wait()
+
+    with open(err_file, 'r') as f:
+        stderr = f.read()
+    if process.returncode != 0 or stderr != '':
+        logger.error('riot: %s . return code: %s . stderr: %s', ttl_file, process.returncode, stderr)
+    os.remove(err_file)
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, RIOT, None, stderr)
+
+
+RDF_TYPE = '<http://www.w3.org/1999/02/22-rdf-syntax-ns#type>'
+
+
+def load_namespaces(namespace_file):
+    with open(namespace_file, 'r') as f:
+        return {row['node1']: row['node2'] for row in csv.DictReader(f, delimiter='\t')}
+
+
+def split_triple(line):
+    s, p, o = line.split(' ', 2)
+    o = o.rstrip()
+    if o.endswith('.'):
+        o = o[:-1].rstrip()
+    return s, p, o
+
+
+def strip_ta1_clusters(nt_file, cleaned_nt_file, aida):
+    """
+    Remove TA1 entity clusters from `nt_file` and write the rest to `cleaned_nt_file`.
+
+    It deletes the same triples as the four Jena updates (associatedKEs, claimSemantics, ClusterMembership,
+    SameAsCluster & prototype), but only streams the file twice:
+    the first pass collects clusters, prototypes, memberships and claims, the second pass drops the matching triples.
+    The output keeps the input order (Jena dumps in its own order).
+
+    Returns the number of removed triples per kind.
+    """
+    def iri(name):
+        return f'<{aida}{name}>'
+
+    SAME_AS_CLUSTER, ENTITY, CLAIM, CLUSTER_MEMBERSHIP = \
+        iri('SameAsCluster'), iri('Entity'), iri('Claim'), iri('ClusterMembership')
+    PROTOTYPE, CLUSTER, ASSOCIATED_KES, CLAIM_SEMANTICS = \
+        iri('prototype'), iri('cluster'), iri('associatedKEs'), iri('claimSemantics')
+    predicates = {RDF_TYPE, PROTOTYPE, CLUSTER, ASSOCIATED_KES, CLAIM_SEMANTICS}
+
+    # pass 1: collect
+    clusters, entities, claims, memberships = set(), set(), set(), set()
+    prototypes = []
+    membership_clusters = []
+    with open(nt_file, 'r', encoding='utf-8') as fin:
+        for line in fin:
+            if not line.strip():
+                continue
+            s, p, o = split_triple(line)
+            if p not in predicates:
+                continue
+            if p == RDF_TYPE:
+                if o == SAME_AS_CLUSTER:
+                    clusters.add(s)
+                elif o == ENTITY:
+                    entities.add(s)
+                elif o == CLAIM:
+                    claims.add(s)
+                elif o == CLUSTER_MEMBERSHIP:
+                    memberships.add(s)
+            elif p == PROTOTYPE:
+                prototypes.append((s, o))
+            elif p == CLUSTER:
+                membership_clusters.append((s, o))
+
+    # ?cluster a aida:SameAsCluster . ?cluster aida:prototype ?proto . ?proto a aida:Entity .
+    entity_prototypes = set([(c, proto) for c, proto in prototypes if c in clusters and proto in entities])
+    entity_clusters = set([c for c, _ in entity_prototypes])
+    # ?cm a aida:ClusterMembership . ?cm aida:cluster ?cluster .
+    entity_memberships = set([cm for cm, c in membership_clusters if cm in memberships and c in entity_clusters])
+    del clusters, entities, prototypes, membership_clusters
+
+    # pass 2: drop
+    stats = {'associatedKEs': 0, 'claimSemantics': 0, 'ClusterMembership': 0, 'SameAsCluster': 0}
+    with open(nt_file, 'r', encoding='utf-8') as fin, open(cleaned_nt_file, 'w', encoding='utf-8') as fout:
+        for line in fin:
+            if line.strip():
+                s, p, o = split_triple(line)
+                if p in predicates:
+                    kind = None
+                    if p == ASSOCIATED_KES:
+                        kind = 'associatedKEs' if s in claims and o in entity_clusters else None
+                    elif p == CLAIM_SEMANTICS:
+                        kind = 'claimSemantics' if s in claims and o in entity_clusters else None
+                    elif p == CLUSTER:
+                        kind = 'ClusterMembership' if s in memberships and o in entity_clusters else None
+                    elif p == PROTOTYPE:
+                        kind = 'SameAsCluster' if (s, o) in entity_prototypes else None
+                    elif o == CLUSTER_MEMBERSHIP:
+                        kind = 'ClusterMembership' if s in entity_memberships else None
+                    elif o == SAME_AS_CLUSTER:
+                        kind = 'SameAsCluster' if s in entity_clusters else None
+                    if kind:
+                        stats[kind] += 1
+                        continue
+            fout.write(line)
+
+    return stats
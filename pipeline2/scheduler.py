@@ -0,0 +1,83 @@
+import os
+import time
+from collections import defaultdict
+import manifest
+
+
+def estimate_costs(infiles, temp_dir):
+    """
+    Estimated import time of every ttl file, returns [(infile, cost)].
+
+    The duration recorded in the source's manifest by the last run is used if there is one.
+    Otherwise the cost is the ttl size, converted to seconds with the throughput (seconds per byte)
+    of the sources which have both, so that both kinds of estimates can be compared.
+    """
+    sizes, durations = {}, {}
+    for infile in infiles:
+        source = os.path.basename(infile).split('.')[0]
+        sizes[infile] = os.stat(infile).st_size
+        m = manifest.load_manifest(os.path.join(temp_dir, source), source)
+        if m and m.get('duration'):
+            durations[infile] = m['duration']
+
+    total_size = sum(sizes[f] for f in durations)
+    seconds_per_byte = sum(durations.values()) / total_size if total_size else 1.0
+    return [(f, durations[f] if f in durations else sizes[f] * seconds_per_byte) for f in infiles]
+
+
+def longest_job_first(infiles, temp_dir):
+    """
+    Order ttl files by estimated cost, largest first. Fed to a single shared queue,
+    this is LPT list scheduling: a big source can't be left for the end while the other workers are idle.
+    """
+    costs = estimate_costs(infiles, temp_dir)
+    return [f for f, _ in sorted(costs, key=lambda x: -x[1])]
+
+
+class ScheduleReport(object):
+    """
+    Collect (source, worker, start, end) of every task and summarize how well the workers were used.
+    The tasks which succeeded are in `succeeded`, the failed ones in `failed`.
+    """
+
+    def __init__(self, num_of_processor):
+        self.num_of_processor = num_of_processor
+        self.tasks = []
+        self.succeeded = set()
+        self.failed = []
+        self.start = time.time()
+
+    def collect(self, source, worker, start, end, succeeded=True):
+        self.tasks.append((source, worker, start, end))
+        if succeeded:
+            self.succeeded.add(source)
+        else:
+            self.failed.append(source)
+
+    def summary(self):
+        end = time.time()
+        makespan = end - self.start
+        durations = [e - s for _, _, s, e in self.tasks]
+        busy = defaultdict(float)
+        for _, worker, s, e in self.tasks:
+            busy[worker] += e - s
+        # no schedule can finish before the work is evenly spread or before the longest task is done
+        lower_bound = max(sum(durations) / self.num_of_processor, max(durations)) if durations else 0.0
+        return {
+            'makespan': makespan,
+            'lower_bound': lower_bound,
+            'utilization': {w: (busy.get(w, 0.0) / makespan if makespan else 0.0)
+                            for w in range(self.num_of_processor)},
+            'longest': max(self.tasks, key=lambda t: t[3] - t[2])[0] if self.tasks else None,
+        }
+
+    def log(self, logger):
+        summary = self.summary()
+        for worker, utilization in summary['utilization'].items():
+            logger.info(f'worker {worker}: utilization {utilization:.1%}')
+        ratio = summary['makespan'] / summary['lower_bound'] if summary['lower_bound'] else 1.0
+        logger.info(f'makespan {summary["makespan"]:.1f}s, lower bound {summary["lower_bound"]:.1f}s '
+                    f'({ratio:.2f}x), longest task {summary["longest"]}')
+        if self.failed:
+            logger.error('{} tasks failed: {}'.format(len(self.failed), ', '.join(self.failed)))
+        return summary
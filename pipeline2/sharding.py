@@ -0,0 +1,133 @@
+import zlib
+from collections import defaultdict
+from ntriples import RDF_TYPE, split_triple
+
+
+RDF_SUBJECT = '<http://www.w3.org/1999/02/22-rdf-syntax-ns#subject>'
+RDF_PREDICATE = '<http://www.w3.org/1999/02/22-rdf-syntax-ns#predicate>'
+RDF_OBJECT = '<http://www.w3.org/1999/02/22-rdf-syntax-ns#object>'
+
+
+def shard_of(node, num_shards):
+    # crc32 is stable across processes, hash() is not
+    return zlib.crc32(node.encode('utf-8')) % num_shards
+
+
+def shard_nt(nt_file, nt_files, stub_files, aida):
+    """
+    Split `nt_file` into len(`nt_files`) shards by subject hash, so that the shards can be imported independently.
+
+    Entities, events and relations (roots) are hashed. Every other node follows its owner:
+    a statement follows its rdf:subject, a cluster membership its clusterMember, any other node (confidence,
+    justification, private data, ldcTime, cluster...) the nodes which refer to it, so it's copied into every shard
+    which needs it. Nodes nothing refers to (e.g. claims) follow the roots they refer to, or go to every shard.
+
+    A root referred to from another shard (role argument, cluster prototype) gets its rdf:type triples copied there
+    too, so that the queries still match. These stubs are also written to `stub_files`, importing them gives the
+    KGTK ids of the roots a shard doesn't own, whose rows have to be dropped when the shards are merged.
+
+    The reference graph is kept in memory: every IRI object, every anchor and the rdf:type lines of the roots,
+    so the peak memory grows with the nt file, it's about the size of the file for AIF (SHARD_SIZE should leave
+    room for it). Returns the number of triples per shard.
+    """
+    def iri(name):
+        return f'<{aida}{name}>'
+
+    num_shards = len(nt_files)
+    all_shards = frozenset(range(num_shards))
+    root_types = {iri('Entity'), iri('Event'), iri('Relation')}
+    anchors = {RDF_SUBJECT, iri('clusterMember')}
+    # links which don't make the object part of the subject
+    not_owned = {RDF_TYPE, RDF_PREDICATE, RDF_OBJECT} | anchors
+
+    # pass 1: roots, anchors and references
+    roots = set()
+    anchor = {}
+    parents = defaultdict(list)
+    with open(nt_file, 'r', encoding='utf-8') as fin:
+        for line in fin:
+            if not line.strip():
+                continue
+            s, p, o = split_triple(line)
+            if p == RDF_TYPE:
+                if o in root_types:
+                    roots.add(s)
+            elif p in anchors:
+                anchor[s] = o
+            if o.startswith('<') and p not in not_owned:
+                parents[o].append(s)
+
+    owners = {}
+
+    def owners_of(node, visiting=()):
+        if node in owners:
+            return owners[node]
+        if node in roots:
+            result = frozenset([shard_of(node, num_shards)])
+        elif node in visiting:
+            return frozenset()
+        elif node in anchor:
+            result = owners_of(anchor[node], visiting + (node,))
+        elif node in parents:
+            # parents nothing refers to aren't resolved yet, they don't count
+            result = frozenset().union(*[owners_of(parent, visiting + (node,)) or frozenset()
+                                         for parent in parents[node]])
+        else:
+            return None  # nothing refers to it
+        owners[node] = result
+        return result
+
+    # pass 2: nodes nothing refers to follow the roots they refer to, rdf:type triples of roots for the stubs
+    orphans = defaultdict(set)
+    type_lines = defaultdict(list)
+    with open(nt_file, 'r', encoding='utf-8') as fin:
+        for line in fin:
+            if not line.strip():
+                continue
+            s, p, o = split_triple(line)
+            if p == RDF_TYPE and s in roots:
+                type_lines[s].append(line)
+            if s in roots or s in anchor or s in parents:
+                continue
+            orphans[s]  # an orphan without any IRI object still gets an entry
+            if o.startswith('<') and p != RDF_TYPE:
+                o_owners = owners_of(o)
+                if o_owners:
+                    orphans[s] |= o_owners
+    # nodes which only orphans refer to (e.g. the confidence of a claim) are resolved again in pass 3
+    owners = {node: node_owners for node, node_owners in owners.items() if node_owners}
+    for node, node_owners in orphans.items():
+        owners[node] = frozenset(node_owners) or all_shards
+    del orphans
+
+    # pass 3: write
+    stubs = defaultdict(set)
+    counts = [0] * num_shards
+    fouts = [open(f, 'w', encoding='utf-8') for f in nt_files]
+    try:
+        with open(nt_file, 'r', encoding='utf-8') as fin:
+            for line in fin:
+                if not line.strip():
+                    continue
+                s, p, o = split_triple(line)
+                shards = owners_of(s) or all_shards
+                for shard in shards:
+                    fouts[shard].write(line)
+                    counts[shard] += 1
+                if p != RDF_TYPE and o in roots:
+                    o_shard = shard_of(o, num_shards)
+                    for shard in shards:
+                        if shard != o_shard:
+                            stubs[shard].add(o)
+
+        for shard, fout in enumerate(fouts):
+            with open(stub_files[shard], 'w', encoding='utf-8') as fstub:
+                for root in sorted(stubs[shard]):
+                    for line in type_lines[root]:
+                        fout.write(line)
+                        fstub.write(line)
+                        counts[shard] += 1
+    finally:
+        for fout in fouts:
+            fout.close()
+    return counts
@@ -0,0 +1,106 @@
+import json
+import warnings
+import numpy as np
+import pandas as pd
+from config import config
+
+
+EXTENSIONS = {'parquet': '.parquet', 'hdf': '.h5'}
+METADATA_KEY = b'ta2.containers'
+
+
+def frame_file(path):
+    """
+    `path` is the name of a frame without extension, e.g. temp/uiuc/NIST/L0C04958D/L0C04958D.entity
+    """
+    return path + EXTENSIONS[config.get('storage_format', 'hdf')]
+
+
+def container_types(df):
+    # which object columns hold tuples and which hold lists, arrow reads both back as arrays
+    # free-form dicts (e.g. parsed private data) have no stable schema, they are stored as json strings
+    containers = {}
+    for col in df.columns:
+        if df[col].dtype != object:
+            continue
+        for v in df[col]:
+            if isinstance(v, tuple):
+                containers[col] = 'tuple'
+                break
+            if isinstance(v, list):
+                containers[col] = 'list'
+                break
+            if isinstance(v, dict):
+                containers[col] = 'json'
+                break
+            if isinstance(v, str):
+                break
+    return containers
+
+
+def to_container(v, container):
+    if container == 'json':
+        return json.loads(v) if isinstance(v, str) else v
+    if isinstance(v, np.ndarray):
+        v = [to_container(vv, 'tuple') for vv in v.tolist()]
+        return tuple(v) if container == 'tuple' else v
+    if isinstance(v, dict):
+        return {k: to_container(vv, 'tuple') for k, vv in v.items()}
+    return v
+
+
+def write_frame(df, path, key):
+    """
+    Write a frame to `frame_file(path)`, plus `frame_file(path).csv` if `debug_csv` is set.
+
+    With parquet, tuple columns (type, type_cv, link, type_just...) are stored as native list columns and
+    string (URI) columns and lists of strings are dictionary encoded. With hdf, the frame is pickled as before.
+    """
+    outfile = frame_file(path)
+    if config.get('storage_format', 'hdf') == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        containers = container_types(df)
+        json_columns = [col for col, container in containers.items() if container == 'json']
+        frame = df.copy() if json_columns else df
+        for col in json_columns:
+            frame[col] = [json.dumps(v) if isinstance(v, dict) else None for v in df[col]]
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[METADATA_KEY] = json.dumps(containers).encode('utf-8')
+        table = table.replace_schema_metadata(metadata)
+        pq.write_table(table, outfile, use_dictionary=True, compression='snappy')
+    else:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            df.to_hdf(outfile, key, mode='w', format='fixed')
+
+    if config.get('debug_csv', False):
+        df.to_csv(outfile + '.csv')
+
+
+def read_frame(path, columns=None):
+    """
+    Read a frame written by `write_frame`. Only `columns` (the ones which exist) are loaded if it's given.
+    Parquet files are memory mapped and list columns are turned back into tuples / lists.
+    """
+    infile = frame_file(path)
+    if config.get('storage_format', 'hdf') == 'parquet':
+        import pyarrow.parquet as pq
+
+        schema = pq.read_schema(infile)
+        if columns is not None:
+            columns = [c for c in columns if c in schema.names]
+        table = pq.read_table(infile, columns=columns, memory_map=True)
+        df = table.to_pandas()
+        containers = json.loads((schema.metadata or {}).get(METADATA_KEY, b'{}'))
+        for col, container in containers.items():
+            if col in df.columns:
+                df[col] = [to_container(v, container) for v in df[col]]
+        return df
+
+    df = pd.read_hdf(infile)
+    if columns is not None:
+        df = df[[c for c in columns if c in df.columns]]
+    return df
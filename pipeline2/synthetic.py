@@ -0,0 +1,253 @@
+import os
+import sys
+import json
+import random
+
+
+PREFIXES = {
+    'rdf': 'http://www.w3.org/1999/02/22-rdf-syntax-ns#',
+    'xsd': 'http://www.w3.org/2001/XMLSchema#',
+    'aida': 'https://tac.nist.gov/tracks/SM-KBP/2019/ontologies/InterchangeOntology#',
+    'ldcOnt': 'https://tac.nist.gov/tracks/SM-KBP/2019/ontologies/LDCOntology#',
+}
+
+ENTITY_TYPES = ['PER', 'ORG', 'GPE', 'LOC', 'FAC', 'WEA', 'VEH']
+EVENT_TYPES = {
+    'Conflict.Attack': ['Attacker', 'Target', 'Place'],
+    'Movement.TransportPerson': ['Transporter', 'Passenger', 'Destination'],
+    'Contact.Meet': ['Participant', 'Place'],
+    'Life.Die': ['Victim', 'Killer', 'Place'],
+}
+RELATION_TYPES = {
+    'Physical.LocatedNear': ['EntityOrFiller', 'Place'],
+    'OrganizationAffiliation.EmploymentMembership': ['EmployeeMember', 'PlaceOfEmploymentMembership'],
+    'GeneralAffiliation.MemberOriginReligionEthnicity': ['Person', 'EntityOrFiller'],
+}
+TIME_TYPES = ['ON', 'BEFORE', 'AFTER', 'UNKNOWN']
+
+SYSTEM = '<http://www.isi.edu/synthetic>'
+MENTION_SYSTEM = '<http://www.uiuc.edu/mention>'
+
+# per document
+DEFAULTS = {
+    'entities': 100,
+    'events': 30,
+    'relations': 10,
+    'arguments': 2,  # per event / relation
+    'links': 1,  # per entity
+    'types': 1,  # type statements per entity / event / relation
+    'clusters': 20,  # TA1 entity clusters, every event and relation has its own
+    'claims': 2,
+}
+
+
+def literal(value, datatype=None):
+    value = json.dumps(str(value), ensure_ascii=False)
+    return f'{value}^^xsd:{datatype}' if datatype else value
+
+
+class Document(object):
+    """
+    Writes the AIF of one synthetic document, one triple per line (valid Turtle, no nested blank nodes),
+    and counts the triples.
+    """
+
+    def __init__(self, fp, doc_id, rng):
+        self.fp = fp
+        self.doc_id = doc_id
+        self.rng = rng
+        self.triples = 0
+        self.bnodes = 0
+
+    def t(self, s, p, o):
+        self.fp.write(f'{s} {p} {o} .\n')
+        self.triples += 1
+
+    def bnode(self):
+        self.bnodes += 1
+        return f'_:b{self.bnodes}'
+
+    def iri(self, kind, name):
+        return f'<http://www.isi.edu/gaia/{kind}/{self.doc_id}-{name}>'
+
+    def confidence(self, s, value=None):
+        c = self.bnode()
+        self.t(s, 'aida:confidence', c)
+        self.t(c, 'rdf:type', 'aida:Confidence')
+        self.t(c, 'aida:confidenceValue', literal(value if value is not None else round(self.rng.uniform(0.5, 1.0), 3), 'double'))
+        self.t(c, 'aida:system', SYSTEM)
+
+    def justification(self, name):
+        j = self.bnode()
+        start = self.rng.randint(0, 5000)
+        self.t(j, 'rdf:type', 'aida:TextJustification')
+        self.t(j, 'aida:source', literal(self.doc_id))
+        self.t(j, 'aida:sourceDocument', literal(self.doc_id))
+        self.t(j, 'aida:startOffset', literal(start, 'int'))
+        self.t(j, 'aida:endOffsetInclusive', literal(start + len(name), 'int'))
+        self.confidence(j)
+        p = self.bnode()
+        self.t(j, 'aida:privateData', p)
+        self.t(p, 'rdf:type', 'aida:PrivateData')
+        self.t(p, 'aida:jsonContent', literal(json.dumps({'mention': name, 'mention_string': name})))
+        self.t(p, 'aida:system', MENTION_SYSTEM)
+        self.t(j, 'aida:system', SYSTEM)
+        return j
+
+    def node(self, iri, type_, name):
+        j = self.justification(name)
+        self.t(iri, 'rdf:type', type_)
+        self.t(iri, 'aida:informativeJustification', j)
+        self.t(iri, 'aida:justifiedBy', j)
+        self.t(iri, 'aida:system', SYSTEM)
+        return j
+
+    def type_statement(self, iri, name, type_, just):
+        stmt = self.iri('assertions', f'{name}-type')
+        self.t(stmt, 'rdf:type', 'rdf:Statement')
+        self.t(stmt, 'rdf:subject', iri)
+        self.t(stmt, 'rdf:predicate', 'rdf:type')
+        self.t(stmt, 'rdf:object', f'ldcOnt:{type_}')
+        self.confidence(stmt)
+        self.t(stmt, 'aida:justifiedBy', just)
+        self.t(stmt, 'aida:system', SYSTEM)
+
+    def cluster(self, cluster, proto, members):
+        self.t(cluster, 'rdf:type', 'aida:SameAsCluster')
+        self.t(cluster, 'aida:prototype', proto)
+        self.t(cluster, 'aida:system', SYSTEM)
+        for member in members:
+            m = self.bnode()
+            self.t(m, 'rdf:type', 'aida:ClusterMembership')
+            self.t(m, 'aida:cluster', cluster)
+            self.t(m, 'aida:clusterMember', member)
+            self.confidence(m, 1.0)
+            self.t(m, 'aida:system', SYSTEM)
+
+    def time(self, iri):
+        t = self.bnode()
+        self.t(iri, 'aida:ldcTime', t)
+        self.t(t, 'rdf:type', 'aida:LDCTime')
+        year = self.rng.randint(2010, 2020)
+        for bound in ('start', 'end'):
+            c = self.bnode()
+            self.t(t, f'aida:{bound}', c)
+            self.t(c, 'rdf:type', 'aida:LDCTimeComponent')
+            self.t(c, 'aida:timeType', literal(self.rng.choice(TIME_TYPES)))
+            self.t(c, 'aida:year', literal(year, 'gYear'))
+            if self.rng.random() < 0.5:
+                self.t(c, 'aida:month', literal(f'--{self.rng.randint(1, 12):02d}', 'gMonth'))
+            self.t(c, 'aida:system', SYSTEM)
+        self.t(t, 'aida:system', SYSTEM)
+
+    def argument(self, iri, name, role, arg):
+        stmt = self.iri('assertions', f'{name}-arg')
+        self.t(stmt, 'rdf:type', 'rdf:Statement')
+        self.t(stmt, 'rdf:subject', iri)
+        self.t(stmt, 'rdf:predicate', f'ldcOnt:{role}')
+        self.t(stmt, 'rdf:object', arg)
+        self.confidence(stmt)
+        self.t(stmt, 'aida:justifiedBy', self.justification(role))
+        self.t(stmt, 'aida:system', SYSTEM)
+
+
+def generate_document(fp, doc_id, rng, entities, events, relations, arguments, links, types, clusters, claims,
+                      link_pool):
+    doc = Document(fp, doc_id, rng)
+    for prefix, iri in PREFIXES.items():
+        fp.write(f'@prefix {prefix}: <{iri}> .\n')
+    doc.t(SYSTEM, 'rdf:type', 'aida:System')
+
+    entity_iris = []
+    for i in range(entities):
+        e = doc.iri('entities', i)
+        name = f'name {rng.randrange(link_pool)}'
+        j = doc.node(e, 'aida:Entity', name)
+        doc.t(e, 'aida:hasName', literal(name))
+        for k in range(types):
+            doc.type_statement(e, f'entity-{i}-{k}', rng.choice(ENTITY_TYPES), j)
+        for _ in range(links):
+            link = doc.bnode()
+            doc.t(e, 'aida:link', link)
+            doc.t(link, 'rdf:type', 'aida:LinkAssertion')
+            # a shared pool of targets, so that entities of different documents end up in the same cluster
+            doc.t(link, 'aida:linkTarget', literal(f'LDC2019E43:{rng.randrange(link_pool)}', 'string'))
+            doc.confidence(link)
+            doc.t(link, 'aida:system', SYSTEM)
+        entity_iris.append(e)
+
+    entity_clusters = []
+    if entity_iris and clusters:
+        for c in range(min(clusters, len(entity_iris))):
+            members = entity_iris[c::clusters]
+            cluster = doc.iri('entities', f'cluster-{c}')
+            doc.cluster(cluster, members[0], members)
+            entity_clusters.append(cluster)
+
+    for kind, type_, count, roles in (('events', 'aida:Event', events, EVENT_TYPES),
+                                      ('relations', 'aida:Relation', relations, RELATION_TYPES)):
+        for i in range(count):
+            iri = doc.iri(kind, i)
+            event_type = rng.choice(sorted(roles))
+            j = doc.node(iri, type_, event_type)
+            for k in range(types):
+                doc.type_statement(iri, f'{kind}-{i}-{k}', event_type, j)
+            if kind == 'events' and rng.random() < 0.5:
+                doc.time(iri)
+            if entity_iris:
+                for k in range(arguments):
+                    role = f'{event_type}_{rng.choice(roles[event_type])}'
+                    doc.argument(iri, f'{kind}-{i}-{k}', role, rng.choice(entity_iris))
+            # the clusterer needs the prototype of every event and relation
+            doc.cluster(doc.iri(kind, f'{i}-cluster'), iri, [iri])
+
+    if entity_clusters:
+        for k in range(claims):
+            claim = doc.iri('claims', k)
+            doc.t(claim, 'rdf:type', 'aida:Claim')
+            doc.t(claim, 'aida:associatedKEs', rng.choice(entity_clusters))
+            doc.t(claim, 'aida:claimSemantics', rng.choice(entity_clusters))
+            doc.t(claim, 'aida:system', SYSTEM)
+    return doc.triples
+
+
+def generate(output_dir, documents, seed=2021, link_pool=None, **counts):
+    """
+    Write `documents` synthetic TA1 files (`SYN000000.ttl`...) to `output_dir`, `counts` are per document
+    (see DEFAULTS). Returns the totals: documents, triples, bytes, entities, events, relations.
+    """
+    counts = dict(DEFAULTS, **counts)
+    unknown = set(counts) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f'Unknown counts: {", ".join(sorted(unknown))}')
+    link_pool = link_pool or max(1, documents * counts['entities'] // 4)
+    rng = random.Random(seed)
+
+    os.makedirs(output_dir, exist_ok=True)
+    total = {'documents': documents, 'triples': 0, 'bytes': 0}
+    for idx in range(documents):
+        doc_id = f'SYN{idx:06d}'
+        outfile = os.path.join(output_dir, f'{doc_id}.ttl')
+        with open(outfile, 'w', encoding='utf-8') as fp:
+            total['triples'] += generate_document(fp, doc_id, rng, link_pool=link_pool, **counts)
+        total['bytes'] += os.path.getsize(outfile)
+    for kind in ('entities', 'events', 'relations'):
+        total[kind] = documents * counts[kind]
+    return total
+
+
+def parse_counts(args):
+    # key=value arguments of the command line
+    counts = {}
+    for arg in args:
+        k, v = arg.split('=', 1)
+        counts[k] = int(v)
+    return counts
+
+
+if __name__ == '__main__':
+    argv = sys.argv
+    if argv[1] == 'generate':
+        # python synthetic.py generate <output dir> <documents> [entities=100 events=30 ...]
+        total = generate(argv[2], int(argv[3]), **parse_counts(argv[4:]))
+        print(json.dumps(total))
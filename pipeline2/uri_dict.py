@@ -0,0 +1,147 @@
+import hashlib
+import numpy as np
+import pandas as pd
+from config import config
+from storage import read_frame, write_frame
+
+
+NULL_ID = 0  # id of a missing URI
+
+# URI columns of the importer tables which the clusterer joins / groups on and the exporter writes.
+# Nested columns (type_just, asso_claim...) are only carried along, parquet already dictionary encodes them.
+URI_COLUMNS = {
+    'entity': ['e', 'info_just'],
+    'event': ['e', 'proto', 'cluster'],
+    'relation': ['e', 'proto', 'cluster'],
+    'role': ['e1', 'e2', 'just'],
+}
+
+
+def uri_id(uri):
+    """
+    Signed 64 bit id of a URI. It only depends on the URI, so the workers importing different sources
+    agree on the ids without sharing anything.
+    """
+    id_ = int.from_bytes(hashlib.blake2b(uri.encode('utf-8'), digest_size=8).digest(), 'little', signed=True)
+    return id_ if id_ != NULL_ID else 1
+
+
+def uri_ids(values):
+    """
+    Ids of a sequence of URIs, missing values get NULL_ID. Every distinct URI is hashed once.
+    Returns the int64 array and {id: URI} of the distinct URIs.
+    """
+    codes, uniques = pd.factorize(pd.Series(list(values), dtype=object))
+    ids = np.fromiter((uri_id(u) for u in uniques), dtype=np.int64, count=len(uniques))
+    result = np.full(len(codes), NULL_ID, dtype=np.int64)
+    found = codes >= 0
+    result[found] = ids[codes[found]]
+    return result, dict(zip(ids.tolist(), uniques))
+
+
+def encode_column(values, uris):
+    """
+    Encode a column of URIs, or of tuples of URIs (e.g. prototypes of an event), and add its URIs to `uris`.
+    """
+    values = list(values)
+    if not any(isinstance(v, tuple) for v in values):
+        ids, column_uris = uri_ids(values)
+        uris.update(column_uris)
+        return ids
+
+    ids, column_uris = uri_ids([u for v in values if isinstance(v, tuple) for u in v])
+    uris.update(column_uris)
+    ids = ids.tolist()
+    result, i = [], 0
+    for v in values:
+        if isinstance(v, tuple):
+            result.append(tuple(ids[i:i + len(v)]))
+            i += len(v)
+        else:
+            result.append(v)  # missing
+    return result
+
+
+def dictionary_frame(uris):
+    return pd.DataFrame({
+        'id': np.fromiter(uris.keys(), dtype=np.int64, count=len(uris)),
+        'uri': list(uris.values()),
+    })
+
+
+def dictionary_path(path):
+    """
+    Dictionary of the frame `path`, e.g. temp/uiuc/NIST/L0C04958D/L0C04958D.entity.uris
+    """
+    return path + '.uris'
+
+
+def encode_frame(df, table):
+    """
+    Replace the URI columns of an importer table by their ids, returns the encoded frame and its dictionary.
+    """
+    uris = {}
+    df = df.copy()
+    for col in URI_COLUMNS[table]:
+        if col in df.columns:
+            df[col] = encode_column(df[col], uris)
+    return df, dictionary_frame(uris)
+
+
+def write_table(df, path, table):
+    """
+    `write_frame` for the importer tables. With `uri_encoding`, the URI columns are stored as ids and
+    the dictionary is written first, so that a table never exists without it.
+    """
+    if config.get('uri_encoding', False):
+        df, uris = encode_frame(df, table)
+        write_frame(uris, dictionary_path(path), 'uris')
+    write_frame(df, path, table)
+
+
+class URIDictionary(object):
+    """
+    Run-wide id -> URI dictionary, merged from the dictionaries of the frames.
+    Two URIs with the same id is an error, not a silent merge of two nodes.
+    """
+
+    def __init__(self, frames=()):
+        frames = [f for f in frames if len(f)]
+        if frames:
+            df = pd.concat(frames, ignore_index=True).drop_duplicates(subset=['id', 'uri'])
+            collided = df['id'].duplicated(keep=False)
+            if collided.any():
+                raise ValueError('URI id collision: {}'.format(df.loc[collided, 'uri'].head(10).to_list()))
+            self.uris = dict(zip(df['id'].tolist(), df['uri'].tolist()))
+        else:
+            self.uris = {}
+
+    def __len__(self):
+        return len(self.uris)
+
+    def encode(self, values):
+        """
+        Ids of URIs created after the import (e.g. clusters and prototypes), they are added to the dictionary.
+        """
+        ids, uris = uri_ids(values)
+        for id_, uri in uris.items():
+            if self.uris.setdefault(id_, uri) != uri:
+                raise ValueError(f'URI id collision: {uri}, {self.uris[id_]}')
+        return ids
+
+    def decode(self, value):
+        """
+        URI of an id, tuples are decoded element-wise. Anything else (a URI, a missing value) is returned as is.
+        """
+        if isinstance(value, tuple):
+            return tuple(self.decode(v) for v in value)
+        if isinstance(value, (int, np.integer)) and not isinstance(value, (bool, np.bool_)):
+            return None if value == NULL_ID else self.uris[int(value)]
+        return value
+
+    def save(self, path):
+        write_frame(dictionary_frame(self.uris), path, 'uris')
+
+    @classmethod
+    def load(cls, path):
+        return cls([read_frame(path)])